@@ -0,0 +1,98 @@
+"""Benchmark length-bucketed batches against fixed-shape batches in training.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_bucketing --rows 20000 --epochs 2
+"""
+
+import argparse
+import time
+
+import keras
+import numpy as np
+import tensorflow as tf
+
+from src import Config, Modeling, Preprocessing
+
+MODEL_PARAMS = {
+    "max_tokens": 20000,
+    "sequence_length": 200,
+    "embedding_dim": 128,
+    "conv_filters": 128,
+    "conv_k_size": 7,
+    "hidden_neurons": 128,
+    "dropout_rate": 0.5,
+}
+
+
+class EpochTimer(keras.callbacks.Callback):
+    def on_train_begin(self, logs=None) -> None:
+        self.seconds: list[float] = []
+
+    def on_epoch_begin(self, epoch, logs=None) -> None:
+        self._start_time = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None) -> None:
+        self.seconds.append(time.perf_counter() - self._start_time)
+
+
+def make_token_ids(
+    n_rows: int, sequence_length: int, max_tokens: int, seed: int = Config.SEED
+) -> np.ndarray:
+    """Right-padded token ids with log-normal lengths, skewed short like comments."""
+    rng = np.random.default_rng(seed)
+    lengths = np.clip(rng.lognormal(3.7, 0.9, n_rows).astype(int), 1, sequence_length)
+    token_ids = rng.integers(2, max_tokens, size=(n_rows, sequence_length))
+    token_ids[np.arange(sequence_length) >= lengths[:, None]] = 0
+    return token_ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--epochs", type=int, default=2)
+    args = parser.parse_args()
+
+    classifier = Modeling.TextClassifier(**MODEL_PARAMS)
+    token_ids = make_token_ids(
+        args.rows, classifier.sequence_length, classifier.max_tokens
+    )
+    labels = np.random.default_rng(Config.SEED).integers(0, 2, (args.rows, 6))
+    lengths = np.count_nonzero(token_ids, axis=1)
+    vocabulary = ["", "[UNK]"] + [f"w{i}" for i in range(2, classifier.max_tokens)]
+
+    examples = tf.data.Dataset.from_tensor_slices((token_ids, labels))
+    boundaries = classifier.bucket_boundaries
+    runs = {
+        "fixed": ([classifier.sequence_length], examples.batch(args.batch_size)),
+        "bucketed": (
+            boundaries,
+            Preprocessing.bucket_by_length(
+                examples, boundaries, args.batch_size, classifier.padding_margin
+            ),
+        ),
+    }
+
+    print(f"{'batching':>10} {'padding':>10} {'examples/s':>12}")
+    for name, (run_boundaries, ds) in runs.items():
+        margin = classifier.padding_margin if name == "bucketed" else 0
+        timer = EpochTimer()
+        classifier.train(
+            ds.cache().prefetch(tf.data.AUTOTUNE),
+            epochs=args.epochs,
+            metrics=[],
+            callbacks=[timer],
+            verbose=0,
+            vocabulary=vocabulary,
+        )
+        # The first epoch includes tracing one graph per batch shape
+        print(
+            f"{name:>10} "
+            f"{Preprocessing.bucket_padding_ratio(lengths, run_boundaries, margin):>10.2f} "
+            f"{args.rows / timer.seconds[-1]:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
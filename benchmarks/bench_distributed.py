@@ -0,0 +1,64 @@
+"""Benchmark data-parallel training throughput from 1 to 8 localhost workers.
+
+Each worker gets an even share of the CPUs and the per-worker batch stays
+fixed, so ideal scaling multiplies throughput by the worker count. On a
+multi-socket host, compare worker counts that are multiples of the socket
+count. Run from the repository root:
+
+    python -m benchmarks.bench_distributed --rows 50000 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+from benchmarks.bench_bucketing import MODEL_PARAMS
+from benchmarks.bench_pipeline import isolated_pipeline
+from benchmarks.corpus import write_corpus
+from src import Distributed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--epochs", type=int, default=3)
+    args = parser.parse_args()
+
+    data_params = {"val_size": 0.2, "batch_size": args.batch_size}
+    reports = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        download_path = work_dir / "download"
+        write_corpus(download_path, args.rows)
+        with isolated_pipeline(work_dir, download_path):
+            for num_workers in args.workers:
+                reports[num_workers] = Distributed.train_distributed(
+                    MODEL_PARAMS,
+                    data_params,
+                    epochs=args.epochs,
+                    num_workers=num_workers,
+                    model_name=f"workers{num_workers}",
+                    model_dir=work_dir / "models",
+                )
+
+    baseline = reports[args.workers[0]].examples_per_sec
+    print(f"CPUs: {os.cpu_count()}")
+    print(
+        f"{'workers':>8} {'threads':>8} {'batch':>8} {'examples/s':>12} "
+        f"{'speedup':>8} {'efficiency':>10} {'val_loss':>9}"
+    )
+    for num_workers, report in reports.items():
+        speedup = report.examples_per_sec / baseline
+        print(
+            f"{num_workers:>8} {report.threads_per_worker:>8} "
+            f"{report.global_batch_size:>8} {report.examples_per_sec:>12.0f} "
+            f"{speedup:>7.2f}x {speedup * args.workers[0] / num_workers:>10.0%} "
+            f"{report.history['val_loss'][-1]:>9.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
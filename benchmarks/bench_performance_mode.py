@@ -0,0 +1,116 @@
+"""Benchmark XLA and bfloat16 mixed precision against default training.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_performance_mode --rows 20000 --epochs 3
+"""
+
+import argparse
+import time
+
+import keras
+import numpy as np
+import tensorflow as tf
+
+from benchmarks.bench_bucketing import MODEL_PARAMS, make_token_ids
+from src import Config, Logging, Modeling
+
+logger = Logging.setup_logger(__name__)
+
+MODES: dict[str, Modeling.PerformanceMode] = {
+    "default": Modeling.PerformanceMode(),
+    "xla": Modeling.PerformanceMode(jit_compile=True),
+    "xla+bf16": Modeling.PerformanceMode(jit_compile=True, mixed_precision=True),
+}
+
+
+class StepTimer(keras.callbacks.Callback):
+    """Records train step times, skipping the first epoch's compilation."""
+
+    def on_train_begin(self, logs=None) -> None:
+        self.seconds: list[float] = []
+
+    def on_train_batch_begin(self, batch, logs=None) -> None:
+        self._start_time = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None) -> None:
+        self.seconds.append(time.perf_counter() - self._start_time)
+
+    def on_epoch_end(self, epoch, logs=None) -> None:
+        if epoch == 0:
+            self.seconds.clear()
+
+
+def make_labels(token_ids: np.ndarray, n_labels: int = 6) -> np.ndarray:
+    """Each label fires when its own small set of trigger tokens appears."""
+    triggers = np.arange(2, 2 + 5 * n_labels).reshape(n_labels, 5)
+    return np.stack(
+        [np.isin(token_ids, label_triggers).any(axis=1) for label_triggers in triggers],
+        axis=1,
+    ).astype(np.int64)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.02,
+        help="Largest allowed drop in validation AUC against the default mode.",
+    )
+    args = parser.parse_args()
+
+    token_ids = make_token_ids(
+        args.rows, MODEL_PARAMS["sequence_length"], MODEL_PARAMS["max_tokens"]
+    )
+    labels = make_labels(token_ids)
+    n_train = int(0.8 * args.rows)
+    train_ds, val_ds = (
+        tf.data.Dataset.from_tensor_slices((token_ids[rows], labels[rows]))
+        .batch(args.batch_size)
+        .cache()
+        .prefetch(tf.data.AUTOTUNE)
+        for rows in (slice(None, n_train), slice(n_train, None))
+    )
+    vocabulary = ["", "[UNK]"] + [f"w{i}" for i in range(2, MODEL_PARAMS["max_tokens"])]
+
+    results = {}
+    for name, performance in MODES.items():
+        keras.utils.set_random_seed(Config.SEED)
+        classifier = Modeling.TextClassifier(**MODEL_PARAMS, performance=performance)
+        timer = StepTimer()
+        classifier.train(
+            train_ds,
+            epochs=args.epochs,
+            metrics=[keras.metrics.AUC(name="auc", multi_label=True)],
+            callbacks=[timer],
+            verbose=0,
+            vocabulary=vocabulary,
+        )
+        step_ms = float(np.median(timer.seconds)) * 1e3
+        auc = classifier.evaluate(val_ds, verbose=0)["auc"]
+        results[name] = (step_ms, auc)
+
+    baseline_ms, baseline_auc = results["default"]
+    print(f"{'mode':>10} {'step ms':>10} {'speedup':>10} {'val AUC':>10} {'ok':>5}")
+    for name, (step_ms, auc) in results.items():
+        within_tolerance = baseline_auc - auc <= args.tolerance
+        print(
+            f"{name:>10} {step_ms:>10.1f} {baseline_ms / step_ms:>9.2f}x "
+            f"{auc:>10.4f} {str(within_tolerance):>5}"
+        )
+        if not within_tolerance:
+            logger.warning(
+                "%s validation AUC %.4f is more than %.3f below default %.4f",
+                name,
+                auc,
+                args.tolerance,
+                baseline_auc,
+            )
+
+
+if __name__ == "__main__":
+    main()
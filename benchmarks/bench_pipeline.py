@@ -0,0 +1,233 @@
+"""Time every stage of the data and model pipeline on synthetic corpora.
+
+Each run is appended to a JSON history and compared with the previous run
+of the same size on the same host; slower stages fail the run. Run from the
+repository root:
+
+    python -m benchmarks.bench_pipeline --rows 10000 100000 1000000
+"""
+
+import argparse
+import contextlib
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+from unittest import mock
+
+import tensorflow as tf
+from pydantic import BaseModel, PositiveInt
+
+from benchmarks.bench_bucketing import MODEL_PARAMS
+from benchmarks.corpus import write_corpus
+from src import Config, DownloadData, MakeDatasets, Modeling
+
+STAGES: list[str] = [
+    "validation",
+    "csv_load",
+    "split",
+    "clean",
+    "convert",
+    "save",
+    "load",
+    "vocabulary",
+    "train_epoch",
+    "inference",
+]
+
+# Differences below this many seconds are treated as noise
+MIN_REGRESSION_SECONDS: float = 0.05
+
+
+class BenchmarkRun(BaseModel):
+    timestamp: str
+    commit: Optional[str]
+    host: str
+    rows: PositiveInt
+    batch_size: PositiveInt
+    seconds: dict[str, float]
+
+
+class StageTimer:
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def __call__(self, stage: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        yield
+        self.seconds[stage] = time.perf_counter() - start_time
+
+
+@contextlib.contextmanager
+def isolated_pipeline(work_dir: Path, download_path: Path) -> Iterator[None]:
+    """Points downloads and caches at `work_dir`, serving the synthetic corpus."""
+    with (
+        mock.patch.object(Config, "KAGGLE_DIR", work_dir / "kaggle"),
+        mock.patch.object(Config, "ARROW_DIR", work_dir / "arrow"),
+        mock.patch.object(MakeDatasets.Datasets, "_save_path", work_dir / "tensorflow"),
+        mock.patch.object(
+            DownloadData.kagglehub, "dataset_download", return_value=str(download_path)
+        ),
+    ):
+        yield
+
+
+def run_pipeline(
+    work_dir: Path, n_rows: int, batch_size: int, skip: set[str]
+) -> dict[str, float]:
+    download_path = work_dir / "download"
+    write_corpus(download_path, n_rows)
+    timer = StageTimer()
+
+    with isolated_pipeline(work_dir, download_path):
+        data_params = {"val_size": 0.2, "batch_size": batch_size}
+        datasets = MakeDatasets.Datasets(**data_params)
+        with timer("validation"):
+            DownloadData.download_kaggle_dataset()
+        with timer("csv_load"):
+            raw_data = datasets._load_raw_data()
+        with timer("split"):
+            split_data = datasets._split_data(raw_data)
+        with timer("clean"):
+            clean_data = datasets._clean_data(split_data)
+        with timer("convert"):
+            converted = datasets._convert_to_tensorflow(clean_data)
+        with timer("save"):
+            datasets._save_datasets(converted)
+            datasets._save_config()
+
+        loaded = MakeDatasets.Datasets(**data_params)
+        with timer("load"):
+            for ds in loaded.datasets.values():
+                ds.reduce(0, lambda count, _: count + 1)
+
+        classifier = Modeling.TextClassifier(**MODEL_PARAMS)
+        with timer("vocabulary"):
+            vocabulary = loaded.vocabulary(classifier.tokenizer)
+        if "train_epoch" not in skip:
+            with timer("train_epoch"):
+                classifier.train(
+                    loaded.train,
+                    epochs=1,
+                    metrics=[],
+                    verbose=0,
+                    vocabulary=vocabulary,
+                )
+        if "inference" not in skip and "train_epoch" not in skip:
+            texts = clean_data[MakeDatasets.Split.TEST]["comment_text"].tolist()
+            with timer("inference"):
+                classifier.predict_proba(texts)
+
+    return timer.seconds
+
+
+def load_history(path: Path) -> list[BenchmarkRun]:
+    if not path.exists():
+        return []
+    with open(path, "r") as f:
+        return [BenchmarkRun.model_validate(run) for run in json.load(f)]
+
+
+def save_history(path: Path, history: list[BenchmarkRun]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    runs = ",\n".join(run.model_dump_json() for run in history)
+    path.write_text(f"[\n{runs}\n]\n")
+
+
+def find_regressions(
+    run: BenchmarkRun, history: list[BenchmarkRun], threshold: float
+) -> dict[str, tuple[float, float]]:
+    """Stages more than `threshold` slower than the last comparable run."""
+    previous = next(
+        (
+            past
+            for past in reversed(history)
+            if (past.host, past.rows, past.batch_size)
+            == (run.host, run.rows, run.batch_size)
+        ),
+        None,
+    )
+    if previous is None:
+        return {}
+    return {
+        stage: (previous.seconds[stage], seconds)
+        for stage, seconds in run.seconds.items()
+        if stage in previous.seconds
+        and seconds > previous.seconds[stage] * (1 + threshold)
+        and seconds - previous.seconds[stage] > MIN_REGRESSION_SECONDS
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument(
+        "--skip", nargs="*", default=[], choices=["train_epoch", "inference"]
+    )
+    parser.add_argument(
+        "--history",
+        type=Path,
+        default=Config.REPORTS_DIR / "benchmarks" / "pipeline_history.json",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Relative slowdown against the previous run that counts as a regression.",
+    )
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    regressed = False
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as work_dir:
+            seconds = run_pipeline(
+                Path(work_dir), n_rows, args.batch_size, set(args.skip)
+            )
+        run = BenchmarkRun(
+            timestamp=datetime.now().isoformat(timespec="seconds"),
+            commit=_git_commit(),
+            host=f"{platform.node()}/{platform.machine()}/tf{tf.__version__}",
+            rows=n_rows,
+            batch_size=args.batch_size,
+            seconds=seconds,
+        )
+        regressions = find_regressions(run, history, args.threshold)
+        history.append(run)
+
+        print(f"\n{n_rows} rows")
+        print(f"{'stage':>12} {'seconds':>10} {'rows/s':>12}")
+        for stage in STAGES:
+            if stage not in seconds:
+                continue
+            line = (
+                f"{stage:>12} {seconds[stage]:>10.3f} {n_rows / seconds[stage]:>12.0f}"
+            )
+            if stage in regressions:
+                line += f"  regressed from {regressions[stage][0]:.3f}"
+            print(line)
+        regressed = regressed or bool(regressions)
+
+    save_history(args.history, history)
+    print(f"\nAppended {len(args.rows)} runs to {args.history}")
+    if regressed:
+        print(f"Stages slower than {args.threshold:.0%} against the previous run")
+        sys.exit(1)
+
+
+def _git_commit() -> Optional[str]:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+    )
+    return result.stdout.strip() or None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark native iterative stratification against scikit-multilearn.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_stratification --rows 10000 100000 1000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+from skmultilearn.model_selection import iterative_train_test_split
+
+from src import Config, Preprocessing
+
+# Positive rates of the Jigsaw train labels, in Config.LABELS order
+LABEL_RATES: list[float] = [0.0958, 0.0100, 0.0529, 0.0030, 0.0494, 0.0088]
+
+
+def make_labels(n_rows: int, seed: int = Config.SEED) -> np.ndarray:
+    """Correlated synthetic labels: sub-labels mostly fire on toxic rows."""
+    rng = np.random.default_rng(seed)
+    toxic = rng.random(n_rows) < LABEL_RATES[0]
+    labels = [toxic]
+    for rate in LABEL_RATES[1:]:
+        on_toxic = rng.random(n_rows) < min(1.0, 0.9 * rate / LABEL_RATES[0])
+        off_toxic = rng.random(n_rows) < 0.1 * rate
+        labels.append(np.where(toxic, on_toxic, off_toxic))
+    return np.stack(labels, axis=1).astype(np.int64)
+
+
+def label_distribution(y: np.ndarray, folds: list[np.ndarray]) -> float:
+    """Sechidis et al. LD: mean deviation of per-fold positive/negative ratios."""
+    positives = y.sum(axis=0)
+    overall = positives / (len(y) - positives)
+    deviations = []
+    for fold in folds:
+        fold_positives = y[fold].sum(axis=0)
+        deviations.append(
+            np.abs(fold_positives / (len(fold) - fold_positives) - overall)
+        )
+    return float(np.mean(deviations))
+
+
+def run_native(y: np.ndarray, val_size: float) -> list[np.ndarray]:
+    folds = Preprocessing.iterative_stratification(y, [1 - val_size, val_size])
+    return [np.flatnonzero(folds == 0), np.flatnonzero(folds == 1)]
+
+
+def run_reference(y: np.ndarray, val_size: float) -> list[np.ndarray]:
+    # Row indices stand in for the text column the previous split passed through
+    X = np.arange(len(y)).reshape(-1, 1)
+    X_train, _, X_val, _ = iterative_train_test_split(X, y, val_size)
+    return [X_train.ravel(), X_val.ravel()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--val-size", type=float, default=0.2)
+    parser.add_argument(
+        "--skip-reference-above",
+        type=int,
+        default=None,
+        help="Only time scikit-multilearn up to this many rows.",
+    )
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'method':>10} {'seconds':>10} {'LD':>10} {'val size':>10}")
+    for n_rows in args.rows:
+        y = make_labels(n_rows)
+        methods = {"native": run_native, "skmultilearn": run_reference}
+        for name, split in methods.items():
+            if (
+                name == "skmultilearn"
+                and args.skip_reference_above is not None
+                and n_rows > args.skip_reference_above
+            ):
+                continue
+            start_time = time.perf_counter()
+            folds = split(y, args.val_size)
+            seconds = time.perf_counter() - start_time
+            print(
+                f"{n_rows:>10} {name:>10} {seconds:>10.3f} "
+                f"{label_distribution(y, folds):>10.2e} {len(folds[1]):>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Synthetic Jigsaw-shaped corpora for the benchmarks, from 10k to millions of rows.
+
+Comment lengths follow the log-normal shape of the Jigsaw comments (median
+about 36 words, long tail clipped at 1,400) and labels keep the Jigsaw
+positive rates and their correlation with `toxic`. Toxic comments contain
+trigger words of their labels, so models have something to learn.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_stratification import make_labels
+from src import Config
+
+# Test rows per train row, and the share of test rows without labels (-1)
+TEST_RATIO: float = 153_164 / 159_571
+UNLABELED_TEST_FRACTION: float = 89_186 / 153_164
+
+MEDIAN_WORDS: int = 36
+MAX_WORDS: int = 1_400
+VOCABULARY_SIZE: int = 30_000
+BUFFER_WORDS: int = 4_000_000
+TRIGGERS_PER_LABEL: int = 20
+
+
+class WordBuffer:
+    """One Zipf-distributed word stream that comments are sliced from.
+
+    Slicing a shared buffer keeps generation linear in the number of rows
+    rather than the number of words, so millions of rows take seconds.
+    """
+
+    def __init__(self, rng: np.random.Generator) -> None:
+        words = [_make_word(i) for i in range(VOCABULARY_SIZE)]
+        word_lengths = np.array([len(word) for word in words])
+        ranks = (rng.zipf(1.2, BUFFER_WORDS) - 1) % VOCABULARY_SIZE
+        self.text = " ".join([words[rank] for rank in ranks]) + " "
+        self.word_starts = np.concatenate([[0], np.cumsum(word_lengths[ranks] + 1)])
+
+    def make_comments(self, labels: np.ndarray, rng: np.random.Generator) -> list[str]:
+        """One comment per label row, prefixed with a trigger word per label."""
+        n_rows = len(labels)
+        n_words = np.clip(
+            rng.lognormal(np.log(MEDIAN_WORDS), 1.1, n_rows).astype(int),
+            1,
+            MAX_WORDS,
+        )
+        first_words = rng.integers(0, BUFFER_WORDS - MAX_WORDS, n_rows)
+        starts = self.word_starts[first_words]
+        ends = self.word_starts[first_words + n_words] - 1
+
+        trigger_ids = rng.integers(TRIGGERS_PER_LABEL, size=labels.shape)
+        comments = []
+        for start, end, row_labels, row_triggers in zip(
+            starts, ends, labels, trigger_ids
+        ):
+            triggers = [
+                f"bad{label}x{row_triggers[label]} "
+                for label in np.flatnonzero(row_labels == 1)
+            ]
+            comments.append("".join(triggers) + self.text[start:end])
+        return comments
+
+
+def write_corpus(path: Path, n_train: int, seed: int = Config.SEED) -> None:
+    """Writes train, test and test_labels CSVs shaped like the Kaggle download."""
+    rng = np.random.default_rng(seed)
+    words = WordBuffer(rng)
+    n_test = max(1, round(n_train * TEST_RATIO))
+    path.mkdir(parents=True, exist_ok=True)
+
+    train_labels = make_labels(n_train, seed)
+    train_df = pd.DataFrame(
+        {
+            "id": [f"{i:016x}" for i in range(n_train)],
+            "comment_text": words.make_comments(train_labels, rng),
+        }
+    )
+    train_df[Config.LABELS] = train_labels
+    train_df.to_csv(path / "train.csv", index=False)
+
+    test_labels = make_labels(n_test, seed + 1)
+    test_ids = [f"{i:016x}" for i in range(n_train, n_train + n_test)]
+    pd.DataFrame(
+        {"id": test_ids, "comment_text": words.make_comments(test_labels, rng)}
+    ).to_csv(path / "test.csv", index=False)
+
+    test_labels[rng.random(n_test) < UNLABELED_TEST_FRACTION] = -1
+    test_labels_df = pd.DataFrame({"id": test_ids})
+    test_labels_df[Config.LABELS] = test_labels
+    test_labels_df.to_csv(path / "test_labels.csv", index=False)
+
+
+def _make_word(index: int) -> str:
+    """Pronounceable pseudo-words, shorter for the more frequent ranks."""
+    consonants, vowels = "bcdfghjklmnprstvwz", "aeiou"
+    letters = []
+    while True:
+        index, consonant = divmod(index, len(consonants))
+        index, vowel = divmod(index, len(vowels))
+        letters.append(consonants[consonant] + vowels[vowel])
+        if index == 0:
+            return "".join(letters)
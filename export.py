@@ -0,0 +1,62 @@
+import argparse
+from pathlib import Path
+
+import keras
+
+from src import Export, MakeDatasets, Modeling
+
+DATA_PARAMS = {
+    "val_size": 0.2,
+    "batch_size": 128,
+    "shuffle": True,
+    "force_make": False,
+}
+
+
+def load_model(model_path: Path) -> keras.Model:
+    """Loads a `TextClassifier.save` directory or a saved tf.keras BERT model."""
+    if (model_path / "config.json").exists():
+        return Modeling.TextClassifier.load(model_path).model
+
+    # The BERT classifier is a legacy tf.keras model built on TF Hub layers
+    import tensorflow_hub as hub
+    import tensorflow_text  # noqa: F401
+    import tf_keras
+
+    return tf_keras.models.load_model(
+        model_path, custom_objects={"KerasLayer": hub.KerasLayer}
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Export a classifier as a SavedModel and an int8 TFLite model."
+    )
+    parser.add_argument("model_path", type=Path)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--examples", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    model = load_model(args.model_path)
+    test_ds = MakeDatasets.Datasets(**DATA_PARAMS).test
+    report = Export.export_classifier(
+        model, args.output_dir, test_ds, args.examples, args.batch_size
+    )
+
+    print(f"{'label':>14} {'float':>8} {'int8':>8} {'change':>8}")
+    for label in report.labels:
+        print(
+            f"{label.label:>14} {label.float_accuracy:>8.4f} "
+            f"{label.quantized_accuracy:>8.4f} {label.change:>+8.4f}"
+        )
+    print(
+        f"p50 batch latency {report.float_latency.p50_ms:.2f} ms float, "
+        f"{report.quantized_latency.p50_ms:.2f} ms int8 ({report.speedup:.1f}x); "
+        f"size {report.saved_model_bytes / 2**20:.1f} MB SavedModel, "
+        f"{report.tflite_bytes / 2**20:.1f} MB TFLite"
+    )
+
+
+if __name__ == "__main__":
+    main()
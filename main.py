@@ -6,7 +6,24 @@ import tensorflow_hub as hub
 import tensorflow_text as text
 
 
-from src import bert, download, load_data, logging
+from src import (
+    Callbacks,
+    Checkpointing,
+    Config,
+    Distillation,
+    DownloadData,
+    Export,
+    Logging,
+    MakeDatasets,
+    Modeling,
+    Serving,
+)
+
+try:
+    from src import bert
+except ImportError:
+    # Without the BERT builder, only the TextClassifier is trained and exported
+    bert = None
 
 DATA_PARAMS = {
     "val_size": 0.2,
@@ -25,6 +42,31 @@ MODEL_PARAMS = {
     "dropout_rate": 0.1,
 }
 
+# XLA compilation and bfloat16 mixed precision, see Modeling.PerformanceMode
+PERFORMANCE_PARAMS = {
+    "jit_compile": False,
+    "mixed_precision": False,
+}
+
+# Flag input-bound epochs; set profile_steps=(start, stop) for a profiler trace
+MONITOR_PARAMS = {
+    "input_bound_fraction": 0.1,
+    "profile_steps": None,
+}
+
+# Soft-label targets for distilling BERT into the CNN, see Distillation
+DISTILLATION_PARAMS = {
+    "alpha": 0.5,
+    "temperature": 2.0,
+}
+
+# Background checkpoints of the full training state; a rerun resumes from them
+CHECKPOINT_PARAMS = {
+    "every_steps": None,
+    "every_seconds": 600.0,
+    "keep": 3,
+}
+
 TRAIN_PARMS = {
     "epochs": 3,
     "verbose": "auto",
@@ -32,8 +74,8 @@ TRAIN_PARMS = {
 
 
 def main() -> None:
-    _ = download.download_kaggle()
-    datasets = load_data.Datasets(**DATA_PARAMS)
+    _ = DownloadData.download_kaggle_dataset()
+    datasets = MakeDatasets.Datasets(**DATA_PARAMS)
     train_ds = datasets.train
     val_ds = datasets.val
     test_ds = datasets.test
@@ -42,17 +84,54 @@ def main() -> None:
     print("Val size:", len(val_ds))
     print("Test size:", len(test_ds))
 
+    performance = Modeling.PerformanceMode(**PERFORMANCE_PARAMS)
+    input_monitor = Callbacks.InputPipelineMonitor(**MONITOR_PARAMS)
+    checkpoint = Checkpointing.CheckpointConfig(**CHECKPOINT_PARAMS)
+
+    if bert is None:
+        print("No BERT builder in src, training TextClassifier only:")
+        classifier = Modeling.TextClassifier(**MODEL_PARAMS, performance=performance)
+        callbacks = Logging.setup_callbacks(
+            "text_classifier",
+            input_monitor=input_monitor,
+            checkpoint=checkpoint,
+            run_params={"data": datasets.hash, "model": classifier.config},
+        )
+        classifier.train(
+            Callbacks.instrument_dataset(train_ds, callbacks),
+            epochs=TRAIN_PARMS["epochs"],
+            metrics=Modeling.get_metrics(),
+            val_dataset=val_ds,
+            callbacks=callbacks,
+            vocabulary=datasets.vocabulary(classifier.tokenizer),
+        )
+        export_dir = Config.MODEL_DIR / "text_classifier" / "export"
+        export_report = Export.export_classifier(classifier.model, export_dir, test_ds)
+        print(export_report.model_dump_json(indent=2))
+        return
+
     steps_per_epoch = tf.data.experimental.cardinality(train_ds).numpy()
 
+    # The policy applies to layers created after it is set, so set it before
+    # building. The builder must keep its output layer in float32
+    tf.keras.mixed_precision.set_global_policy(performance.dtype_policy)
     bert_classifier = bert.build_compiled_bert_classifier(
         epochs=TRAIN_PARMS["epochs"],
         steps_per_epoch=steps_per_epoch,
     )
+    bert_classifier.jit_compile = performance.jit_compile
 
-    callbacks = logging.setup_callbacks("bert_classifier")
+    callbacks = Logging.setup_callbacks(
+        "bert_classifier",
+        input_monitor=input_monitor,
+        checkpoint=checkpoint,
+        run_params={"data": datasets.hash, "performance": PERFORMANCE_PARAMS},
+    )
+    train_ds = Callbacks.instrument_dataset(train_ds, callbacks)
 
     print("Training BERT Model:")
-    history = bert_classifier.fit(
+    history = Checkpointing.fit(
+        bert_classifier,
         train_ds,
         validation_data=val_ds,
         callbacks=callbacks,
@@ -62,6 +141,29 @@ def main() -> None:
     test_results = bert_classifier.evaluate(test_ds, return_dict=True)
     print(test_results)
 
+    # SavedModel and int8 TFLite exports, compared on the test split
+    export_dir = Config.MODEL_DIR / "bert_classifier" / "export"
+    export_report = Export.export_classifier(bert_classifier, export_dir, test_ds)
+    print(export_report.model_dump_json(indent=2))
+
+    # Distil BERT into the CNN, scoring the train split once with the export
+    teacher = Serving.load_scorer(export_dir / Export.SAVED_MODEL_DIR)
+    student = Modeling.TextClassifier(**MODEL_PARAMS)
+    print("Training distilled TextClassifier:")
+    student.train(
+        datasets.with_teacher_scores(
+            MakeDatasets.Split.TRAIN, teacher, "bert_classifier"
+        ),
+        epochs=TRAIN_PARMS["epochs"],
+        metrics=Modeling.get_metrics(),
+        val_dataset=val_ds,
+        distillation=Distillation.DistillationConfig(**DISTILLATION_PARAMS),
+    )
+    distillation_report = Distillation.distillation_report(
+        teacher, student.predict_proba, test_ds
+    )
+    print(distillation_report.model_dump_json(indent=2))
+
 
 if __name__ == "__main__":
     main()
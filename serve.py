@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+from pathlib import Path
+
+from src import Caching, Serving
+
+SERVING_PARAMS = {
+    "max_batch_size": 64,
+    "max_wait_ms": 5.0,
+}
+
+CACHE_PARAMS = {
+    "max_entries": 100_000,
+    "max_bytes": 256 * 2**20,
+    "ttl_seconds": 24 * 3600.0,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve toxicity scores on localhost.")
+    parser.add_argument("model_dir", type=Path)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--cache-dir", type=Path, help="Keep cached scores on disk across restarts"
+    )
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    scorer = Serving.load_scorer(
+        args.model_dir, batch_size=SERVING_PARAMS["max_batch_size"]
+    )
+    if not args.no_cache:
+        scorer = Caching.PredictionCache(
+            scorer=scorer,
+            model_version=Caching.model_version(args.model_dir),
+            disk_path=args.cache_dir / "scores.sqlite" if args.cache_dir else None,
+            **CACHE_PARAMS,
+        )
+    batcher = Serving.MicroBatcher(scorer=scorer, **SERVING_PARAMS)
+    server = Serving.ScoringServer(batcher=batcher, host=args.host, port=args.port)
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
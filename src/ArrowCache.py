@@ -0,0 +1,54 @@
+"""Columnar Arrow IPC cache of the raw CSV files, keyed by source checksum."""
+
+import os
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from . import Config, DownloadData, Logging
+
+logger = Logging.setup_logger(__name__)
+
+
+def read_raw_columns(
+    file: DownloadData.Files,
+    download_path: Path,
+    sha256: str,
+    columns: list[str],
+) -> pd.DataFrame:
+    """Reads columns of a raw file, converting the CSV to Arrow on first use.
+
+    The cache is uncompressed Arrow IPC so reads are memory-mapped and only
+    touch the requested columns.
+    """
+    cache_path = _cache_path(file, sha256)
+    if not cache_path.exists():
+        _write_cache(download_path / file.value, cache_path)
+
+    table = feather.read_table(cache_path, columns=columns, memory_map=True)
+    logger.debug("Read columns %s of %s from %s", columns, file.value, cache_path)
+    return table.to_pandas()
+
+
+def _cache_path(file: DownloadData.Files, sha256: str) -> Path:
+    stem = Path(file.value).stem
+    return Config.ARROW_DIR / f"{stem}-{sha256[:16]}.arrow"
+
+
+def _write_cache(csv_path: Path, cache_path: Path) -> None:
+    """Parses the CSV once and writes it atomically, replacing stale versions."""
+    logger.debug("Converting %s to Arrow at %s", csv_path, cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+    table = pa.Table.from_pandas(pd.read_csv(csv_path), preserve_index=False)
+    tmp_path = cache_path.with_suffix(".arrow.tmp")
+    feather.write_feather(table, str(tmp_path), compression="uncompressed")
+    os.replace(tmp_path, cache_path)
+
+    stem = cache_path.name.rsplit("-", 1)[0]
+    for stale_path in cache_path.parent.glob(f"{stem}-*.arrow"):
+        if stale_path != cache_path:
+            stale_path.unlink()
+            logger.debug("Removed stale Arrow cache %s", stale_path)
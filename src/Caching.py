@@ -0,0 +1,219 @@
+"""LRU cache of model scores keyed by normalized comment text and model version."""
+
+import hashlib
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+from pydantic import BaseModel, NonNegativeInt, PositiveFloat, PositiveInt
+
+from . import Logging
+from .Preprocessing import normalize_text
+
+logger = Logging.setup_logger(__name__)
+
+Scorer = Callable[[list[str]], np.ndarray]
+
+# Memory of an entry besides its key and scores: the (scores, time) tuple,
+# the timestamp and the OrderedDict slot, measured with tracemalloc
+_ENTRY_OVERHEAD_BYTES: int = 185
+
+
+class CacheStats(BaseModel):
+    """Lookups served from each tier and the current size of the memory tier."""
+
+    hits: NonNegativeInt = 0
+    disk_hits: NonNegativeInt = 0
+    misses: NonNegativeInt = 0
+    evictions: NonNegativeInt = 0
+    expirations: NonNegativeInt = 0
+    entries: NonNegativeInt = 0
+    memory_bytes: NonNegativeInt = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of comments scored without calling the model."""
+        lookups = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / lookups if lookups else 0.0
+
+
+def model_version(model_path: Path) -> str:
+    """Fingerprint of a saved model from the names, sizes and mtimes of its files.
+
+    Overwriting a model changes its version, so its cached scores are no
+    longer looked up, without reading gigabytes of weights to hash them.
+    """
+    paths = [model_path] if model_path.is_file() else sorted(model_path.rglob("*"))
+    digest = hashlib.sha256()
+    for path in paths:
+        if path.is_file():
+            stat = path.stat()
+            name = path.relative_to(model_path.parent)
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+class PredictionCache(BaseModel):
+    """Serves repeated comments from an LRU cache in front of any scorer.
+
+    Wraps a scorer such as `TextClassifier.predict_proba` or one from
+    `Serving.load_scorer` and is itself a scorer. Entries are keyed by a
+    hash of the `normalize_text` comment and `model_version`, so scores of
+    an older model are never served. The scorer is given the normalized
+    comments, so comments sharing a key always share the model's input. The
+    memory tier keeps at most `max_entries` entries and `max_bytes` bytes,
+    evicting the least recently used, and entries older than `ttl_seconds`
+    are dropped. With `disk_path`, scores are also written to a SQLite file
+    that survives restarts, and memory misses are looked up there. Comments
+    repeated within a batch are scored once.
+    """
+
+    scorer: Scorer
+    model_version: str
+    max_entries: PositiveInt = 100_000
+    max_bytes: Optional[PositiveInt] = None
+    ttl_seconds: Optional[PositiveFloat] = None
+    lowercase: bool = False
+    disk_path: Optional[Path] = None
+
+    _entries: OrderedDict = OrderedDict()
+    _stats: CacheStats = CacheStats()
+    _lock: Optional[threading.Lock] = None
+    _disk: Optional[sqlite3.Connection] = None
+
+    def model_post_init(self, __context) -> None:
+        self._lock = threading.Lock()
+        if self.disk_path is not None:
+            self._open_disk()
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        normalized = [normalize_text(text, self.lowercase) for text in texts]
+        keys = [self._hash(text) for text in normalized]
+        scores: list[Optional[np.ndarray]] = [None] * len(texts)
+        missing: dict[bytes, list[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in missing:
+                    missing[key].append(i)
+                    self._stats.hits += 1
+                elif (cached := self._get(key)) is not None:
+                    scores[i] = cached
+                else:
+                    missing[key] = [i]
+                    self._stats.misses += 1
+
+        if missing:
+            new_scores = self.scorer(
+                [normalized[indices[0]] for indices in missing.values()]
+            )
+            with self._lock:
+                for (key, indices), key_scores in zip(missing.items(), new_scores):
+                    # A copy, so the entry does not keep the whole batch alive
+                    key_scores = np.array(key_scores, dtype=np.float32)
+                    self._put(key, key_scores)
+                    for i in indices:
+                        scores[i] = key_scores
+                if self._disk is not None:
+                    self._disk.commit()
+        return np.stack(scores)
+
+    def key(self, text: str) -> bytes:
+        return self._hash(normalize_text(text, self.lowercase))
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return self._stats.model_copy()
+
+    def clear(self) -> None:
+        """Empties both tiers."""
+        with self._lock:
+            self._entries.clear()
+            self._stats.entries, self._stats.memory_bytes = 0, 0
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM scores")
+                self._disk.commit()
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def _hash(self, normalized: str) -> bytes:
+        return hashlib.sha256(f"{self.model_version}\0{normalized}".encode()).digest()
+
+    def _get(self, key: bytes) -> Optional[np.ndarray]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            scores, stored_at = entry
+            if not self._expired(stored_at, time.monotonic()):
+                self._entries.move_to_end(key)
+                self._stats.hits += 1
+                return scores
+            self._remove(key)
+            self._stats.expirations += 1
+
+        if self._disk is None:
+            return None
+        row = self._disk.execute(
+            "SELECT scores, stored_at FROM scores WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or self._expired(row[1], time.time()):
+            return None
+        scores = np.frombuffer(row[0], dtype=np.float32).copy()
+        self._add(key, scores)
+        self._stats.disk_hits += 1
+        return scores
+
+    def _put(self, key: bytes, scores: np.ndarray) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._add(key, scores)
+        if self._disk is not None:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?)",
+                (key, scores.tobytes(), time.time()),
+            )
+
+    def _add(self, key: bytes, scores: np.ndarray) -> None:
+        self._entries[key] = (scores, time.monotonic())
+        self._stats.entries += 1
+        self._stats.memory_bytes += _entry_bytes(key, scores)
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self._stats.memory_bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+            self._stats.evictions += 1
+
+    def _remove(self, key: bytes) -> None:
+        scores, _ = self._entries.pop(key)
+        self._stats.entries -= 1
+        self._stats.memory_bytes -= _entry_bytes(key, scores)
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - stored_at > self.ttl_seconds
+
+    def _open_disk(self) -> None:
+        self.disk_path.parent.mkdir(parents=True, exist_ok=True)
+        # Scoring runs on a worker thread; every use is under `_lock`
+        self._disk = sqlite3.connect(self.disk_path, check_same_thread=False)
+        self._disk.execute(
+            "CREATE TABLE IF NOT EXISTS scores "
+            "(key BLOB PRIMARY KEY, scores BLOB, stored_at REAL)"
+        )
+        if self.ttl_seconds is not None:
+            expired = self._disk.execute(
+                "DELETE FROM scores WHERE stored_at < ?",
+                (time.time() - self.ttl_seconds,),
+            ).rowcount
+            logger.debug("Dropped %d expired cached scores", expired)
+        self._disk.commit()
+        logger.debug("Opened prediction cache at %s", self.disk_path)
+
+
+def _entry_bytes(key: bytes, scores: np.ndarray) -> int:
+    return sys.getsizeof(key) + sys.getsizeof(scores) + _ENTRY_OVERHEAD_BYTES
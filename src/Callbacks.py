@@ -0,0 +1,286 @@
+"""Keras callbacks that measure where training time goes."""
+
+import json
+import time
+from pathlib import Path
+from typing import Optional
+
+import keras
+import numpy as np
+import tensorflow as tf
+
+from . import Logging, Preprocessing
+from .Types import Dataset
+
+logger = Logging.setup_logger(__name__)
+
+
+class InputPipelineMonitor(keras.callbacks.Callback):
+    """Splits each train step into time waiting on `tf.data` and compute time.
+
+    Keras fetches batches inside the compiled train step, so the wait cannot
+    be seen from batch hooks alone. `instrument` appends a map that stamps the
+    time each batch reaches the model; the wait is the stamp minus the step
+    start, and compute is the rest of the step. Epochs where the wait exceeds
+    `input_bound_fraction` of step time are flagged as input-bound. The wait
+    includes the step's dispatch overhead, well under a millisecond, so only
+    very small models look input-bound on a fast pipeline.
+
+    With `profile_steps=(start, stop)`, a TF profiler trace of those global
+    train steps is written to `profile_dir` for TensorBoard's profile tab;
+    `Logging.setup_callbacks` points it at the run's TensorBoard directory.
+    """
+
+    def __init__(
+        self,
+        input_bound_fraction: float = 0.1,
+        profile_steps: Optional[tuple[int, int]] = None,
+        profile_dir: Optional[Path] = None,
+    ) -> None:
+        super().__init__()
+        self.input_bound_fraction = input_bound_fraction
+        self.profile_steps = profile_steps
+        self.profile_dir = profile_dir
+
+        self._ready_times: list[float] = []
+        self._step_start = 0.0
+        self._global_step = 0
+        self._profiling = False
+        self._wait_times: list[float] = []
+        self._compute_times: list[float] = []
+
+    def instrument(self, dataset: Dataset) -> Dataset:
+        """Returns the train dataset with each batch stamped as it is consumed.
+
+        Apply last, after `prefetch`, so the stamp marks when the batch is
+        handed to the train step rather than when it was produced.
+        """
+
+        def stamp() -> np.int64:
+            self._ready_times.append(time.perf_counter())
+            return np.int64(len(self._ready_times))
+
+        def stamp_batch(*batch):
+            stamped = tf.py_function(stamp, [], tf.int64)
+            with tf.control_dependencies([stamped]):
+                return tf.nest.map_structure(tf.identity, batch)
+
+        # An injected prefetch after the stamp would stamp batches too early
+        options = tf.data.Options()
+        options.experimental_optimization.inject_prefetch = False
+        return dataset.map(stamp_batch).with_options(options)
+
+    @property
+    def input_wait_fraction(self) -> float:
+        """Share of the last epoch's step time spent waiting on the input."""
+        total = sum(self._wait_times) + sum(self._compute_times)
+        return sum(self._wait_times) / total if total > 0 else 0.0
+
+    def on_train_begin(self, logs=None) -> None:
+        if self.profile_steps is not None and self.profile_dir is None:
+            raise ValueError("`profile_steps` needs a `profile_dir` for the trace")
+
+    def on_epoch_begin(self, epoch, logs=None) -> None:
+        self._wait_times, self._compute_times = [], []
+
+    def on_train_batch_begin(self, batch, logs=None) -> None:
+        if (
+            self.profile_steps is not None
+            and self._global_step == self.profile_steps[0]
+        ):
+            tf.profiler.experimental.start(str(self.profile_dir))
+            self._profiling = True
+        self._ready_times.clear()
+        self._step_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None) -> None:
+        step_end = time.perf_counter()
+        # The first step traces the train function, which is neither wait nor
+        # compute. Without a stamp, e.g. an uninstrumented dataset, the whole
+        # step counts as compute
+        if self._global_step > 0:
+            ready = self._ready_times[-1] if self._ready_times else self._step_start
+            ready = min(max(ready, self._step_start), step_end)
+            self._wait_times.append(ready - self._step_start)
+            self._compute_times.append(step_end - ready)
+
+        if self._profiling and self._global_step == self.profile_steps[1]:
+            self._stop_profiler()
+        self._global_step += 1
+
+    def on_epoch_end(self, epoch, logs=None) -> None:
+        if not self._compute_times:
+            return
+        wait_ms = 1e3 * float(np.mean(self._wait_times))
+        compute_ms = 1e3 * float(np.mean(self._compute_times))
+        fraction = self.input_wait_fraction
+        if logs is not None:
+            logs["input_wait_fraction"] = fraction
+
+        if fraction > self.input_bound_fraction:
+            logger.warning(
+                "Epoch %d is input-bound: %.0f%% of step time waiting on tf.data "
+                "(%.2f ms wait vs %.2f ms compute per step). Consider caching, "
+                "more parallel map calls or pre-tokenized datasets.",
+                epoch + 1,
+                100 * fraction,
+                wait_ms,
+                compute_ms,
+            )
+        else:
+            logger.info(
+                "Epoch %d is compute-bound: %.0f%% of step time waiting on tf.data "
+                "(%.2f ms wait vs %.2f ms compute per step)",
+                epoch + 1,
+                100 * fraction,
+                wait_ms,
+                compute_ms,
+            )
+
+    def on_train_end(self, logs=None) -> None:
+        if self._profiling:
+            self._stop_profiler()
+
+    def _stop_profiler(self) -> None:
+        tf.profiler.experimental.stop()
+        self._profiling = False
+        logger.debug("Wrote profiler trace to %s", self.profile_dir)
+
+
+class ThroughputMonitor(keras.callbacks.Callback):
+    """Logs examples/s, tokens/s and p50/p95/p99 step time every epoch.
+
+    Counts come from a dataset passed through `instrument`: token ids are
+    counted without padding and raw text by whitespace-separated words.
+    Rates are over the epoch's train steps, excluding validation, and the
+    first epoch includes tracing the train function. Results are added to
+    the epoch logs, written as TensorBoard scalars under `tensorboard_dir`
+    and appended as one JSON line per epoch to `metrics_path`.
+    """
+
+    def __init__(
+        self,
+        run_name: str = "",
+        metrics_path: Optional[Path] = None,
+        tensorboard_dir: Optional[Path] = None,
+    ) -> None:
+        super().__init__()
+        self.run_name = run_name
+        self.metrics_path = metrics_path
+        self.tensorboard_dir = tensorboard_dir
+
+        self._examples = 0
+        self._tokens = 0
+        self._instrumented = False
+        self._counting = False
+        self._step_start = 0.0
+        self._epoch_start: Optional[float] = None
+        self._epoch_end = 0.0
+        self._step_times: list[float] = []
+        self._writer = None
+
+    def instrument(self, dataset: Dataset) -> Dataset:
+        """Returns the train dataset with examples and tokens counted per batch."""
+
+        def count(n_examples: tf.Tensor, n_tokens: tf.Tensor) -> np.int64:
+            if self._counting:
+                self._examples += int(n_examples)
+                self._tokens += int(n_tokens)
+            return np.int64(self._examples)
+
+        def count_batch(*batch):
+            features, labels = batch[0], batch[1]
+            counted = tf.py_function(
+                count,
+                [tf.shape(labels, out_type=tf.int64)[0], _count_tokens(features)],
+                tf.int64,
+            )
+            with tf.control_dependencies([counted]):
+                return tf.nest.map_structure(tf.identity, batch)
+
+        self._instrumented = True
+        return dataset.map(count_batch)
+
+    def on_train_begin(self, logs=None) -> None:
+        if self.tensorboard_dir is not None and self._writer is None:
+            self._writer = tf.summary.create_file_writer(
+                str(self.tensorboard_dir / "throughput")
+            )
+
+    def on_epoch_begin(self, epoch, logs=None) -> None:
+        self._examples, self._tokens = 0, 0
+        self._counting = True
+        self._epoch_start = None
+        self._step_times = []
+
+    def on_test_begin(self, logs=None) -> None:
+        # Validation may reuse the instrumented dataset
+        self._counting = False
+
+    def on_train_batch_begin(self, batch, logs=None) -> None:
+        self._step_start = time.perf_counter()
+        if self._epoch_start is None:
+            self._epoch_start = self._step_start
+
+    def on_train_batch_end(self, batch, logs=None) -> None:
+        self._epoch_end = time.perf_counter()
+        self._step_times.append(self._epoch_end - self._step_start)
+
+    def on_epoch_end(self, epoch, logs=None) -> None:
+        if not self._step_times:
+            return
+        metrics = self._epoch_metrics()
+        if logs is not None:
+            logs.update(metrics)
+
+        logger.info(
+            "Epoch %d throughput: %s",
+            epoch + 1,
+            ", ".join(f"{name} {value:.1f}" for name, value in metrics.items()),
+        )
+        if self._writer is not None:
+            with self._writer.as_default():
+                for name, value in metrics.items():
+                    tf.summary.scalar(f"throughput/{name}", value, step=epoch)
+            self._writer.flush()
+        if self.metrics_path is not None:
+            self.metrics_path.parent.mkdir(parents=True, exist_ok=True)
+            record = {"run": self.run_name, "epoch": epoch + 1, **metrics}
+            with open(self.metrics_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def _epoch_metrics(self) -> dict[str, float]:
+        seconds = self._epoch_end - self._epoch_start
+        step_ms = 1e3 * np.array(self._step_times)
+        metrics = {"steps_per_sec": len(step_ms) / seconds}
+        if self._instrumented:
+            metrics["examples_per_sec"] = self._examples / seconds
+            metrics["tokens_per_sec"] = self._tokens / seconds
+            metrics["mean_batch_size"] = self._examples / len(step_ms)
+        for q in (50, 95, 99):
+            metrics[f"step_ms_p{q}"] = float(np.percentile(step_ms, q))
+        return metrics
+
+
+def instrument_dataset(
+    dataset: Dataset, callbacks: list[keras.callbacks.Callback]
+) -> Dataset:
+    """Applies the `instrument` of every callback that has one to the dataset.
+
+    The input pipeline monitor goes last so its stamp marks when a batch
+    reaches the train step.
+    """
+    instrumenting = sorted(
+        (callback for callback in callbacks if hasattr(callback, "instrument")),
+        key=lambda callback: isinstance(callback, InputPipelineMonitor),
+    )
+    for callback in instrumenting:
+        dataset = callback.instrument(dataset)
+    return dataset
+
+
+def _count_tokens(features) -> tf.Tensor:
+    if isinstance(features, tf.Tensor) and features.dtype == tf.string:
+        words = tf.strings.split(tf.reshape(features, [-1]))
+        return tf.reduce_sum(words.row_lengths())
+    return tf.reduce_sum(Preprocessing.token_lengths(features))
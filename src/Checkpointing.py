@@ -0,0 +1,256 @@
+"""Resumable training from periodic background checkpoints of the full training state."""
+
+import hashlib
+import json
+import shutil
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+
+import keras
+import tensorflow as tf
+from pydantic import BaseModel, PositiveFloat, PositiveInt
+
+from . import Logging
+from .Types import Callback, Dataset, History, Model
+
+logger = Logging.setup_logger(__name__)
+
+
+class CheckpointConfig(BaseModel):
+    """When to checkpoint and how many checkpoints to keep.
+
+    A checkpoint is written every `every_steps` train steps or once
+    `every_seconds` have passed since the last one, whichever comes first,
+    and at the end of every epoch.
+    """
+
+    every_steps: Optional[PositiveInt] = None
+    every_seconds: Optional[PositiveFloat] = 600.0
+    keep: PositiveInt = 3
+    async_save: bool = True
+
+
+class TrainingCheckpoint(keras.callbacks.Callback):
+    """Checkpoints weights, optimizer state, epoch and step under `directory`.
+
+    Each run writes to a subdirectory named by a fingerprint of its
+    `run_params` (such as the model params and dataset hash), its epochs,
+    the shapes of the model's variables and the optimizer config, so a run
+    only resumes from checkpoints of the same run.
+
+    The step counts the batches of the current epoch already trained on, so
+    it is the position of the data iterator: `fit` skips those batches when
+    it resumes, which picks up exactly where training stopped as long as the
+    train dataset is deterministic, as `Datasets` splits are by default.
+    Every variable of the model and optimizer, random seed state included,
+    is first copied into a shadow variable; with `async_save`, the shadows
+    are then written by a background thread, so training only waits for the
+    copy (TensorFlow's own async checkpoints cannot copy Keras 3 variables
+    more than once). Only the last `keep` checkpoints are kept.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        config: CheckpointConfig = CheckpointConfig(),
+        run_params: Optional[dict[str, Any]] = None,
+    ) -> None:
+        super().__init__()
+        self.directory = directory
+        self.config = config
+        self.run_params = run_params or {}
+
+        self._epoch = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self._step = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self._variables: list = []
+        self._shadows: list[tf.Variable] = []
+        self._checkpoint: Optional[tf.train.Checkpoint] = None
+        self._manager: Optional[tf.train.CheckpointManager] = None
+        self._tracked_model: Optional[Model] = None
+        self._run_dir: Optional[Path] = None
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._pending: Optional[Future] = None
+        self._current_epoch = 0
+        self._step_offset = 0
+        self._steps_since_save = 0
+        self._last_save = 0.0
+
+    @property
+    def run_dir(self) -> Optional[Path]:
+        """Checkpoint directory of the run, once training has started."""
+        return self._run_dir
+
+    @property
+    def latest(self) -> Optional[str]:
+        """Path prefix of the newest checkpoint of the run, if any."""
+        if self._run_dir is None:
+            return None
+        return tf.train.latest_checkpoint(str(self._run_dir))
+
+    def restore(self, model: Model, epochs: int) -> tuple[int, int]:
+        """Loads the newest checkpoint into `model`, returning its (epoch, step).
+
+        Returns (0, 0), the start of training, when the run of `epochs`
+        epochs has no checkpoint.
+        """
+        self._track(model, epochs)
+        if self.latest is None:
+            return 0, 0
+        self._checkpoint.restore(self.latest).assert_consumed()
+        for variable, shadow in zip(self._variables, self._shadows):
+            variable.assign(shadow)
+        epoch, step = int(self._epoch), int(self._step)
+        self._step_offset = step
+        logger.info(
+            "Resuming from %s at epoch %d, step %d", self.latest, epoch + 1, step
+        )
+        return epoch, step
+
+    def clear(self) -> None:
+        """Deletes the checkpoints of the run."""
+        self._wait()
+        if self._run_dir is not None:
+            shutil.rmtree(self._run_dir, ignore_errors=True)
+
+    def on_train_begin(self, logs=None) -> None:
+        self._track(self.model, self.params["epochs"])
+        self._last_save = time.perf_counter()
+        self._steps_since_save = 0
+
+    def on_epoch_begin(self, epoch, logs=None) -> None:
+        self._current_epoch = epoch
+
+    def on_train_batch_end(self, batch, logs=None) -> None:
+        self._steps_since_save += 1
+        every_steps, every_seconds = self.config.every_steps, self.config.every_seconds
+        if (every_steps is not None and self._steps_since_save >= every_steps) or (
+            every_seconds is not None
+            and time.perf_counter() - self._last_save >= every_seconds
+        ):
+            self._save(self._current_epoch, self._step_offset + batch + 1)
+
+    def on_epoch_end(self, epoch, logs=None) -> None:
+        self._step_offset = 0
+        self._save(epoch + 1, 0)
+
+    def on_train_end(self, logs=None) -> None:
+        # Finish the background write before the caller reads or deletes it
+        self._wait()
+
+    def _track(self, model: Model, epochs: int) -> None:
+        """Builds the checkpoint of `model`, creating its optimizer state first."""
+        if model is self._tracked_model:
+            return
+        if not getattr(model.optimizer, "built", False):
+            model.optimizer.build(model.trainable_variables)
+        self._variables = [*model.variables, *model.optimizer.variables]
+        self._run_dir = self.directory / self._fingerprint(model, epochs)
+        self._shadows = [
+            tf.Variable(tf.convert_to_tensor(variable), trainable=False)
+            for variable in self._variables
+        ]
+        self._checkpoint = tf.train.Checkpoint(
+            variables=self._shadows, epoch=self._epoch, step=self._step
+        )
+        self._manager = tf.train.CheckpointManager(
+            self._checkpoint, str(self._run_dir), max_to_keep=self.config.keep
+        )
+        self._tracked_model = model
+
+    def _fingerprint(self, model: Model, epochs: int) -> str:
+        optimizer_config = model.optimizer.get_config()
+        optimizer_config.pop("name", None)
+        run = {
+            "run_params": self.run_params,
+            "epochs": epochs,
+            # Shapes rather than layer names, which change with every model built
+            "variables": [(v.shape, v.dtype) for v in self._variables],
+            "optimizer": [type(model.optimizer).__name__, optimizer_config],
+        }
+        run_json = json.dumps(run, sort_keys=True, default=str)
+        return hashlib.sha256(run_json.encode()).hexdigest()[:10]
+
+    def _save(self, epoch: int, step: int) -> None:
+        start_time = time.perf_counter()
+        # The shadows must not change while the previous checkpoint is written
+        self._wait()
+        for variable, shadow in zip(self._variables, self._shadows):
+            shadow.assign(variable)
+        self._epoch.assign(epoch)
+        self._step.assign(step)
+        if self.config.async_save:
+            self._pending = self._writer.submit(self._manager.save)
+        else:
+            self._manager.save()
+        logger.debug(
+            "Checkpointing epoch %d, step %d, blocked training for %.1f ms",
+            epoch + 1,
+            step,
+            1e3 * (time.perf_counter() - start_time),
+        )
+        self._steps_since_save = 0
+        self._last_save = time.perf_counter()
+
+    def _wait(self) -> None:
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+
+def fit(
+    model: Model,
+    train_dataset: Dataset,
+    epochs: int,
+    callbacks: Optional[list[Callback]] = None,
+    **fit_kwargs,
+) -> History:
+    """`model.fit` resuming from the last checkpoint of a `TrainingCheckpoint`.
+
+    Without a `TrainingCheckpoint` in `callbacks`, this is plain `model.fit`.
+    Otherwise the model and optimizer are restored, an interrupted epoch is
+    finished without the batches it already trained on, and training goes
+    on to `epochs`. The returned history covers the epochs of this run.
+    Checkpoints of a finished run are deleted, so rerunning it trains anew.
+    """
+    checkpoint = next(
+        (cb for cb in callbacks or [] if isinstance(cb, TrainingCheckpoint)), None
+    )
+    if checkpoint is None:
+        return model.fit(
+            train_dataset, epochs=epochs, callbacks=callbacks, **fit_kwargs
+        )
+
+    epoch, step = checkpoint.restore(model, epochs)
+    histories = []
+    if step > 0:
+        histories.append(
+            model.fit(
+                train_dataset.skip(step),
+                initial_epoch=epoch,
+                epochs=epoch + 1,
+                callbacks=callbacks,
+                **fit_kwargs,
+            )
+        )
+        epoch += 1
+    if epoch < epochs or not histories:
+        histories.append(
+            model.fit(
+                train_dataset,
+                initial_epoch=epoch,
+                epochs=epochs,
+                callbacks=callbacks,
+                **fit_kwargs,
+            )
+        )
+
+    checkpoint.clear()
+
+    history = histories[-1]
+    for earlier in reversed(histories[:-1]):
+        history.epoch = earlier.epoch + history.epoch
+        for key, values in earlier.history.items():
+            history.history[key] = values + history.history.get(key, [])
+    return history
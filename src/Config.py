@@ -15,6 +15,8 @@ LABELS: list[str] = [
 ]
 
 DATA_DIR: Path = Path(__file__).parent.parent / "data"
+KAGGLE_DIR: Path = DATA_DIR / "kaggle"
+ARROW_DIR: Path = DATA_DIR / "arrow"
 TENSORFLOW_DIR: Path = DATA_DIR / "tensorflow"
 
 MODEL_DIR: Path = Path(__file__).parent.parent / "models"
@@ -0,0 +1,194 @@
+"""Near-duplicate comment removal with MinHash signatures and LSH banding."""
+
+from enum import Enum
+from functools import partial
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from pydantic import BaseModel, Field, PositiveInt
+
+from . import Logging, Parallel
+from .Preprocessing import normalize_text
+
+logger = Logging.setup_logger(__name__)
+
+_MERSENNE_PRIME: int = (1 << 61) - 1
+# Odd 64-bit constant mixing packed shingles into 32-bit hashes (Fibonacci hashing)
+_MIX: int = 0x9E3779B97F4A7C15
+# Rows per signature task; large enough to amortize pickling the texts
+_CHUNK_SIZE: int = 4096
+
+
+class DedupMode(Enum):
+    """What happens to near-duplicates within a split.
+
+    DROP keeps the first comment of a group. MERGE also gives it every
+    label set in the group. Near-duplicates of comments in other splits are
+    always dropped, so evaluation labels never come from train.
+    """
+
+    DROP = "drop"
+    MERGE = "merge"
+
+
+class DedupConfig(BaseModel):
+    """Comments are near-duplicates when their estimated Jaccard similarity
+    over character `shingle_size`-grams of the lowercased, whitespace
+    normalized text is at least `threshold`.
+    """
+
+    threshold: float = Field(default=0.8, gt=0, le=1)
+    shingle_size: int = Field(default=5, ge=1, le=8)
+    num_perm: PositiveInt = 128
+    seed: int = 0
+    mode: DedupMode = DedupMode.DROP
+
+    @property
+    def bands(self) -> tuple[int, int]:
+        """LSH bands and rows per band whose S-curve midpoint is nearest `threshold`.
+
+        Pairs agreeing on every row of any band become candidates, which
+        happens with probability 1 - (1 - s^rows)^bands at similarity s.
+        """
+        divisors = [r for r in range(1, self.num_perm + 1) if self.num_perm % r == 0]
+        rows = min(
+            divisors,
+            key=lambda r: abs((r / self.num_perm) ** (1 / r) - self.threshold),
+        )
+        return self.num_perm // rows, rows
+
+
+def minhash_signatures(texts: list[str], config: DedupConfig) -> np.ndarray:
+    """`config.num_perm` MinHash values of each text's shingles, as uint32 rows."""
+    rng = np.random.default_rng(config.seed)
+    a = rng.integers(1, 1 << 32, size=(config.num_perm, 1), dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=(config.num_perm, 1), dtype=np.uint64)
+    shifts = np.arange(config.shingle_size, dtype=np.uint64) * np.uint64(8)
+
+    signatures = np.empty((len(texts), config.num_perm), dtype=np.uint32)
+    for i, text in enumerate(texts):
+        data = np.frombuffer(normalize_text(text, lowercase=True).encode(), np.uint8)
+        if len(data) < config.shingle_size:
+            # A comment shorter than a shingle is one shingle
+            data = np.pad(data, (0, config.shingle_size - len(data)))
+        windows = sliding_window_view(data.astype(np.uint64), config.shingle_size)
+        # Up to 8 bytes pack exactly into one integer before hashing
+        shingles = np.unique((windows << shifts).sum(axis=1, dtype=np.uint64))
+        hashes = (shingles * np.uint64(_MIX)) >> np.uint64(32)
+        permuted = (a * hashes + b) % np.uint64(_MERSENNE_PRIME)
+        signatures[i] = (permuted & np.uint64(0xFFFFFFFF)).min(axis=1)
+    return signatures
+
+
+def near_duplicate_groups(signatures: np.ndarray, config: DedupConfig) -> np.ndarray:
+    """First row of each row's group of rows linked by near-duplicate pairs.
+
+    Rows landing in the same bucket of a band are compared with the first
+    row of that bucket, so a bucket of n rows costs n comparisons rather
+    than n^2, and pairs at or above `threshold` are joined transitively.
+    Rows with identical signatures, such as exact copies, are always joined.
+    """
+    n_bands, rows = config.bands
+    bands = [
+        _bucket_pairs(signatures[:, band * rows : (band + 1) * rows])
+        for band in range(n_bands)
+    ]
+    pairs = np.unique(np.concatenate([np.empty((0, 2), np.int64), *bands]), axis=0)
+    similarity = np.mean(signatures[pairs[:, 0]] == signatures[pairs[:, 1]], axis=1)
+    pairs = np.concatenate(
+        [pairs[similarity >= config.threshold], _bucket_pairs(signatures)]
+    )
+
+    return _connected_components(len(signatures), pairs)
+
+
+def _connected_components(n: int, pairs: np.ndarray) -> np.ndarray:
+    """Smallest row linked to each of `n` rows by a chain of `pairs`.
+
+    Each pass moves the smaller label of every pair to both rows, then
+    follows labels to their own labels, so long chains take few passes.
+    """
+    labels = np.arange(n)
+    while True:
+        smaller = np.minimum(labels[pairs[:, 0]], labels[pairs[:, 1]])
+        updated = labels.copy()
+        np.minimum.at(updated, pairs[:, 0], smaller)
+        np.minimum.at(updated, pairs[:, 1], smaller)
+        while not np.array_equal(updated, updated[updated]):
+            updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def _bucket_pairs(keys: np.ndarray) -> np.ndarray:
+    """(first row, other row) pairs of the rows sharing each distinct key row."""
+    keys = np.ascontiguousarray(keys)
+    _, bucket = np.unique(
+        keys.view(f"V{keys.itemsize * keys.shape[1]}"), return_inverse=True
+    )
+    order = np.argsort(bucket.ravel(), kind="stable")
+    sorted_buckets = bucket.ravel()[order]
+    starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    first = order[np.repeat(starts, np.diff(np.r_[starts, len(order)]))]
+    is_pair = first != order
+    return np.stack([first[is_pair], order[is_pair]], axis=1)
+
+
+def deduplicate(
+    frames: list[pd.DataFrame],
+    config: DedupConfig,
+    text_column: str,
+    label_columns: list[str],
+    reference: Optional[np.ndarray] = None,
+    num_workers: Optional[int] = None,
+) -> tuple[list[pd.DataFrame], np.ndarray]:
+    """Removes near-duplicate rows within and across frames.
+
+    Frames are in order of priority: a group of near-duplicates is kept
+    only in the first frame it appears in, by its first row there, and
+    dropped from the frames after it. Rows near-duplicating a `reference`
+    signature, such as one of rows already saved, are dropped. Signatures
+    are computed on a process pool of `num_workers`. Returns the frames and
+    the signatures of their kept rows.
+    """
+    texts = pd.concat([frame[text_column] for frame in frames]).astype(str).tolist()
+    chunks = [texts[i : i + _CHUNK_SIZE] for i in range(0, len(texts), _CHUNK_SIZE)]
+    signatures = np.concatenate(
+        [
+            np.empty((0, config.num_perm), dtype=np.uint32),
+            *Parallel.process_map(
+                partial(minhash_signatures, config=config), chunks, num_workers
+            ),
+        ]
+    )
+    if reference is not None:
+        signatures = np.concatenate([reference, signatures])
+
+    # Rows of the reference come first, then the frames in order of priority
+    first = near_duplicate_groups(signatures, config)
+
+    offsets = np.cumsum([len(signatures) - len(texts)] + [len(f) for f in frames])
+    deduplicated = []
+    kept = [] if reference is None else [reference]
+    for frame, start, end in zip(frames, offsets[:-1], offsets[1:]):
+        frame_first = first[start:end]
+        keep = frame_first == np.arange(start, end)
+        if config.mode is DedupMode.MERGE:
+            # Near-duplicates within the frame share their labels with its first
+            in_frame = frame_first >= start
+            merged = frame[label_columns][in_frame].groupby(frame_first[in_frame]).max()
+            frame = frame.copy()
+            frame.iloc[
+                merged.index - start, frame.columns.get_indexer(label_columns)
+            ] = merged.values
+        deduplicated.append(frame[keep])
+        kept.append(signatures[start:end][keep])
+        logger.debug(
+            "Dropped %d of %d rows as near-duplicates",
+            len(frame) - keep.sum(),
+            len(frame),
+        )
+    return deduplicated, np.concatenate(kept)
@@ -0,0 +1,108 @@
+"""Distillation of a slow teacher classifier, such as BERT, into `TextClassifier`."""
+
+from typing import Optional
+
+import numpy as np
+import tensorflow as tf
+from pydantic import BaseModel, Field, NonNegativeInt
+from sklearn.metrics import roc_auc_score
+
+from . import Config, Export, Logging, Types
+
+logger = Logging.setup_logger(__name__)
+
+
+class DistillationConfig(BaseModel):
+    """Targets blending the true labels with temperature-softened teacher scores.
+
+    Each target is `alpha * soft + (1 - alpha) * label`, where `soft` is the
+    teacher's sigmoid score with its logit divided by `temperature`. Higher
+    temperatures pull confident scores towards 0.5, passing on more of the
+    teacher's ranking of borderline comments.
+    """
+
+    alpha: float = Field(default=0.5, ge=0, le=1)
+    temperature: float = Field(default=2.0, gt=0)
+
+    def blend(
+        self, features: tf.Tensor, targets: tuple[tf.Tensor, tf.Tensor]
+    ) -> tuple[tf.Tensor, tf.Tensor]:
+        """Maps (features, (labels, teacher scores)) batches to soft targets."""
+        labels, scores = targets
+        scores = tf.clip_by_value(tf.cast(scores, tf.float32), 1e-7, 1 - 1e-7)
+        logits = tf.math.log(scores) - tf.math.log1p(-scores)
+        soft = tf.sigmoid(logits / self.temperature)
+        return features, self.alpha * soft + (1 - self.alpha) * tf.cast(
+            labels, tf.float32
+        )
+
+
+class ModelQuality(BaseModel):
+    """Test quality and batch latency of one model."""
+
+    label_auc: dict[str, float]
+    mean_auc: float
+    mean_accuracy: float
+    latency: Export.LatencyStats
+
+
+class DistillationReport(BaseModel):
+    """How much of the teacher's quality the student keeps, and how much faster."""
+
+    n_examples: NonNegativeInt
+    teacher: ModelQuality
+    student: ModelQuality
+
+    @property
+    def auc_retained(self) -> float:
+        return self.student.mean_auc / self.teacher.mean_auc
+
+    @property
+    def speedup(self) -> float:
+        """Median batch latency of the teacher over the student."""
+        return self.teacher.latency.p50_ms / self.student.latency.p50_ms
+
+
+def distillation_report(
+    teacher: Export.Scorer,
+    student: Export.Scorer,
+    dataset: Types.Dataset,
+    max_examples: Optional[int] = 10_000,
+    batch_size: int = 64,
+) -> DistillationReport:
+    """Compares teacher and student on (text, labels) batches such as `Datasets.test`."""
+    texts, labels = Export.texts_and_labels(dataset, max_examples)
+    report = DistillationReport(
+        n_examples=len(texts),
+        teacher=_quality(teacher, texts, labels, batch_size),
+        student=_quality(student, texts, labels, batch_size),
+    )
+    logger.info(
+        "Student keeps %.1f%% of the teacher's mean AUC (%.4f vs %.4f) "
+        "and is %.1fx faster (p50 %.2f vs %.2f ms per batch)",
+        100 * report.auc_retained,
+        report.student.mean_auc,
+        report.teacher.mean_auc,
+        report.speedup,
+        report.student.latency.p50_ms,
+        report.teacher.latency.p50_ms,
+    )
+    return report
+
+
+def _quality(
+    scorer: Export.Scorer, texts: list[str], labels: np.ndarray, batch_size: int
+) -> ModelQuality:
+    scores, latency = Export.time_scorer(scorer, texts, batch_size)
+    # AUC is undefined for labels without both classes in the sample
+    label_auc = {
+        label: float(roc_auc_score(labels[:, i], scores[:, i]))
+        for i, label in enumerate(Config.LABELS)
+        if len(np.unique(labels[:, i])) == 2
+    }
+    return ModelQuality(
+        label_auc=label_auc,
+        mean_auc=float(np.mean(list(label_auc.values()))) if label_auc else 0.0,
+        mean_accuracy=float(np.mean((scores >= 0.5) == labels)),
+        latency=latency,
+    )
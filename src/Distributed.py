@@ -0,0 +1,302 @@
+"""Data-parallel `TextClassifier` training across localhost worker processes."""
+
+import json
+import multiprocessing
+import os
+import socket
+import time
+from datetime import datetime
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Any, Optional
+
+import keras
+import numpy as np
+import tensorflow as tf
+from pydantic import BaseModel, PositiveInt
+
+from . import Config, Logging, MakeDatasets
+from .MakeDatasets import Split
+from .Types import Callback, Dataset, History, Model
+
+logger = Logging.setup_logger(__name__)
+
+REPORT_FILE: str = "distributed_report.json"
+
+
+class DistributedReport(BaseModel):
+    """Epoch history and train throughput of a distributed run."""
+
+    num_workers: PositiveInt
+    threads_per_worker: PositiveInt
+    global_batch_size: PositiveInt
+    train_seconds: float
+    history: dict[str, list[float]]
+
+    @property
+    def examples_per_sec(self) -> float:
+        """Mean throughput of all workers, leaving out the first epoch's tracing.
+
+        A one-epoch run only has the first epoch to go by.
+        """
+        rates = self.history["examples_per_sec"]
+        return float(np.mean(rates[1:] if len(rates) > 1 else rates))
+
+
+def tf_config(addresses: list[str], index: int) -> dict[str, Any]:
+    """The `TF_CONFIG` of worker `index` of a cluster; worker 0 is the chief."""
+    return {
+        "cluster": {"worker": addresses},
+        "task": {"type": "worker", "index": index},
+    }
+
+
+def shard_dataset(dataset: Dataset, num_shards: int, index: int) -> Dataset:
+    """Every `num_shards`-th batch of a split, starting at batch `index`.
+
+    Each collective step needs a batch from every worker, so all shards get
+    the same number of batches and the last `len(dataset) % num_shards` are
+    dropped. The split's cardinality must be known, as it is for `Datasets`
+    splits.
+    """
+    n_batches = int(dataset.cardinality())
+    if n_batches < 0:
+        raise ValueError("Sharding needs a dataset of known cardinality")
+    if n_batches < num_shards:
+        raise ValueError(
+            f"{n_batches} batches cannot be shared by {num_shards} workers"
+        )
+    return dataset.take(n_batches // num_shards * num_shards).shard(num_shards, index)
+
+
+def fit(
+    strategy: tf.distribute.Strategy,
+    model: Model,
+    train_dataset: Dataset,
+    epochs: int,
+    val_dataset: Optional[Dataset] = None,
+    callbacks: Optional[list[Callback]] = None,
+) -> History:
+    """Trains a compiled model, built under `strategy.scope()`, on every worker.
+
+    Each worker reads its own `shard_dataset` of the splits, so the global
+    batch is the split's batch size times the number of workers. Keras 3
+    `fit` cannot run under `MultiWorkerMirroredStrategy` (its symbolic build
+    reduces nested per-replica batches), so this loop runs the steps and
+    callbacks itself. It tracks the loss only, plus `examples_per_sec` over
+    all workers; callbacks must not stop training on one worker alone.
+    """
+    train_dist = _distribute(strategy, train_dataset)
+    val_dist = None if val_dataset is None else _distribute(strategy, val_dataset)
+
+    loss_fn = keras.losses.get(model.loss)
+
+    def replica_loss(x: tf.Tensor, y: tf.Tensor, training: bool) -> tf.Tensor:
+        y_pred = model(x, training=training)
+        loss = tf.reduce_mean(loss_fn(tf.cast(y, y_pred.dtype), y_pred))
+        # Summed over replicas below, as the optimizer sums their gradients
+        return loss / strategy.num_replicas_in_sync
+
+    def replica_train_step(x: tf.Tensor, y: tf.Tensor) -> tuple[tf.Tensor, tf.Tensor]:
+        with tf.GradientTape() as tape:
+            loss = replica_loss(x, y, training=True)
+        gradients = tape.gradient(loss, model.trainable_variables)
+        model.optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+        return loss, tf.shape(y)[0]
+
+    @tf.function
+    def train_step(batch) -> list[tf.Tensor]:
+        outputs = strategy.run(replica_train_step, args=batch)
+        return [strategy.reduce("SUM", value, axis=None) for value in outputs]
+
+    @tf.function
+    def test_step(batch) -> tf.Tensor:
+        loss = strategy.run(replica_loss, args=(*batch, False))
+        return strategy.reduce("SUM", loss, axis=None)
+
+    callback_list = keras.callbacks.CallbackList(
+        callbacks, add_history=True, model=model, epochs=epochs
+    )
+    model.stop_training = False
+    callback_list.on_train_begin()
+    for epoch in range(epochs):
+        callback_list.on_epoch_begin(epoch)
+        losses, examples = [], 0
+        start_time = time.perf_counter()
+        for step, batch in enumerate(train_dist):
+            callback_list.on_train_batch_begin(step)
+            loss, n_examples = train_step(batch)
+            losses.append(loss)
+            examples += int(n_examples)
+            callback_list.on_train_batch_end(step, {"loss": loss})
+        seconds = time.perf_counter() - start_time
+
+        logs = {"loss": float(np.mean(losses)), "examples_per_sec": examples / seconds}
+        if val_dist is not None:
+            callback_list.on_test_begin()
+            val_losses = [test_step(batch) for batch in val_dist]
+            logs["val_loss"] = float(np.mean(val_losses))
+            callback_list.on_test_end({"loss": logs["val_loss"]})
+        callback_list.on_epoch_end(epoch, logs)
+        if model.stop_training:
+            break
+    callback_list.on_train_end(logs)
+    return model.history
+
+
+def train_distributed(
+    model_params: dict[str, Any],
+    data_params: dict[str, Any],
+    epochs: int,
+    num_workers: int,
+    model_name: str = "text_classifier",
+    model_dir: Path = Config.MODEL_DIR,
+    threads_per_worker: Optional[int] = None,
+) -> DistributedReport:
+    """Trains a `TextClassifier` with `MultiWorkerMirroredStrategy` on N local workers.
+
+    The splits, vocabulary and token ids are made once here, before the
+    workers start, and each worker reads its shard of them. Workers are
+    spawned processes with `threads_per_worker` TensorFlow threads each, by
+    default an even share of the CPUs. Only the chief writes checkpoints,
+    TensorBoard logs, the trained classifier and the report, all under the
+    `Logging.setup_callbacks` run directory `model_dir/<model_name>_<time>`.
+    """
+    # Imported here as `Modeling` trains through this module
+    from . import Modeling
+
+    datasets = MakeDatasets.Datasets(**data_params)
+    tokenizer = Modeling.TextClassifier(**model_params).tokenizer
+    datasets.vocabulary(tokenizer)
+    datasets.tokenized(tokenizer, [Split.TRAIN, Split.VAL])
+
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+    run_dir = model_dir / f"{model_name}_{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    addresses = [f"localhost:{port}" for port in _free_ports(num_workers)]
+    worker_args = (
+        addresses,
+        model_params,
+        {**data_params, "force_make": False},
+        datasets.save_path,
+        epochs,
+        run_dir,
+        threads,
+    )
+
+    logger.info(
+        "Training on %d workers with %d threads each, run directory %s",
+        num_workers,
+        threads,
+        run_dir,
+    )
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_run_worker, args=(index, *worker_args))
+        for index in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+    _join_workers(processes)
+
+    report = DistributedReport.model_validate_json((run_dir / REPORT_FILE).read_text())
+    logger.info(
+        "Trained on %d workers at %.0f examples/s",
+        num_workers,
+        report.examples_per_sec,
+    )
+    return report
+
+
+def _run_worker(
+    index: int,
+    addresses: list[str],
+    model_params: dict[str, Any],
+    data_params: dict[str, Any],
+    save_path: Path,
+    epochs: int,
+    run_dir: Path,
+    threads: int,
+) -> None:
+    from . import Modeling
+
+    os.environ["TF_CONFIG"] = json.dumps(tf_config(addresses, index))
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+    strategy = tf.distribute.MultiWorkerMirroredStrategy()
+
+    datasets = MakeDatasets.Datasets(**data_params)
+    datasets.save_path = save_path
+    classifier = Modeling.TextClassifier(**model_params)
+    vocabulary = datasets.vocabulary(classifier.tokenizer)
+    splits = datasets.tokenized(classifier.tokenizer, [Split.TRAIN, Split.VAL])
+
+    is_chief = index == 0
+    callbacks = []
+    if is_chief:
+        callbacks = Logging.setup_callbacks(
+            run_dir.name, run_dir.parent, include_timestamp=False
+        )
+    start_time = time.perf_counter()
+    classifier.train(
+        splits[Split.TRAIN],
+        epochs=epochs,
+        metrics=[],
+        val_dataset=splits[Split.VAL],
+        callbacks=callbacks,
+        verbose=0,
+        vocabulary=vocabulary,
+        strategy=strategy,
+    )
+    train_seconds = time.perf_counter() - start_time
+
+    if is_chief:
+        report = DistributedReport(
+            num_workers=len(addresses),
+            threads_per_worker=threads,
+            global_batch_size=datasets.batch_size * len(addresses),
+            train_seconds=train_seconds,
+            history=classifier.history.history,
+        )
+        classifier.save(run_dir / "classifier")
+        (run_dir / REPORT_FILE).write_text(report.model_dump_json(indent=2))
+
+
+def _distribute(strategy: tf.distribute.Strategy, dataset: Dataset):
+    return strategy.distribute_datasets_from_function(
+        lambda context: shard_dataset(
+            dataset, context.num_input_pipelines, context.input_pipeline_id
+        )
+    )
+
+
+def _free_ports(n: int) -> list[int]:
+    """Ports the OS reports free, held open together so they differ."""
+    sockets = [socket.socket() for _ in range(n)]
+    try:
+        for sock in sockets:
+            sock.bind(("localhost", 0))
+        return [sock.getsockname()[1] for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def _join_workers(processes: list[multiprocessing.Process]) -> None:
+    """Waits for every worker, stopping the rest if one fails.
+
+    Workers block in collective ops until all of them join, so a failed
+    worker would otherwise hang the others.
+    """
+    running = list(processes)
+    while running:
+        for sentinel in wait([process.sentinel for process in running]):
+            process = next(p for p in running if p.sentinel == sentinel)
+            process.join()
+            running.remove(process)
+            if process.exitcode != 0:
+                for other in running:
+                    other.terminate()
+                raise RuntimeError(
+                    f"Worker {processes.index(process)} exited with code "
+                    f"{process.exitcode}"
+                )
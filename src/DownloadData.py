@@ -1,11 +1,20 @@
-import csv
+import hashlib
 import os
 from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Optional, Type
 
 import kagglehub
-from pydantic import BaseModel, Field
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, Field, NonNegativeInt
 
-from . import Config
+from . import Config, Logging, Parallel
+
+logger = Logging.setup_logger(__name__)
+
+VALIDATION_CHUNK_SIZE: int = 50_000
+MAX_ERROR_EXAMPLES: int = 5
 
 
 class Files(Enum):
@@ -40,8 +49,76 @@ class TestLabelsModel(BaseModel):
     identity_hate: int = Field(ge=-1, le=1)
 
 
-def download_kaggle_dataset(force_download: bool = False) -> str:
-    destination = str(Config.DATA_DIR / "kaggle")
+class ValidationReport(BaseModel):
+    """Compact summary of the schema violations found in a raw CSV file."""
+
+    file: Files
+    n_rows: NonNegativeInt = 0
+    errors: Dict[str, NonNegativeInt] = Field(default_factory=dict)
+    examples: Dict[str, List[int]] = Field(default_factory=dict)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.errors
+
+    def add(self, error: str, rows: np.ndarray) -> None:
+        """Records the (0-based, header excluded) row numbers failing a check."""
+        if len(rows) == 0:
+            return
+        self.errors[error] = self.errors.get(error, 0) + len(rows)
+        examples = self.examples.setdefault(error, [])
+        examples.extend(int(row) for row in rows[: MAX_ERROR_EXAMPLES - len(examples)])
+
+    def summary(self) -> str:
+        if self.is_valid:
+            return f"{self.file.value}: {self.n_rows} rows valid"
+        details = "; ".join(
+            f"{error}: {count} rows (e.g. {self.examples[error]})"
+            for error, count in self.errors.items()
+        )
+        return f"{self.file.value}: {self.n_rows} rows, {details}"
+
+
+class FileRecord(BaseModel):
+    """Size, modification time and checksum of a validated raw file."""
+
+    size: NonNegativeInt
+    mtime_ns: NonNegativeInt
+    sha256: str
+
+
+class Manifest(BaseModel):
+    """Raw files that passed validation, keyed by file name."""
+
+    download_path: str
+    files: Dict[str, FileRecord]
+
+
+def download_kaggle_dataset(
+    force_download: bool = False,
+    offline: bool = False,
+    num_workers: Optional[int] = None,
+) -> str:
+    """Downloads the raw CSVs and validates any that changed since the last run.
+
+    With `offline`, kagglehub is never called: the download path is taken from
+    the manifest, which must still match the files on disk. Changed files are
+    validated concurrently on up to `num_workers` processes, all CPUs by
+    default.
+    """
+    manifest = None if force_download else load_manifest()
+
+    if offline:
+        if manifest is None or not all(
+            _cached_record(manifest, manifest.download_path, file) for file in Files
+        ):
+            raise FileNotFoundError(
+                f"Offline mode needs a manifest matching the raw files at {_manifest_path()}"
+            )
+        logger.debug("Using validated raw files from %s", manifest.download_path)
+        return manifest.download_path
+
+    destination = str(Config.KAGGLE_DIR)
     os.makedirs(destination, exist_ok=True)
     os.environ["KAGGLEHUB_CACHE"] = destination
 
@@ -50,13 +127,118 @@ def download_kaggle_dataset(force_download: bool = False) -> str:
         force_download=force_download,
     )
 
+    records, changed = {}, []
     for file in Files:
-        file_path = download_path + f"/{file.value}"
-        _ = _validate_file(file, file_path)
+        records[file.value] = _cached_record(manifest, download_path, file)
+        if records[file.value] is None:
+            changed.append(file)
+        else:
+            logger.debug("Skipping validation of unchanged %s", file.value)
+
+    checked = Parallel.process_map(
+        _check_file,
+        [(file, download_path + f"/{file.value}") for file in changed],
+        num_workers,
+    )
+    for file, (report, record) in zip(changed, checked):
+        if not report.is_valid:
+            raise ValueError(f"Invalid raw data file {report.summary()}")
+        logger.debug("Validated %s", report.summary())
+        records[file.value] = record
 
+    _save_manifest(Manifest(download_path=download_path, files=records))
     return download_path
 
 
+def load_manifest() -> Optional[Manifest]:
+    """Loads the manifest of validated raw files, if one has been written."""
+    manifest_path = _manifest_path()
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path, "r") as f:
+        return Manifest.model_validate_json(f.read())
+
+
+def is_append(file_path: Path, record: FileRecord) -> bool:
+    """Whether a file is the recorded file with whole rows appended to it."""
+    if file_path.stat().st_size < record.size:
+        return False
+    with open(file_path, "rb") as f:
+        f.seek(max(record.size - 1, 0))
+        if record.size > 0 and f.read(1) != b"\n":
+            return False
+    return _sha256(file_path, limit=record.size) == record.sha256
+
+
+def _save_manifest(manifest: Manifest) -> None:
+    manifest_path = _manifest_path()
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(manifest_path, "w") as f:
+        f.write(manifest.model_dump_json(indent=2))
+    logger.debug("Saved raw data manifest to %s", manifest_path)
+
+
+def _manifest_path() -> Path:
+    return Config.KAGGLE_DIR / "manifest.json"
+
+
+def _cached_record(
+    manifest: Optional[Manifest], download_path: str, file: Files
+) -> Optional[FileRecord]:
+    """Returns the manifest record of a file if its contents are unchanged.
+
+    Matching size and mtime are trusted as-is; otherwise the checksum decides.
+    """
+    if manifest is None or manifest.download_path != download_path:
+        return None
+    record = manifest.files.get(file.value)
+    file_path = Path(download_path) / file.value
+    if record is None or not file_path.exists():
+        return None
+
+    stat = file_path.stat()
+    if stat.st_size != record.size:
+        return None
+    if stat.st_mtime_ns == record.mtime_ns:
+        return record
+    if _sha256(file_path) == record.sha256:
+        return record.model_copy(update={"mtime_ns": stat.st_mtime_ns})
+    return None
+
+
+def _check_file(
+    file_and_path: tuple[Files, str],
+) -> tuple[ValidationReport, FileRecord]:
+    """Validates a raw file and records it, in a worker process."""
+    file, file_path = file_and_path
+    return _validate_file(file, file_path), _make_record(Path(file_path))
+
+
+def _make_record(file_path: Path) -> FileRecord:
+    stat = file_path.stat()
+    return FileRecord(
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        sha256=_sha256(file_path),
+    )
+
+
+def _sha256(
+    file_path: Path, block_size: int = 1 << 20, limit: Optional[int] = None
+) -> str:
+    """Checksum of the file, or of only its first `limit` bytes."""
+    digest = hashlib.sha256()
+    remaining = limit
+    with open(file_path, "rb") as f:
+        while block := f.read(
+            block_size if remaining is None else min(block_size, remaining)
+        ):
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
 def _get_file_schema(file: Files):
     schemas = {
         Files.TRAIN: TrainModel,
@@ -67,12 +249,70 @@ def _get_file_schema(file: Files):
     return schemas[file]
 
 
-def _validate_file(file: Files, file_path: str):
+def _validate_file(
+    file: Files, file_path: str, chunk_size: int = VALIDATION_CHUNK_SIZE
+) -> ValidationReport:
+    """Validates a CSV against its schema column-wise, one chunk at a time.
+
+    Only the 8-byte hash of each id is kept across chunks, for the uniqueness
+    check, so memory grows by 8 bytes per row rather than with the text.
+    """
     schema = _get_file_schema(file)
-    with open(file_path) as f:
-        reader = csv.DictReader(f)
-        samples = [schema.model_validate(row) for row in reader]
-    return samples
+    report = ValidationReport(file=file)
+    id_hashes = []
+
+    chunks = pd.read_csv(
+        file_path,
+        dtype=str,
+        keep_default_na=False,
+        na_values={"id": [""]},
+        chunksize=chunk_size,
+    )
+    for chunk in chunks:
+        missing = set(schema.model_fields) - set(chunk.columns)
+        if missing:
+            report.add(f"missing columns {sorted(missing)}", np.array([0]))
+            return report
+
+        chunk.index = pd.RangeIndex(report.n_rows, report.n_rows + len(chunk))
+        _validate_chunk(schema, chunk, report)
+        id_hashes.append(
+            pd.util.hash_pandas_object(chunk["id"], index=False).to_numpy()
+        )
+        report.n_rows += len(chunk)
+
+    if id_hashes:
+        hashes = np.concatenate(id_hashes)
+        _, first_rows = np.unique(hashes, return_index=True)
+        duplicated = np.ones(len(hashes), dtype=bool)
+        duplicated[first_rows] = False
+        report.add("id: duplicated", np.flatnonzero(duplicated))
+
+    return report
+
+
+def _validate_chunk(
+    schema: Type[BaseModel], chunk: pd.DataFrame, report: ValidationReport
+) -> None:
+    properties = schema.model_json_schema()["properties"]
+    for column, field in schema.model_fields.items():
+        values = chunk[column]
+        if field.annotation is str:
+            report.add(f"{column}: null", values.index[values.isna()].to_numpy())
+            continue
+
+        numbers = pd.to_numeric(values, errors="coerce")
+        not_int = numbers.isna() | (numbers % 1 != 0)
+        report.add(f"{column}: not an integer", values.index[not_int].to_numpy())
+
+        minimum = properties[column].get("minimum")
+        if minimum is not None:
+            too_low = numbers < minimum
+            report.add(f"{column}: below {minimum}", values.index[too_low].to_numpy())
+        maximum = properties[column].get("maximum")
+        if maximum is not None:
+            too_high = numbers > maximum
+            report.add(f"{column}: above {maximum}", values.index[too_high].to_numpy())
 
 
 def main() -> None:
@@ -0,0 +1,239 @@
+"""SavedModel and int8-quantized TFLite exports of raw-text classifiers."""
+
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import keras
+import numpy as np
+import tensorflow as tf
+from pydantic import BaseModel, NonNegativeInt, PositiveInt
+
+from . import Config, Logging, Types
+
+logger = Logging.setup_logger(__name__)
+
+SAVED_MODEL_DIR: str = "saved_model"
+TFLITE_FILE: str = "model_int8.tflite"
+REPORT_FILE: str = "export_report.json"
+
+Scorer = Callable[[list[str]], np.ndarray]
+
+
+class LabelAccuracy(BaseModel):
+    """Accuracy at a 0.5 threshold of the float and quantized models on one label."""
+
+    label: str
+    float_accuracy: float
+    quantized_accuracy: float
+
+    @property
+    def change(self) -> float:
+        return self.quantized_accuracy - self.float_accuracy
+
+
+class LatencyStats(BaseModel):
+    """Per-batch latency of one model over the evaluation texts."""
+
+    batch_size: PositiveInt
+    p50_ms: float
+    p95_ms: float
+    examples_per_sec: float
+
+
+class ExportReport(BaseModel):
+    """How the quantized export compares with the float SavedModel."""
+
+    n_examples: NonNegativeInt
+    saved_model_bytes: NonNegativeInt = 0
+    tflite_bytes: NonNegativeInt = 0
+    max_score_difference: float
+    labels: list[LabelAccuracy]
+    float_latency: LatencyStats
+    quantized_latency: LatencyStats
+
+    @property
+    def speedup(self) -> float:
+        """Median batch latency of the float model over the quantized one."""
+        return self.float_latency.p50_ms / self.quantized_latency.p50_ms
+
+
+class TFLiteScorer:
+    """Scores raw comments with a TFLite export, one interpreter call per batch.
+
+    The interpreter is resized to each batch by its signature runner. It is
+    not thread-safe, so share a scorer only between calls made one at a time.
+    """
+
+    def __init__(self, model_path: Path, num_threads: Optional[int] = None) -> None:
+        interpreter = tf.lite.Interpreter(
+            model_path=str(model_path), num_threads=num_threads
+        )
+        self._runner = interpreter.get_signature_runner()
+        (self._input_name,) = self._runner.get_input_details()
+        (self._output_name,) = self._runner.get_output_details()
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        outputs = self._runner(**{self._input_name: np.array(texts, dtype=object)})
+        return outputs[self._output_name]
+
+
+def export_saved_model(model: keras.Model, directory: Path) -> Path:
+    """Exports a model on raw text, vectorizer or preprocessor included.
+
+    The SavedModel has a `serve` endpoint, also its default signature, that
+    takes a batch of strings and returns one score per label, so it runs
+    without the Python model code. Keras 3 models such as
+    `TextClassifier.model` are exported with `keras.export`; legacy tf.keras
+    models such as the BERT classifier are saved through a `tf.Module`.
+    """
+    text_spec = tf.TensorSpec([None], tf.string, name="texts")
+    add_feature_dim = len(model.inputs[0].shape) == 2
+
+    def serve(texts: tf.Tensor) -> tf.Tensor:
+        return model(texts[:, None] if add_feature_dim else texts)
+
+    if isinstance(model, keras.Model):
+        archive = keras.export.ExportArchive()
+        archive.track(model)
+        archive.add_endpoint("serve", serve, input_signature=[text_spec])
+        archive.write_out(str(directory))
+    else:
+        module = tf.Module()
+        module.model = model
+        module.serve = tf.function(serve, input_signature=[text_spec])
+        tf.saved_model.save(
+            module, str(directory), signatures={"serving_default": module.serve}
+        )
+    logger.debug("Exported SavedModel to %s", directory)
+    return directory
+
+
+def export_tflite(saved_model_dir: Path, path: Path) -> Path:
+    """Converts a SavedModel to TFLite with post-training int8 weight quantization.
+
+    Weights are stored as int8 and activations are quantized on the fly
+    (dynamic range quantization). String ops of the vectorizer run as select
+    TF ops, which the `tf.lite.Interpreter` bundled with TensorFlow supports;
+    full integer calibration is not available through string inputs.
+    """
+    converter = tf.lite.TFLiteConverter.from_saved_model(str(saved_model_dir))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_ops = [
+        tf.lite.OpsSet.TFLITE_BUILTINS,
+        tf.lite.OpsSet.SELECT_TF_OPS,
+    ]
+    path.write_bytes(converter.convert())
+    logger.debug("Wrote int8 TFLite model to %s", path)
+    return path
+
+
+def export_classifier(
+    model: keras.Model,
+    directory: Path,
+    dataset: Types.Dataset,
+    max_examples: Optional[int] = 10_000,
+    batch_size: int = 64,
+) -> ExportReport:
+    """Exports a SavedModel and its int8 TFLite variant and compares the two.
+
+    `dataset` gives (text, labels) batches to compare on, such as
+    `Datasets.test`; at most `max_examples` of them are used. The report,
+    written next to the exports, holds the accuracy change per label in
+    `Config.LABELS` and the batch latency of both models.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    saved_model_dir = export_saved_model(model, directory / SAVED_MODEL_DIR)
+    tflite_path = export_tflite(saved_model_dir, directory / TFLITE_FILE)
+
+    texts, labels = texts_and_labels(dataset, max_examples)
+    saved_model = tf.saved_model.load(str(saved_model_dir))
+    report = compare_models(
+        lambda batch: saved_model.serve(tf.constant(batch)).numpy(),
+        TFLiteScorer(tflite_path),
+        texts,
+        labels,
+        batch_size,
+    )
+    report.saved_model_bytes = sum(
+        path.stat().st_size for path in saved_model_dir.rglob("*") if path.is_file()
+    )
+    report.tflite_bytes = tflite_path.stat().st_size
+
+    (directory / REPORT_FILE).write_text(report.model_dump_json(indent=2))
+    logger.info(
+        "Exported to %s: %.1fx faster (p50 %.2f vs %.2f ms per batch), "
+        "accuracy change per label %s",
+        directory,
+        report.speedup,
+        report.quantized_latency.p50_ms,
+        report.float_latency.p50_ms,
+        {label.label: round(label.change, 4) for label in report.labels},
+    )
+    return report
+
+
+def compare_models(
+    float_scorer: Scorer,
+    quantized_scorer: Scorer,
+    texts: list[str],
+    labels: np.ndarray,
+    batch_size: int = 64,
+) -> ExportReport:
+    """Scores `texts` with both models, timing every batch."""
+    float_scores, float_latency = time_scorer(float_scorer, texts, batch_size)
+    quantized_scores, quantized_latency = time_scorer(
+        quantized_scorer, texts, batch_size
+    )
+    float_correct = (float_scores >= 0.5) == labels
+    quantized_correct = (quantized_scores >= 0.5) == labels
+
+    return ExportReport(
+        n_examples=len(texts),
+        max_score_difference=float(np.max(np.abs(float_scores - quantized_scores))),
+        labels=[
+            LabelAccuracy(
+                label=label,
+                float_accuracy=float(float_correct[:, i].mean()),
+                quantized_accuracy=float(quantized_correct[:, i].mean()),
+            )
+            for i, label in enumerate(Config.LABELS)
+        ],
+        float_latency=float_latency,
+        quantized_latency=quantized_latency,
+    )
+
+
+def time_scorer(
+    scorer: Scorer, texts: list[str], batch_size: int
+) -> tuple[np.ndarray, LatencyStats]:
+    """Scores `texts` in batches, timing each after a warm-up call that may trace."""
+    scorer(texts[:batch_size])
+
+    scores, latencies = [], []
+    for start in range(0, len(texts), batch_size):
+        start_time = time.perf_counter()
+        scores.append(scorer(texts[start : start + batch_size]))
+        latencies.append(time.perf_counter() - start_time)
+
+    latency_ms = 1e3 * np.array(latencies)
+    return np.concatenate(scores), LatencyStats(
+        batch_size=batch_size,
+        p50_ms=float(np.percentile(latency_ms, 50)),
+        p95_ms=float(np.percentile(latency_ms, 95)),
+        examples_per_sec=len(texts) / sum(latencies),
+    )
+
+
+def texts_and_labels(
+    dataset: Types.Dataset, max_examples: Optional[int]
+) -> tuple[list[str], np.ndarray]:
+    """Raw texts and label rows of the first `max_examples` of a text dataset."""
+    examples = dataset.unbatch()
+    if max_examples is not None:
+        examples = examples.take(max_examples)
+    texts, labels = [], []
+    for features, example_labels in examples.as_numpy_iterator():
+        texts.append(np.reshape(features, -1)[0].decode("utf-8"))
+        labels.append(example_labels)
+    return texts, np.array(labels)
@@ -0,0 +1,107 @@
+"""Wall time, CPU time, peak memory and row counts of pipeline stages."""
+
+import contextlib
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from pydantic import BaseModel, Field, NonNegativeInt
+
+from . import Logging
+
+logger = Logging.setup_logger(__name__)
+
+_PROC_STATUS = Path("/proc/self/status")
+_PROC_CLEAR_REFS = Path("/proc/self/clear_refs")
+
+
+class StageRecord(BaseModel):
+    """Resources used by one stage.
+
+    `peak_rss_mb` is the peak of the stage itself where the OS allows
+    resetting the high-water mark (Linux), and of the process so far
+    elsewhere.
+    """
+
+    name: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    start_rss_mb: float = 0.0
+    peak_rss_mb: float = 0.0
+    rows: Dict[str, NonNegativeInt] = Field(default_factory=dict)
+    completed: bool = False
+
+
+class StageReport(BaseModel):
+    """Stage records, rewritten to `path` as each stage starts and ends.
+
+    A stage that is killed, for example by the OOM killer, stays in the
+    report with `completed` false.
+    """
+
+    path: Path
+    stages: List[StageRecord] = Field(default_factory=list)
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[StageRecord]:
+        record = StageRecord(name=name, start_rss_mb=_current_rss_mb())
+        self.stages.append(record)
+        self.save()
+
+        _reset_peak_rss()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+            record.completed = True
+        finally:
+            record.wall_seconds = time.perf_counter() - start_wall
+            record.cpu_seconds = time.process_time() - start_cpu
+            record.peak_rss_mb = _peak_rss_mb()
+            self.save()
+            logger.debug(
+                "Stage %s: %.2fs wall, %.2fs CPU, peak RSS %.0f MB, rows %s",
+                name,
+                record.wall_seconds,
+                record.cpu_seconds,
+                record.peak_rss_mb,
+                record.rows,
+            )
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            f.write(self.model_dump_json(indent=2, exclude={"path"}))
+
+
+def _reset_peak_rss() -> None:
+    """Resets the process high-water mark so the next peak is per stage."""
+    try:
+        _PROC_CLEAR_REFS.write_text("5")
+    except OSError:
+        pass
+
+
+def _current_rss_mb() -> float:
+    return _proc_status_mb("VmRSS:") or 0.0
+
+
+def _peak_rss_mb() -> float:
+    peak = _proc_status_mb("VmHWM:")
+    if peak is not None:
+        return peak
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
+
+
+def _proc_status_mb(field: str) -> float | None:
+    try:
+        status = _PROC_STATUS.read_text()
+    except OSError:
+        return None
+    for line in status.splitlines():
+        if line.startswith(field):
+            return int(line.split()[1]) / 2**10
+    return None
@@ -2,14 +2,18 @@ import logging
 import os
 import sys
 from datetime import datetime
+from enum import Enum
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Optional
 
 import keras
 
 from . import Config
 from .Types import Callback
 
+if TYPE_CHECKING:
+    from .Checkpointing import CheckpointConfig
+
 
 def setup_logger(
     name: str,
@@ -46,11 +50,45 @@ def setup_logger(
     return logger
 
 
+class CallbackProfile(Enum):
+    """How much the training callbacks record.
+
+    CHEAP logs checkpoints, epoch metrics and throughput only. FULL also
+    computes weight histograms every epoch, which is costly for large
+    embedding tables.
+    """
+
+    CHEAP = "cheap"
+    FULL = "full"
+
+
 def setup_callbacks(
     model_name: str,
     model_dir: Path = Config.MODEL_DIR,
     include_timestamp: bool = True,
+    profile: CallbackProfile = CallbackProfile.CHEAP,
+    input_monitor: Optional[Callback] = None,
+    checkpoint: Optional["CheckpointConfig"] = None,
+    run_params: Optional[dict[str, Any]] = None,
 ) -> list[Callback]:
+    """Checkpoint, TensorBoard and throughput callbacks for a timestamped run.
+
+    Throughput goes to TensorBoard and to `throughput.jsonl` in the run
+    directory; pass the train dataset through `Callbacks.instrument_dataset`
+    with these callbacks to count examples and tokens. An `input_monitor`
+    (see `Callbacks.InputPipelineMonitor`) is appended and, if it has no
+    profile directory, writes its profiler trace to the run's TensorBoard logs.
+
+    With a `checkpoint` config, a `Checkpointing.TrainingCheckpoint` saves
+    the full training state under `model_dir/<model_name>/checkpoints`,
+    shared by every timestamped run of the model, so an interrupted run
+    trained with `Checkpointing.fit` resumes when rerun with the same
+    `run_params`, such as the model params and `Datasets.hash`.
+    """
+    # Imported here as the callbacks log through this module
+    from .Callbacks import ThroughputMonitor
+    from .Checkpointing import TrainingCheckpoint
+
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S") if include_timestamp else ""
     run_name = f"{model_name}_{timestamp}" if timestamp else model_name
 
@@ -74,8 +112,25 @@ def setup_callbacks(
 
     tensorboard_callback = keras.callbacks.TensorBoard(
         log_dir=str(tensorboard_dir),
-        histogram_freq=1,
+        histogram_freq=1 if profile is CallbackProfile.FULL else 0,
         update_freq="epoch",
     )
 
-    return [checkpoint_callback, tensorboard_callback]
+    throughput_callback = ThroughputMonitor(
+        run_name=run_name,
+        metrics_path=run_dir / "throughput.jsonl",
+        tensorboard_dir=tensorboard_dir,
+    )
+
+    callbacks = [checkpoint_callback, tensorboard_callback, throughput_callback]
+    if input_monitor is not None:
+        if input_monitor.profile_dir is None:
+            input_monitor.profile_dir = tensorboard_dir
+        callbacks.append(input_monitor)
+    if checkpoint is not None:
+        callbacks.append(
+            TrainingCheckpoint(
+                model_dir / model_name / "checkpoints", checkpoint, run_params
+            )
+        )
+    return callbacks
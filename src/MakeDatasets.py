@@ -1,19 +1,38 @@
 """Process text data into TensorFlow datasets with parameter versioning."""
 
 import hashlib
+import io
+import json
+import shutil
 from enum import Enum
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 import tensorflow as tf
-from pydantic import BaseModel, Field, PositiveInt
-
-from . import Config, DownloadData, Logging, Preprocessing
+from pydantic import BaseModel, Field, NonNegativeInt, PositiveInt, model_validator
+
+from . import (
+    ArrowCache,
+    Config,
+    Deduplication,
+    DownloadData,
+    Export,
+    Instrumentation,
+    Logging,
+    Parallel,
+    Preprocessing,
+    Storage,
+    Tokenization,
+)
 from .Types import Dataset
 
 logger = Logging.setup_logger(__name__)
 
+# Keys written to config.json that describe the saved data rather than the config
+_METADATA_KEYS: set[str] = {"shards", "source"}
+
 
 class Split(Enum):
     TRAIN = "train"
@@ -21,6 +40,29 @@ class Split(Enum):
     TEST = "test"
 
 
+# Priority of splits when near-duplicates are removed: a comment in test is
+# dropped from val and train, one in val from train
+_DEDUP_ORDER: List[Split] = [Split.TEST, Split.VAL, Split.TRAIN]
+
+# Raw files each split is made from; train and val share one stratified split
+_SPLIT_FILES: Dict[Split, set[DownloadData.Files]] = {
+    Split.TRAIN: {DownloadData.Files.TRAIN},
+    Split.VAL: {DownloadData.Files.TRAIN},
+    Split.TEST: {DownloadData.Files.TEST, DownloadData.Files.TEST_LABELS},
+}
+
+
+class SourceVersion(BaseModel):
+    """The raw files the saved splits were made from.
+
+    The version counts the increments appended by `Datasets.update` since the
+    full build, which is version 0.
+    """
+
+    version: NonNegativeInt = 0
+    files: Dict[str, DownloadData.FileRecord]
+
+
 class Datasets(BaseModel):
     """Manages the creation, storage, and retrieval of TensorFlow datasets with version control."""
 
@@ -28,43 +70,80 @@ class Datasets(BaseModel):
     batch_size: PositiveInt
     shuffle: bool = True
     force_make: bool = False
+    offline: bool = False
     features: list[str] = Field(default=Config.FEATURES)
     labels: list[str] = Field(default=Config.LABELS)
-
-    _datasets: Optional[Dict[Split, Dataset]] = None
+    storage: Storage.StorageFormat = Storage.StorageFormat.SNAPSHOT
+    num_shards: PositiveInt = 1
+    compression: Storage.Compression = Storage.Compression.GZIP
+    deterministic: bool = True
+    drop_remainder: bool = True
+    bucket_boundaries: Optional[List[PositiveInt]] = None
+    bucket_margin: NonNegativeInt = 0
+    num_workers: Optional[PositiveInt] = None
+    dedup: Optional[Deduplication.DedupConfig] = None
+
+    _datasets: Dict[Split, Dataset] = {}
+    _built: set[Split] = set()
     _hash: Optional[str] = None
+    _shards: Optional[Dict[Split, List[Storage.ShardInfo]]] = None
+    _tokenized: Dict[str, Dict[Split, Dataset]] = {}
+    _vocabularies: Dict[str, List[str]] = {}
+    _report: Optional[Instrumentation.StageReport] = None
+    _source: Optional[SourceVersion] = None
 
     _save_path: Path = Config.TENSORFLOW_DIR
 
+    @model_validator(mode="after")
+    def _check_storage(self) -> "Datasets":
+        if self.storage is Storage.StorageFormat.SNAPSHOT:
+            if self.num_shards != 1:
+                raise ValueError("Sharding requires the tfrecord storage format")
+            if self.compression is Storage.Compression.ZLIB:
+                raise ValueError("tf.data snapshots do not support ZLIB compression")
+        return self
+
     @property
     def datasets(self) -> Dict[Split, Dataset]:
-        if self._datasets is None:
-            if self.force_make or not self._datasets_exist():
-                logger.debug("Creating new datasets with hash: %s", self.hash)
-                self._datasets = self._make_datasets()
-                self._save_datasets()
-                self._save_config()
-            else:
-                logger.debug("Found existing datasets with hash f: %s", self.hash)
-                self._verify_config()
-                logger.debug("Existing dataset config matches current config")
-                self._datasets = self._load_datasets()
-        return self._datasets
+        """Returns all three splits, loading or building those not yet in memory."""
+        return self._get_splits(list(Split))
+
+    @property
+    def report(self) -> Optional[Instrumentation.StageReport]:
+        """Stage records of the last build, or of the loads since then.
+
+        They are also written to `build_report.json` and `load_report.json`
+        next to `config.json`.
+        """
+        return self._report
+
+    @property
+    def save_path(self) -> Path:
+        """Directory holding a subdirectory of saved splits per dataset hash.
+
+        Set it before accessing any split, such as in a worker process to the
+        directory its parent prepared.
+        """
+        return self._save_path
+
+    @save_path.setter
+    def save_path(self, path: Path) -> None:
+        self._save_path = path
 
     @property
     def train(self) -> Dataset:
         """Returns the training dataset."""
-        return self.datasets[Split.TRAIN]
+        return self._get_splits([Split.TRAIN])[Split.TRAIN]
 
     @property
     def val(self) -> Dataset:
         """Returns the validation dataset."""
-        return self.datasets[Split.VAL]
+        return self._get_splits([Split.VAL])[Split.VAL]
 
     @property
     def test(self) -> Dataset:
         """Returns the test dataset."""
-        return self.datasets[Split.TEST]
+        return self._get_splits([Split.TEST])[Split.TEST]
 
     @property
     def hash(self) -> str:
@@ -74,52 +153,375 @@ class Datasets(BaseModel):
             logger.debug("Generated new hash: %s", self._hash)
         return self._hash
 
+    def tokenized(
+        self,
+        tokenizer: Tokenization.TokenizerConfig,
+        splits: Optional[List[Split]] = None,
+    ) -> Dict[Split, Dataset]:
+        """Returns the splits as token ids, tokenizing and caching them on first use.
+
+        Token ids are stored per tokenizer config under the dataset hash
+        directory, so training and evaluation skip string ops entirely. Only
+        `splits` are tokenized and returned, all of them by default. With
+        `bucket_boundaries`, batches are regrouped by token length and padded
+        only to their bucket boundary less `bucket_margin` (see
+        `TextClassifier.padding_margin`).
+        """
+        splits = list(Split) if splits is None else splits
+        token_dir = self._token_dir(tokenizer)
+        cached = self._tokenized.setdefault(token_dir.name, {})
+
+        missing = [
+            split
+            for split in splits
+            if split not in cached
+            and (self.force_make or not (token_dir / split.value).exists())
+        ]
+        if missing:
+            logger.debug("Tokenizing datasets into: %s", token_dir)
+            tokenize = self._make_tokenize_fn(tokenizer)
+            for split, ds in self._get_splits(missing).items():
+                ds = ds.map(
+                    lambda x, y: (tokenize(x), y), num_parallel_calls=tf.data.AUTOTUNE
+                )
+                ds.save(str(token_dir / split.value))
+                self._lengths_path(token_dir, split).unlink(missing_ok=True)
+                logger.debug("Saved tokenized %s split", split.value)
+            with open(token_dir / "tokenizer.json", "w") as f:
+                f.write(tokenizer.model_dump_json(indent=2))
+
+        for split in splits:
+            if split not in cached:
+                cached[split] = self._load_tokenized(
+                    token_dir, split, tokenizer.padded_length
+                )
+        return {split: cached[split] for split in splits}
+
+    def vocabulary(self, tokenizer: Tokenization.VectorizerConfig) -> List[str]:
+        """Returns the train split vocabulary, adapting and caching it on first use.
+
+        Vocabularies are stored under the dataset hash directory keyed by the
+        vocabulary settings of the tokenizer, so they are shared by every
+        `sequence_length` and load with `set_vocabulary` instead of a corpus
+        pass.
+        """
+        key = tokenizer.vocabulary_hash
+        if key in self._vocabularies:
+            return self._vocabularies[key]
+
+        vocabulary_path = self._save_path / self.hash / "vocabulary" / f"{key}.txt"
+        if self.force_make or not vocabulary_path.exists():
+            text_ds = self.train.map(lambda x, _: x)
+            if tokenizer.adapt_sample_size is not None:
+                text_ds = text_ds.unbatch().take(tokenizer.adapt_sample_size)
+                text_ds = text_ds.batch(self.batch_size)
+            logger.debug("Adapting vocabulary %s on the train split", key)
+            vectorize_layer = tokenizer.make_layer()
+            vectorize_layer.adapt(text_ds)
+
+            vocabulary_path.parent.mkdir(parents=True, exist_ok=True)
+            vocabulary_path.write_text(
+                "\n".join(vectorize_layer.get_vocabulary()), encoding="utf-8"
+            )
+            logger.debug("Saved vocabulary to %s", vocabulary_path)
+
+        self._vocabularies[key] = vocabulary_path.read_text(encoding="utf-8").split(
+            "\n"
+        )
+        return self._vocabularies[key]
+
+    def teacher_scores(
+        self, split: Split, teacher: Export.Scorer, teacher_name: str
+    ) -> np.ndarray:
+        """Returns a teacher model's scores for every example of a raw-text split.
+
+        Scores are computed once and cached under the dataset hash directory
+        by `teacher_name`, so pass a new name when the teacher changes. They
+        follow the example order of the split, which must therefore be
+        deterministic.
+        """
+        if not self.deterministic:
+            raise ValueError("Teacher scores need deterministic=True to line up")
+        scores_path = self._save_path / self.hash / "teachers" / teacher_name
+        scores_path = scores_path / f"{split.value}.npy"
+        if self.force_make or not scores_path.exists():
+            logger.debug("Scoring the %s split with %s", split.value, teacher_name)
+            scores = [
+                teacher([text.decode("utf-8") for text in features[:, 0]])
+                for features, _ in self._get_splits([split])[split].as_numpy_iterator()
+            ]
+            scores_path.parent.mkdir(parents=True, exist_ok=True)
+            np.save(scores_path, np.concatenate(scores).astype(np.float32))
+        return np.load(scores_path)
+
+    def with_teacher_scores(
+        self, split: Split, teacher: Export.Scorer, teacher_name: str
+    ) -> Dataset:
+        """Returns a split as (features, (labels, teacher scores)) batches.
+
+        Train on it with `TextClassifier.train(distillation=...)`.
+        """
+        ds = self._get_splits([split])[split]
+        scores = tf.data.Dataset.from_tensor_slices(
+            self.teacher_scores(split, teacher, teacher_name)
+        ).batch(self.batch_size, drop_remainder=self._drop_remainder(split))
+        return tf.data.Dataset.zip(ds, scores).map(
+            lambda batch, batch_scores: (batch[0], (batch[1], batch_scores))
+        )
+
+    def update(self) -> int:
+        """Appends rows added to the raw files since the splits were saved.
+
+        Only the new rows are split, cleaned and saved, as increment
+        `<hash>/increments/<version>` (or new TFRecord shards), so the cost
+        scales with the size of the change. Raw files must have changed only
+        by appending rows; anything else needs a rebuild with `force_make`.
+        Tokenized and teacher score caches are dropped, while cached
+        vocabularies are kept. Returns the number of rows appended to the
+        splits.
+
+        Test rows are joined with their labels, so rows appended to
+        `test.csv` and `test_labels.csv` are held back, and the files left
+        unconsumed, until every new id of one file is also in the other.
+        """
+        _ = self.datasets
+        source = self._load_source()
+        download_path = Path(
+            DownloadData.download_kaggle_dataset(
+                offline=self.offline, num_workers=self.num_workers
+            )
+        )
+        manifest = DownloadData.load_manifest()
+        changed = [
+            file
+            for file in DownloadData.Files
+            if manifest.files[file.value].sha256 != source.files[file.value].sha256
+        ]
+        if not changed:
+            logger.debug("Raw data unchanged since source version %d", source.version)
+            return 0
+
+        for file in changed:
+            if not DownloadData.is_append(
+                download_path / file.value, source.files[file.value]
+            ):
+                raise ValueError(
+                    f"{file.value} changed other than by appending rows; "
+                    "rebuild the datasets with force_make=True"
+                )
+
+        version = source.version + 1
+        self._report = self._new_report(f"update_report_{version}.json")
+        with self._report.stage("load_appended_rows") as stage:
+            raw_columns = self._raw_columns()
+            appended = dict(
+                zip(
+                    raw_columns,
+                    Parallel.thread_map(
+                        lambda file: _read_appended_rows(
+                            download_path / file.value,
+                            source.files[file.value].size if file in changed else None,
+                            raw_columns[file],
+                            self.labels,
+                        ),
+                        raw_columns,
+                        self.num_workers,
+                    ),
+                )
+            )
+            stage.rows = {file.value: len(df) for file, df in appended.items()}
+
+        test_files = [DownloadData.Files.TEST, DownloadData.Files.TEST_LABELS]
+        test_ids, label_ids = (set(appended[file]["id"]) for file in test_files)
+        if test_ids != label_ids:
+            logger.warning(
+                "Holding back %d new test rows and %d new test labels until "
+                "both files have every id",
+                len(test_ids),
+                len(label_ids),
+            )
+            for file in test_files:
+                appended[file] = appended[file].iloc[:0]
+                manifest.files[file.value] = source.files[file.value]
+            changed = [file for file in changed if file not in test_files]
+            if not changed:
+                return 0
+
+        with self._report.stage("split") as stage:
+            split_data = self._split_data(appended)
+            stage.rows = {split.value: len(df) for split, df in split_data.items()}
+        with self._report.stage("clean") as stage:
+            clean_data = {
+                split: df
+                for split, df in self._clean_data(split_data).items()
+                if len(df) > 0
+            }
+            stage.rows = {split.value: len(df) for split, df in clean_data.items()}
+        if self.dedup is not None and clean_data:
+            with self._report.stage("deduplicate") as stage:
+                clean_data = {
+                    split: df
+                    for split, df in self._deduplicate(
+                        clean_data, self._load_signatures()
+                    ).items()
+                    if len(df) > 0
+                }
+                stage.rows = {split.value: len(df) for split, df in clean_data.items()}
+        with self._report.stage("convert"):
+            datasets = self._convert_to_tensorflow(clean_data, keep_remainder=True)
+        with self._report.stage("save"):
+            self._save_increment(version, datasets)
+            self._source = SourceVersion(version=version, files=manifest.files)
+            self._save_config()
+
+        for derived in ["tokens", "teachers"]:
+            shutil.rmtree(self._save_path / self.hash / derived, ignore_errors=True)
+        self._datasets = {}
+        self._tokenized = {}
+        n_rows = sum(len(df) for df in clean_data.values())
+        logger.debug("Appended %d rows as source version %d", n_rows, version)
+        return n_rows
+
     @property
     def config(self) -> str:
         """Returns the dataset configuration as a JSON string."""
         return self.model_dump_json(
             indent=2,
-            exclude={"force_make", "_datasets", "_hash"},
+            exclude={
+                # Left out when off, so existing dataset hashes stay valid
+                *(["dedup"] if self.dedup is None else []),
+                "force_make",
+                "offline",
+                "deterministic",
+                "bucket_boundaries",
+                "bucket_margin",
+                "num_workers",
+                "_datasets",
+                "_built",
+                "_hash",
+                "_shards",
+                "_tokenized",
+                "_vocabularies",
+                "_report",
+                "_source",
+            },
         )
 
-    def _make_datasets(self) -> Dict[Split, Dataset]:
-        """Creates new TensorFlow datasets from raw data."""
+    def _get_splits(self, splits: List[Split]) -> Dict[Split, Dataset]:
+        """Returns the given splits, building the stale ones and loading the rest.
+
+        Splits are loaded on first access, so a training job never reads the
+        test split and an evaluation job never reads train. With
+        `force_make`, each split is rebuilt once per instance.
+        """
+        stale = {
+            split
+            for split in splits
+            if split not in self._datasets
+            and (
+                (self.force_make and split not in self._built)
+                or not self._split_exists(split)
+            )
+        }
+        if stale:
+            logger.debug("Creating %s splits with hash: %s", stale, self.hash)
+            datasets = self._make_datasets(stale)
+            with self._report.stage("save"):
+                self._save_datasets(datasets)
+                self._save_config()
+            self._datasets.update(datasets)
+            self._built.update(datasets)
+
+        for split in splits:
+            if split not in self._datasets:
+                logger.debug("Found existing %s split with hash: %s", split, self.hash)
+                self._verify_config()
+                if self._report is None or self._report.path.name != "load_report.json":
+                    self._report = self._new_report("load_report.json")
+                with self._report.stage(f"load_{split.value}"):
+                    self._datasets[split] = self._load_split(split)
+        return {split: self._datasets[split] for split in splits}
+
+    def _make_datasets(self, splits: set[Split]) -> Dict[Split, Dataset]:
+        """Creates new TensorFlow datasets from the raw files the splits need.
+
+        Test is made from `test.csv` and `test_labels.csv`, and train and val
+        together from one split of `train.csv`, so asking for val also
+        rebuilds train. With `dedup`, all splits are rebuilt.
+        """
         logger.debug("Starting dataset creation process")
-        raw_data = self._load_raw_data()
-        split_data = self._split_data(raw_data)
-        clean_data = self._clean_data(split_data)
-        datasets = self._convert_to_tensorflow(clean_data)
+        files = set().union(*(_SPLIT_FILES[split] for split in splits))
+        if self.dedup is not None:
+            # Splits are deduplicated against each other, so all are rebuilt
+            files = set(DownloadData.Files)
+        splits = {split for split in Split if _SPLIT_FILES[split] <= files}
+        source = self._saved_source() if splits != set(Split) else None
+        self._remove_derived(splits)
+
+        self._report = self._new_report("build_report.json")
+        with self._report.stage("load_raw_data") as stage:
+            raw_data = self._load_raw_data(files)
+            stage.rows = {file.value: len(df) for file, df in raw_data.items()}
+        with self._report.stage("split") as stage:
+            split_data = self._split_data(raw_data)
+            stage.rows = {split.value: len(df) for split, df in split_data.items()}
+        with self._report.stage("clean") as stage:
+            clean_data = self._clean_data(split_data)
+            stage.rows = {split.value: len(df) for split, df in clean_data.items()}
+        if self.dedup is not None:
+            with self._report.stage("deduplicate") as stage:
+                clean_data = self._deduplicate(clean_data)
+                stage.rows = {split.value: len(df) for split, df in clean_data.items()}
+        with self._report.stage("convert") as stage:
+            datasets = self._convert_to_tensorflow(clean_data)
+            stage.rows = {split.value: len(df) for split, df in clean_data.items()}
+
+        # The rebuilt splits hold all rows of their raw files, the others keep
+        # the source version and increments they were saved with
+        if source is not None:
+            for file in files:
+                source.files[file.value] = self._source.files[file.value]
+            self._source = source
+
         logger.debug("Completed dataset creation")
         return datasets
 
-    def _save_datasets(self) -> None:
+    def _save_datasets(self, datasets: Dict[Split, Dataset]) -> None:
         """Saves TensorFlow datasets to disk with version control."""
         dataset_dir = self._save_path / self.hash
         dataset_dir.mkdir(parents=True, exist_ok=True)
         logger.debug("Saving datasets to directory: %s", dataset_dir)
 
-        for split, ds in self.datasets.items():
-            split_dir = dataset_dir / split.value
-            split_dir.mkdir(parents=True, exist_ok=True)
-            ds.save(str(split_dir), compression="GZIP")
-            logger.debug("Saved %s split to: %s", split.value, split_dir)
+        shards = self._write_splits(datasets, Path())
+        if self.storage is Storage.StorageFormat.TFRECORD:
+            if self._shards is None:
+                self._shards = self._saved_shards()
+            self._shards.update(shards)
 
-        assert self._datasets_exist(), f"Datasets not found in {dataset_dir}"
+        for split in datasets:
+            assert (dataset_dir / split.value).exists(), f"{split} not saved"
         logger.debug("Successfully verified all datasets were saved")
         return None
 
     def _save_config(self) -> None:
         dataset_dir = self._save_path / self.hash
-        config = self.config
+        config = json.loads(self.config)
+        if self._source is not None:
+            config["source"] = self._source.model_dump()
+        if self._shards is not None:
+            config["shards"] = {
+                split.value: [shard.model_dump() for shard in shards]
+                for split, shards in self._shards.items()
+            }
         config_path = dataset_dir / "config.json"
         with open(config_path, "w") as f:
-            f.write(config)
+            json.dump(config, f, indent=2)
 
         assert config_path.exists(), f"Config not saved to {config_path}"
         logger.debug("Successfully saved config json to %s", config_path)
         return None
 
-    def _load_config(self) -> str:
+    def _load_config(self) -> dict:
         """Load the config json from the dataset directory."""
         dataset_dir = self._save_path / self.hash
         config_path = dataset_dir / "config.json"
@@ -127,94 +529,320 @@ class Datasets(BaseModel):
             raise FileNotFoundError(f"Config not found at {config_path}")
         else:
             with open(config_path, "r") as f:
-                config = f.read()
+                config = json.load(f)
             return config
 
     def _verify_config(self) -> None:
         """Verify that a provided config json matches the current config."""
-        loaded_config = self._load_config()
-        if loaded_config != self.config:
+        loaded = self._load_config()
+        loaded_config = {k: v for k, v in loaded.items() if k not in _METADATA_KEYS}
+        if loaded_config != json.loads(self.config):
             raise ValueError(
                 f"Config mismatch: provided config {loaded_config} does not match current config {self.config}"
             )
         return None
 
-    def _datasets_exist(self) -> bool:
-        """Checks if versioned datasets exist on disk."""
+    def _load_source(self) -> SourceVersion:
+        """Load the source version of the saved splits from the config json."""
+        config = self._load_config()
+        if "source" not in config:
+            raise ValueError(
+                "Datasets were saved without a source version; rebuild them with "
+                "force_make=True to enable incremental updates"
+            )
+        return SourceVersion(**config["source"])
+
+    def _save_increment(self, version: int, datasets: Dict[Split, Dataset]) -> None:
+        """Saves the splits of an increment next to the existing ones.
+
+        Snapshots of increments are saved unbatched, to be rebatched with the
+        rest of their split when loaded, as TFRecord shards always are.
+        """
+        shards = self._write_splits(
+            datasets, Path("increments") / str(version), unbatched=True
+        )
+        if self.storage is Storage.StorageFormat.TFRECORD:
+            self._shards = self._load_shards()
+            for split, split_shards in shards.items():
+                self._shards[split] += split_shards
+
+    def _write_splits(
+        self, datasets: Dict[Split, Dataset], prefix: Path, unbatched: bool = False
+    ) -> Dict[Split, List[Storage.ShardInfo]]:
+        """Writes splits under `prefix` of the hash directory, one per thread.
+
+        Returns the TFRecord shards written for each split, none for snapshots.
+        """
+        hash_dir = self._save_path / self.hash
+
+        def write(split: Split) -> List[Storage.ShardInfo]:
+            if self.storage is Storage.StorageFormat.TFRECORD:
+                return Storage.write_tfrecord_shards(
+                    datasets[split],
+                    hash_dir,
+                    str(prefix / split.value),
+                    self.num_shards,
+                    self.compression,
+                )
+            split_dir = hash_dir / prefix / split.value
+            split_dir.mkdir(parents=True, exist_ok=True)
+            ds = datasets[split].unbatch() if unbatched else datasets[split]
+            ds.save(str(split_dir), compression=self.compression.snapshot_type)
+            logger.debug("Saved %s split to: %s", split.value, split_dir)
+            return []
+
+        return dict(
+            zip(datasets, Parallel.thread_map(write, datasets, self.num_workers))
+        )
+
+    def _load_shards(self) -> Dict[Split, List[Storage.ShardInfo]]:
+        """Load the per-split shard records from the config json."""
+        return {
+            Split(split): [Storage.ShardInfo(**shard) for shard in shards]
+            for split, shards in self._load_config()["shards"].items()
+        }
+
+    def _saved_shards(self) -> Dict[Split, List[Storage.ShardInfo]]:
+        """Shard records of the splits saved so far, if any."""
+        config_path = self._save_path / self.hash / "config.json"
+        if not config_path.exists() or "shards" not in self._load_config():
+            return {}
+        return self._load_shards()
+
+    def _saved_source(self) -> Optional[SourceVersion]:
+        """Source version of the splits saved so far, if any."""
+        config_path = self._save_path / self.hash / "config.json"
+        if not config_path.exists() or "source" not in self._load_config():
+            return None
+        return self._load_source()
+
+    def _remove_derived(self, splits: set[Split]) -> None:
+        """Drops increments, token ids and teacher scores of splits to be rebuilt."""
+        hash_dir = self._save_path / self.hash
+        if splits == set(Split):
+            shutil.rmtree(hash_dir / "increments", ignore_errors=True)
+        for split in splits:
+            for pattern in [f"increments/*/{split.value}", f"tokens/*/{split.value}"]:
+                for split_dir in hash_dir.glob(pattern):
+                    shutil.rmtree(split_dir)
+            for scores_path in hash_dir.glob(f"teachers/*/{split.value}.npy"):
+                scores_path.unlink()
+        self._tokenized = {}
+
+    def _split_exists(self, split: Split) -> bool:
+        """Checks if a versioned split exists on disk."""
         dataset_dir = self._save_path / self.hash
-        if not dataset_dir.exists():
-            logger.debug("Dataset directory does not exist: %s", dataset_dir)
+        if not (dataset_dir / "config.json").exists():
+            logger.debug("No saved datasets in: %s", dataset_dir)
             return False
+        if not (dataset_dir / split.value).exists():
+            logger.debug("Split %s missing in: %s", split.value, dataset_dir)
+            return False
+        if self.storage is Storage.StorageFormat.TFRECORD:
+            return split.value in self._load_config().get("shards", {})
+        return True
+
+    def _load_split(self, split: Split) -> Dataset:
+        """Loads a versioned TensorFlow split from disk."""
+        hash_dir = self._save_path / self.hash
+        logger.debug("Loading %s split from directory: %s", split.value, hash_dir)
+
+        if self.storage is Storage.StorageFormat.TFRECORD:
+            self._shards = self._load_shards()
+            return Preprocessing.optimize_dataset(
+                Storage.read_tfrecord_shards(
+                    hash_dir,
+                    self._shards[split],
+                    len(self.features),
+                    len(self.labels),
+                    self.batch_size,
+                    self.compression,
+                    self.deterministic,
+                    self._drop_remainder(split),
+                )
+            )
+        return self._load_snapshots(split)
 
-        split_exists = all((dataset_dir / split.value).exists() for split in Split)
+    def _new_report(self, filename: str) -> Instrumentation.StageReport:
+        return Instrumentation.StageReport(path=self._save_path / self.hash / filename)
 
-        if not split_exists:
-            logger.debug("One or more split directories missing in: %s", dataset_dir)
-        return split_exists
+    def _load_snapshots(self, split: Split) -> Dataset:
+        """Loads a snapshot split followed by its increments, if any.
 
-    def _load_datasets(self) -> dict[Split, Dataset]:
-        """Loads versioned TensorFlow datasets from disk."""
+        The unbatched rows of the increments are batched after the split's
+        own batches. A train split dropping its remainder is rebatched whole,
+        so rows of an increment left over from one batch are not lost.
+        """
         hash_dir = self._save_path / self.hash
-        logger.debug("Loading datasets from directory: %s", hash_dir)
+        version = self._load_config().get("source", {}).get("version", 0)
+        split_dirs = [hash_dir / split.value] + [
+            hash_dir / "increments" / str(n) / split.value
+            for n in range(1, version + 1)
+        ]
+        ds, *increments = [
+            tf.data.Dataset.load(
+                str(split_dir), compression=self.compression.snapshot_type
+            )
+            for split_dir in split_dirs
+            if split_dir.exists()
+        ]
+        if not increments:
+            return ds
+
+        rows = increments[0]
+        for increment in increments[1:]:
+            rows = rows.concatenate(increment)
+        if not self._drop_remainder(split):
+            return ds.concatenate(rows.batch(self.batch_size))
+
+        n_rows = int(ds.cardinality()) * self.batch_size + int(rows.cardinality())
+        ds = ds.unbatch().concatenate(rows).batch(self.batch_size, drop_remainder=True)
+        return ds.apply(
+            tf.data.experimental.assert_cardinality(n_rows // self.batch_size)
+        )
 
-        datasets = {
-            split: tf.data.Dataset.load(str(hash_dir / split.value), compression="GZIP")
-            for split in Split
-        }
+    def _token_dir(self, tokenizer: Tokenization.TokenizerConfig) -> Path:
+        token_hash = Tokenization.config_hash(tokenizer)
+        return self._save_path / self.hash / "tokens" / token_hash
+
+    def _load_tokenized(self, token_dir: Path, split: Split, width: int) -> Dataset:
+        ds = tf.data.Dataset.load(str(token_dir / split.value))
+        if self.bucket_boundaries is not None:
+            lengths = self._token_lengths(token_dir, split, ds)
+            ds = self._bucket_by_length(ds, lengths, width)
+            logger.debug("Bucketed tokenized %s split by length", split.value)
+        return Preprocessing.optimize_dataset(ds)
+
+    def _bucket_by_length(
+        self, ds: Dataset, lengths: np.ndarray, width: int
+    ) -> Dataset:
+        """Re-batches a tokenized split by length, logging the padding it saves."""
+        boundaries = sorted(b for b in set(self.bucket_boundaries) if b < width)
+        boundaries.append(width)
+
+        margin = self.bucket_margin
+        bucket_ids = Preprocessing.assign_length_buckets(lengths, boundaries, margin)
+        bucket_sizes = np.bincount(bucket_ids, minlength=len(boundaries))
+        n_batches = int(np.sum(-(-bucket_sizes // self.batch_size)))
+        logger.debug(
+            "Padding ratio %.2f fixed, %.2f with buckets %s",
+            Preprocessing.bucket_padding_ratio(lengths, [width]),
+            Preprocessing.bucket_padding_ratio(lengths, boundaries, margin),
+            boundaries,
+        )
 
-        logger.debug("Successfully loaded all datasets")
-        return datasets
+        ds = Preprocessing.bucket_by_length(
+            ds.unbatch(), boundaries, self.batch_size, margin
+        )
+        return ds.apply(tf.data.experimental.assert_cardinality(n_batches))
+
+    def _token_lengths(self, token_dir: Path, split: Split, ds: Dataset) -> np.ndarray:
+        """Non-padding token counts of a tokenized split, cached next to it."""
+        lengths_path = self._lengths_path(token_dir, split)
+        if not lengths_path.exists():
+            lengths_ds = ds.map(lambda x, _: Preprocessing.token_lengths(x))
+            lengths = np.concatenate(list(lengths_ds.as_numpy_iterator()))
+            np.save(lengths_path, lengths)
+        return np.load(lengths_path)
+
+    @staticmethod
+    def _lengths_path(token_dir: Path, split: Split) -> Path:
+        return token_dir / f"{split.value}-lengths.npy"
+
+    def _make_tokenize_fn(
+        self, tokenizer: Tokenization.TokenizerConfig
+    ) -> Tokenization.TokenizeFn:
+        """Builds the tokenizer, with the cached train vocabulary if it needs one."""
+        if isinstance(tokenizer, Tokenization.BertConfig):
+            return tokenizer.make_tokenize_fn()
+        return tokenizer.make_layer(self.vocabulary(tokenizer))
 
     def _generate_hash(self) -> str:
         """Generates a unique hash for the current dataset configuration."""
         return hashlib.sha256(self.config.encode()).hexdigest()[:10]
 
-    @staticmethod
-    def _load_raw_data() -> Dict[DownloadData.Files, pd.DataFrame]:
-        """Loads raw data from CSV files."""
+    def _load_raw_data(
+        self, files: Optional[set[DownloadData.Files]] = None
+    ) -> Dict[DownloadData.Files, pd.DataFrame]:
+        """Loads the needed raw data columns via the Arrow cache of the CSV files.
+
+        Only `files` are read, all of them by default. Files are validated on
+        a process pool and read on a thread pool of up to `num_workers` (all
+        CPUs by default), each whole by one worker, so the data does not
+        depend on the worker count.
+        """
         logger.debug("Loading raw data from CSV files")
-        kaggle_dataset_path = Path(DownloadData.download_kaggle_dataset())
+        kaggle_dataset_path = Path(
+            DownloadData.download_kaggle_dataset(
+                offline=self.offline, num_workers=self.num_workers
+            )
+        )
+        manifest = DownloadData.load_manifest()
+        self._source = SourceVersion(files=manifest.files)
 
-        raw_data = {
-            file: pd.read_csv(kaggle_dataset_path.joinpath(file.value))
-            for file in DownloadData.Files
+        raw_columns = {
+            file: columns
+            for file, columns in self._raw_columns().items()
+            if files is None or file in files
         }
+        raw_data = dict(
+            zip(
+                raw_columns,
+                Parallel.thread_map(
+                    lambda file: ArrowCache.read_raw_columns(
+                        file,
+                        kaggle_dataset_path,
+                        manifest.files[file.value].sha256,
+                        raw_columns[file],
+                    ),
+                    raw_columns,
+                    self.num_workers,
+                ),
+            )
+        )
 
         logger.debug("Loaded %d CSV files", len(raw_data))
         return raw_data
 
+    def _raw_columns(self) -> Dict[DownloadData.Files, list[str]]:
+        """Columns of each raw file needed for the configured features and labels."""
+        return {
+            DownloadData.Files.TRAIN: ["id", *self.features, *self.labels],
+            DownloadData.Files.TEST: ["id", *self.features],
+            DownloadData.Files.TEST_LABELS: ["id", *self.labels],
+        }
+
     def _split_data(
         self, raw_data: Dict[DownloadData.Files, pd.DataFrame]
     ) -> Dict[Split, pd.DataFrame]:
-        """Splits raw data into train, validation, and test sets."""
-        logger.debug("Splitting data with validation size: %f", self.val_size)
+        """Splits raw data into train, validation, and test sets.
 
-        # Join test and test_labels on ID column
-        test_inputs_df = raw_data[DownloadData.Files.TEST]
-        test_labels_df = raw_data[DownloadData.Files.TEST_LABELS]
-        test_df = test_inputs_df.merge(test_labels_df, on="id", validate="one_to_one")
+        Only the splits whose raw files are present are returned.
+        """
+        logger.debug("Splitting data with validation size: %f", self.val_size)
+        splits = {}
 
         # Split train into train and val
-        train_df = raw_data[DownloadData.Files.TRAIN]
-        train_df, val_df = Preprocessing.iter_train_val_split(
-            train_df,
-            self.features,
-            self.labels,
-            self.val_size,
-            self.shuffle,
-        )
+        if DownloadData.Files.TRAIN in raw_data:
+            train_df, val_df = Preprocessing.iter_train_val_split(
+                raw_data[DownloadData.Files.TRAIN],
+                self.labels,
+                self.val_size,
+                self.shuffle,
+            )
+            splits[Split.TRAIN], splits[Split.VAL] = train_df, val_df
 
-        splits = {
-            Split.TRAIN: train_df,
-            Split.VAL: val_df,
-            Split.TEST: test_df,
-        }
+        # Join test and test_labels on ID column
+        if DownloadData.Files.TEST in raw_data:
+            test_inputs_df = raw_data[DownloadData.Files.TEST]
+            test_labels_df = raw_data[DownloadData.Files.TEST_LABELS]
+            splits[Split.TEST] = test_inputs_df.merge(
+                test_labels_df, on="id", validate="one_to_one"
+            )
 
         logger.debug(
-            "Split sizes - Train: %d, Val: %d, Test: %d",
-            len(train_df),
-            len(val_df),
-            len(test_df),
+            "Split sizes - %s",
+            ", ".join(f"{split.value}: {len(df)}" for split, df in splits.items()),
         )
         return splits
 
@@ -232,10 +860,52 @@ class Datasets(BaseModel):
         logger.debug("Completed data cleaning")
         return cleaned_data
 
+    def _deduplicate(
+        self,
+        data: Dict[Split, pd.DataFrame],
+        reference: Optional[np.ndarray] = None,
+    ) -> Dict[Split, pd.DataFrame]:
+        """Removes near-duplicates from the splits and saves the kept signatures.
+
+        Near-duplicates are removed within each split and across splits, so
+        none leaks from train into val or test (see `Deduplication.deduplicate`).
+        Rows near-duplicating a `reference` signature of saved rows, which
+        `update` passes, are dropped too.
+        """
+        splits = [split for split in _DEDUP_ORDER if split in data]
+        frames, signatures = Deduplication.deduplicate(
+            [data[split] for split in splits],
+            self.dedup,
+            self.features[0],
+            self.labels,
+            reference,
+            self.num_workers,
+        )
+        signatures_path = self._signatures_path()
+        signatures_path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(signatures_path, signatures)
+        return dict(zip(splits, frames))
+
+    def _load_signatures(self) -> np.ndarray:
+        signatures_path = self._signatures_path()
+        if not signatures_path.exists():
+            raise ValueError(
+                "Datasets were saved without dedup signatures; rebuild them with "
+                "force_make=True to enable incremental updates"
+            )
+        return np.load(signatures_path)
+
+    def _signatures_path(self) -> Path:
+        return self._save_path / self.hash / "dedup_signatures.npy"
+
     def _convert_to_tensorflow(
-        self, data: Dict[Split, pd.DataFrame]
+        self, data: Dict[Split, pd.DataFrame], keep_remainder: bool = False
     ) -> Dict[Split, Dataset]:
-        """Converts pandas DataFrames to TensorFlow datasets with batching and prefetching."""
+        """Converts pandas DataFrames to TensorFlow datasets with batching and prefetching.
+
+        With `keep_remainder`, as for increments, no split drops its last
+        partial batch.
+        """
         logger.debug(
             "Converting to TensorFlow datasets with batch size: %d", self.batch_size
         )
@@ -245,12 +915,42 @@ class Datasets(BaseModel):
             features = df[self.features].values
             labels = df[self.labels].values
             ds = tf.data.Dataset.from_tensor_slices((features, labels))
-            ds = ds.batch(self.batch_size, drop_remainder=True)
+            drop_remainder = self._drop_remainder(split) and not keep_remainder
+            ds = ds.batch(self.batch_size, drop_remainder=drop_remainder)
             datasets[split] = ds.cache().prefetch(tf.data.AUTOTUNE)
             logger.debug("Created %s dataset with %d batches", split.value, len(ds))
 
         return datasets
 
+    def _drop_remainder(self, split: Split) -> bool:
+        """Only train may drop its last partial batch; evaluation sees every row."""
+        return self.drop_remainder and split is Split.TRAIN
+
+
+def _read_appended_rows(
+    file_path: Path, offset: Optional[int], columns: List[str], labels: List[str]
+) -> pd.DataFrame:
+    """Reads the rows after byte `offset` of a CSV, or none without an offset.
+
+    Columns other than `labels` are read as strings, as a few rows of numeric
+    looking ids or comments would otherwise be parsed as numbers.
+    """
+    if offset is None:
+        return pd.DataFrame(columns=columns)
+    header = pd.read_csv(file_path, nrows=0).columns.tolist()
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        tail = f.read()
+    if not tail.strip():
+        return pd.DataFrame(columns=columns)
+    return pd.read_csv(
+        io.BytesIO(tail),
+        header=None,
+        names=header,
+        usecols=columns,
+        dtype={column: str for column in columns if column not in labels},
+    )
+
 
 def main() -> None:
     DATA_PARAMS = {
@@ -1,15 +1,29 @@
-from typing import Optional
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence
 
 import keras
+import numpy as np
 import tensorflow as tf
-from pydantic import BaseModel, Field, PositiveInt
+from pydantic import BaseModel, Field, NonNegativeInt, PositiveInt
 
-from . import logging, types
+from . import (
+    Checkpointing,
+    Distillation,
+    Distributed,
+    Logging,
+    Preprocessing,
+    Tokenization,
+    Types,
+)
 
-logger = logging.setup_logger(__name__)
+logger = Logging.setup_logger(__name__)
 
+_CONV_STRIDES: int = 3
 
-def get_metrics() -> list[types.Metric]:
+
+def get_metrics() -> list[Types.Metric]:
     return [
         keras.metrics.Precision(name="precision"),
         keras.metrics.Recall(name="recall"),
@@ -19,6 +33,64 @@ def get_metrics() -> list[types.Metric]:
     ]
 
 
+class PerformanceMode(BaseModel):
+    """XLA compilation and bfloat16 mixed precision for faster CPU training.
+
+    Mixed precision keeps variables in float32 and computes in bfloat16, so
+    unlike float16 it needs no loss scaling. Output layers stay float32.
+    """
+
+    jit_compile: bool = False
+    mixed_precision: bool = False
+
+    @property
+    def dtype_policy(self) -> str:
+        return "mixed_bfloat16" if self.mixed_precision else "float32"
+
+
+class BatchStats(BaseModel):
+    """Timing of a single fixed-shape inference batch."""
+
+    bucket_length: PositiveInt
+    n_examples: PositiveInt
+    n_tokens: NonNegativeInt
+    latency: float
+
+
+class InferenceStats(BaseModel):
+    """Per-batch latency and aggregate throughput of a prediction run."""
+
+    batch_size: PositiveInt
+    batches: list[BatchStats] = Field(default_factory=list)
+
+    @property
+    def n_examples(self) -> int:
+        return sum(batch.n_examples for batch in self.batches)
+
+    @property
+    def total_latency(self) -> float:
+        return sum(batch.latency for batch in self.batches)
+
+    @property
+    def throughput(self) -> float:
+        """Examples scored per second of model time."""
+        total = self.total_latency
+        return self.n_examples / total if total > 0 else 0.0
+
+    @property
+    def padding_ratio(self) -> float:
+        """Fraction of the fed token positions that were padding."""
+        fed = sum(batch.bucket_length * self.batch_size for batch in self.batches)
+        tokens = sum(batch.n_tokens for batch in self.batches)
+        return 1 - tokens / fed if fed else 0.0
+
+    def latency_percentile(self, q: float) -> float:
+        """Returns the q-th percentile of per-batch latency in seconds."""
+        if not self.batches:
+            return 0.0
+        return float(np.percentile([batch.latency for batch in self.batches], q))
+
+
 class TextClassifier(BaseModel):
     max_tokens: PositiveInt
     sequence_length: PositiveInt
@@ -27,44 +99,125 @@ class TextClassifier(BaseModel):
     conv_k_size: PositiveInt
     hidden_neurons: PositiveInt
     dropout_rate: float = Field(gt=0, lt=1)
+    adapt_sample_size: Optional[PositiveInt] = None
+    performance: PerformanceMode = Field(default_factory=PerformanceMode)
 
-    _model: Optional[types.Model] = None
-    _history: Optional[types.History] = None
+    _model: Optional[Types.Model] = None
+    _history: Optional[Types.History] = None
+    _vectorize_layer: Optional[Types.Vectorizer] = None
+    _token_model: Optional[Types.Model] = None
+    _inference_stats: Optional[InferenceStats] = None
 
     @property
     def config(self) -> str:
         return self.model_dump_json(
             indent=2,
-            exclude={"_model", "_history"},
+            exclude={
+                "_model",
+                "_history",
+                "_vectorize_layer",
+                "_token_model",
+                "_inference_stats",
+            },
         )
 
     @property
-    def model(self) -> Optional[types.Model]:
+    def model(self) -> Optional[Types.Model]:
         return self._model
 
     @property
-    def history(self) -> Optional[types.History]:
+    def history(self) -> Optional[Types.History]:
         return self._history
 
+    @property
+    def tokenizer(self) -> Tokenization.VectorizerConfig:
+        """Tokenizer config to pre-tokenize datasets for this classifier with."""
+        return Tokenization.VectorizerConfig(
+            max_tokens=self.max_tokens,
+            sequence_length=self.sequence_length,
+            adapt_sample_size=self.adapt_sample_size,
+        )
+
+    @property
+    def bucket_boundaries(self) -> list[int]:
+        """Default bucket widths, each long enough for the convolutions.
+
+        Pass to `Datasets(bucket_boundaries=...)`, with `padding_margin` as
+        its `bucket_margin`, to train on batches bucketed as at inference.
+        """
+        return self._bucket_boundaries(None)
+
+    @property
+    def inference_stats(self) -> Optional[InferenceStats]:
+        """Batch timings of the most recent `predict_proba` call."""
+        return self._inference_stats
+
     def train(
         self,
-        train_dataset: types.Dataset,
+        train_dataset: Types.Dataset,
         epochs: int,
-        metrics: list[types.Metric],
-        val_dataset: Optional[types.Dataset] = None,
+        metrics: list[Types.Metric],
+        val_dataset: Optional[Types.Dataset] = None,
         callbacks: Optional[list[keras.callbacks.Callback]] = None,
         verbose: int = 1,
+        vocabulary: Optional[list[str]] = None,
+        distillation: Optional[Distillation.DistillationConfig] = None,
+        strategy: Optional[tf.distribute.Strategy] = None,
     ) -> None:
+        """Builds and trains the model on raw text or pre-tokenized datasets.
+
+        Pre-tokenized datasets need the `vocabulary` they were tokenized with;
+        for raw text it skips adapting the vectorizer. With `distillation`,
+        `train_dataset` carries teacher scores, as from
+        `Datasets.with_teacher_scores`.
+        """
+        # Fit to the blended soft targets; validation keeps the true labels
+        if distillation is not None:
+            train_dataset = train_dataset.map(distillation.blend)
+
         # Build model
-        model = self._build_model(train_dataset, metrics)
+        if strategy is not None and not Tokenization.is_tokenized(train_dataset):
+            raise ValueError("Distributed training needs pre-tokenized datasets")
+        with (strategy or tf.distribute.get_strategy()).scope():
+            model = self._build_model(train_dataset, metrics, vocabulary)
         print(model.summary())
 
+        # Each worker trains on its shard, outside of Keras `fit`, tracking
+        # only the loss
+        if strategy is not None:
+            self._model = model
+            self._history = Distributed.fit(
+                strategy,
+                self._token_model,
+                train_dataset,
+                epochs,
+                val_dataset,
+                callbacks,
+            )
+            return
+
         # Train the model
-        history = model.fit(
+        if Tokenization.is_tokenized(train_dataset):
+            fit_model = self._token_model
+        elif self.performance.jit_compile:
+            # String ops cannot be XLA compiled, so vectorize in the pipeline
+            fit_model = self._token_model
+            train_dataset = Preprocessing.vectorize_dataset(
+                train_dataset, self._vectorize_layer
+            )
+            if val_dataset is not None:
+                val_dataset = Preprocessing.vectorize_dataset(
+                    val_dataset, self._vectorize_layer
+                )
+        else:
+            fit_model = model
+        # Resumes from a `Checkpointing.TrainingCheckpoint` in `callbacks`
+        history = Checkpointing.fit(
+            fit_model,
             train_dataset,
+            epochs,
+            callbacks,
             validation_data=val_dataset,
-            epochs=epochs,
-            callbacks=callbacks,
             verbose=str(verbose),
         )
 
@@ -72,67 +225,287 @@ class TextClassifier(BaseModel):
         self._model = model
         self._history = history
 
-    def evaluate(self, test_dataset: types.Dataset, verbose: int = 1):
+    def evaluate(self, test_dataset: Types.Dataset, verbose: int = 1):
+        self._check_trained()
+        if Tokenization.is_tokenized(test_dataset):
+            model = self._token_model
+        else:
+            model = self._model
+        return model.evaluate(test_dataset, return_dict=True, verbose=str(verbose))
+
+    def save(self, directory: Path) -> None:
+        """Saves the classifier config and trained model, vocabulary included."""
+        self._check_trained()
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / "config.json", "w") as f:
+            f.write(self.config)
+        self._model.save(directory / "model.keras")
+        logger.debug("Saved text classifier to %s", directory)
+
+    @classmethod
+    def load(cls, directory: Path) -> "TextClassifier":
+        """Loads a classifier previously written with `save`."""
+        config_path = directory / "config.json"
+        if not config_path.exists():
+            raise FileNotFoundError(f"Config not found at {config_path}")
+        with open(config_path, "r") as f:
+            classifier = cls.model_validate_json(f.read())
+
+        model = keras.models.load_model(directory / "model.keras")
+        vectorize_layer = next(
+            layer
+            for layer in model.layers
+            if isinstance(layer, keras.layers.TextVectorization)
+        )
+        classifier_layers = model.layers[model.layers.index(vectorize_layer) + 1 :]
+
+        classifier._model = model
+        classifier._set_inference_model(
+            vectorize_layer, classifier_layers, get_metrics()
+        )
+        logger.debug("Loaded text classifier from %s", directory)
+        return classifier
+
+    def predict_proba(
+        self,
+        texts: Iterable[str],
+        batch_size: int = 128,
+        bucket_boundaries: Optional[Sequence[int]] = None,
+        chunk_size: int = 8192,
+    ) -> np.ndarray:
+        """Scores raw comments, returning one probability per label.
+
+        Comments are vectorized a chunk at a time, grouped into length buckets
+        and run through the model in fixed-shape batches padded only to their
+        bucket length. Buckets keep enough trailing padding for the conv stack
+        to see the same windows as at `sequence_length`, so the scores match
+        the full-length model.
+        """
+        self._check_trained()
+        boundaries = self._bucket_boundaries(bucket_boundaries)
+        stats = InferenceStats(batch_size=batch_size)
+
+        scores = [
+            self._predict_chunk(chunk, batch_size, boundaries, stats)
+            for chunk in _chunked(texts, chunk_size)
+        ]
+
+        self._inference_stats = stats
+        logger.debug(
+            "Scored %d comments in %d batches: %.1f examples/s, p50 %.2f ms, "
+            "p99 %.2f ms, padding ratio %.2f",
+            stats.n_examples,
+            len(stats.batches),
+            stats.throughput,
+            stats.latency_percentile(50) * 1e3,
+            stats.latency_percentile(99) * 1e3,
+            stats.padding_ratio,
+        )
+
+        if not scores:
+            return np.empty((0, self._token_model.output_shape[-1]), dtype=np.float32)
+        return np.concatenate(scores)
+
+    def predict(
+        self,
+        texts: Iterable[str],
+        threshold: float = 0.5,
+        **kwargs,
+    ) -> np.ndarray:
+        """Returns binary label predictions for raw comments."""
+        return (self.predict_proba(texts, **kwargs) >= threshold).astype(np.int32)
+
+    def _predict_chunk(
+        self,
+        texts: list[str],
+        batch_size: int,
+        boundaries: list[int],
+        stats: InferenceStats,
+    ) -> np.ndarray:
+        token_ids = self._vectorize_layer(tf.constant(texts)).numpy()
+        lengths = np.count_nonzero(token_ids, axis=1)
+        bucket_ids = Preprocessing.assign_length_buckets(
+            lengths, boundaries, self.padding_margin
+        )
+
+        scores = np.empty(
+            (len(texts), self._token_model.output_shape[-1]), dtype=np.float32
+        )
+        for bucket_id, bucket_length in enumerate(boundaries):
+            indices = np.flatnonzero(bucket_ids == bucket_id)
+            for start in range(0, len(indices), batch_size):
+                batch_indices = indices[start : start + batch_size]
+                batch = np.zeros((batch_size, bucket_length), dtype=token_ids.dtype)
+                batch[: len(batch_indices)] = token_ids[batch_indices, :bucket_length]
+
+                start_time = time.perf_counter()
+                outputs = self._token_model.predict_on_batch(batch)
+                latency = time.perf_counter() - start_time
+
+                scores[batch_indices] = outputs[: len(batch_indices)]
+                stats.batches.append(
+                    BatchStats(
+                        bucket_length=bucket_length,
+                        n_examples=len(batch_indices),
+                        n_tokens=int(lengths[batch_indices].sum()),
+                        latency=latency,
+                    )
+                )
+        return scores
+
+    @property
+    def padding_margin(self) -> int:
+        """Trailing padding a bucket needs beyond the longest comment in it.
+
+        This is the receptive field of the two strided convolutions plus their
+        combined stride, so every window of the full-length input, including
+        one all-padding window, is still present after truncation.
+        """
+        receptive_field = self.conv_k_size + (self.conv_k_size - 1) * _CONV_STRIDES
+        return receptive_field + _CONV_STRIDES**2
+
+    def _bucket_boundaries(self, boundaries: Optional[Sequence[int]]) -> list[int]:
+        if boundaries is None:
+            boundaries = []
+            length = 32
+            while length < self.sequence_length:
+                boundaries.append(length)
+                length *= 2
+        boundaries = sorted(
+            b
+            for b in set(boundaries)
+            if self.padding_margin <= b < self.sequence_length
+        )
+        return boundaries + [self.sequence_length]
+
+    def _check_trained(self) -> None:
         if self._model is None:
             raise ValueError(
                 "Model does not exist. Run `train` first to build and train the model."
             )
-        assert isinstance(self._model, types.Model)
+        assert isinstance(self._model, Types.Model)
         assert self._model.built, "Expected the model to be built (i.e. trained)"
-        return self._model.evaluate(
-            test_dataset, return_dict=True, verbose=str(verbose)
-        )
 
     def _build_model(
-        self, train_dataset: types.Dataset, metrics: list[types.Metric]
-    ) -> types.Model:
-        text_ds = train_dataset.map(lambda x, _: x)
-        vectorize_layer = self._make_vectorize_layer()
-        vectorize_layer.adapt(text_ds)
+        self,
+        train_dataset: Types.Dataset,
+        metrics: list[Types.Metric],
+        vocabulary: Optional[list[str]] = None,
+    ) -> Types.Model:
+        tokenized = Tokenization.is_tokenized(train_dataset)
+        fit_tokens = tokenized or self.performance.jit_compile
+        vectorize_layer = self._make_vectorize_layer(vocabulary)
+        if vocabulary is None:
+            if tokenized:
+                raise ValueError(
+                    "Training on a pre-tokenized dataset needs the `vocabulary` "
+                    "it was tokenized with."
+                )
+            text_ds = train_dataset.map(lambda x, _: x)
+            if self.adapt_sample_size is not None:
+                text_ds = text_ds.unbatch().take(self.adapt_sample_size).batch(1024)
+            vectorize_layer.adapt(text_ds)
 
         # Build the model
         inputs = keras.Input(shape=(1,), dtype=tf.string, name="text")
-        x = vectorize_layer(inputs)
-
-        x = keras.layers.Embedding(
-            input_dim=(self.max_tokens + 1),
-            output_dim=self.embedding_dim,
-        )(x)
-        x = keras.layers.Dropout(self.dropout_rate)(x)
-
-        x = keras.layers.Conv1D(
-            self.conv_filters,
-            self.conv_k_size,
-            padding="valid",
-            activation="relu",
-            strides=3,
-        )(x)
-        x = keras.layers.Conv1D(
-            self.conv_filters,
-            self.conv_k_size,
-            padding="valid",
-            activation="relu",
-            strides=3,
-        )(x)
-        x = keras.layers.GlobalMaxPooling1D()(x)
-
-        x = keras.layers.Dense(128, activation="relu")(x)
-        x = keras.layers.Dropout(self.dropout_rate)(x)
-
-        outputs = keras.layers.Dense(6, activation="sigmoid", name="predictions")(x)
+        classifier_layers = self._make_classifier_layers()
+        outputs = _apply_layers(vectorize_layer(inputs), classifier_layers)
 
+        # Only the model that is trained gets the caller's metric objects
         model = keras.Model(inputs, outputs)
-        model.compile(loss="binary_crossentropy", optimizer="adam", metrics=metrics)
+        model.compile(
+            loss="binary_crossentropy",
+            optimizer="adam",
+            metrics=_clone_metrics(metrics) if fit_tokens else metrics,
+        )
 
+        self._set_inference_model(
+            vectorize_layer,
+            classifier_layers,
+            metrics if fit_tokens else _clone_metrics(metrics),
+        )
         return model
 
-    def _make_vectorize_layer(self) -> types.Vectorizer:
-        return keras.layers.TextVectorization(
-            max_tokens=self.max_tokens,
-            output_mode="int",
-            output_sequence_length=self.sequence_length,
+    def _set_inference_model(
+        self,
+        vectorize_layer: Types.Vectorizer,
+        classifier_layers: list[keras.layers.Layer],
+        metrics: list[Types.Metric],
+    ) -> None:
+        """Shares the classifier weights with a variable-length token-id model.
+
+        The token-id model serves bucketed inference and training or
+        evaluation on pre-tokenized datasets.
+        """
+        token_inputs = keras.Input(shape=(None,), dtype="int64", name="token_ids")
+        token_outputs = _apply_layers(token_inputs, classifier_layers)
+
+        token_model = keras.Model(token_inputs, token_outputs)
+        token_model.compile(
+            loss="binary_crossentropy",
+            optimizer="adam",
+            metrics=metrics,
+            jit_compile=self.performance.jit_compile,
         )
 
+        self._vectorize_layer = vectorize_layer
+        self._token_model = token_model
+
+    def _make_classifier_layers(self) -> list[keras.layers.Layer]:
+        dtype = self.performance.dtype_policy
+        return [
+            keras.layers.Embedding(
+                input_dim=(self.max_tokens + 1),
+                output_dim=self.embedding_dim,
+                dtype=dtype,
+            ),
+            keras.layers.Dropout(self.dropout_rate, dtype=dtype),
+            keras.layers.Conv1D(
+                self.conv_filters,
+                self.conv_k_size,
+                padding="valid",
+                activation="relu",
+                strides=_CONV_STRIDES,
+                dtype=dtype,
+            ),
+            keras.layers.Conv1D(
+                self.conv_filters,
+                self.conv_k_size,
+                padding="valid",
+                activation="relu",
+                strides=_CONV_STRIDES,
+                dtype=dtype,
+            ),
+            keras.layers.GlobalMaxPooling1D(dtype=dtype),
+            keras.layers.Dense(self.hidden_neurons, activation="relu", dtype=dtype),
+            keras.layers.Dropout(self.dropout_rate, dtype=dtype),
+            # Sigmoid and loss in float32 for numerically stable probabilities
+            keras.layers.Dense(
+                6, activation="sigmoid", name="predictions", dtype="float32"
+            ),
+        ]
+
+    def _make_vectorize_layer(
+        self, vocabulary: Optional[list[str]] = None
+    ) -> Types.Vectorizer:
+        return self.tokenizer.make_layer(vocabulary)
+
+
+def _apply_layers(x, layers: list[keras.layers.Layer]):
+    for layer in layers:
+        x = layer(x)
+    return x
+
+
+def _clone_metrics(metrics: list[Types.Metric]) -> list[Types.Metric]:
+    return [metric.__class__.from_config(metric.get_config()) for metric in metrics]
+
+
+def _chunked(texts: Iterable[str], chunk_size: int) -> Iterator[list[str]]:
+    iterator = iter(texts)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
 
 if __name__ == "__main__":
     pass
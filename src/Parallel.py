@@ -0,0 +1,68 @@
+"""Ordered thread and process pool maps for the independent steps of the pipeline."""
+
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, TypeVar
+
+from . import Logging
+
+logger = Logging.setup_logger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def resolve_workers(num_workers: Optional[int]) -> int:
+    """The worker count to use, defaulting to the number of CPUs."""
+    return num_workers if num_workers is not None else os.cpu_count() or 1
+
+
+def thread_map(
+    fn: Callable[[T], R], items: Iterable[T], num_workers: Optional[int] = None
+) -> list[R]:
+    """Maps `fn` over `items` on a thread pool, for I/O and GIL-releasing work.
+
+    Results keep the order of `items`, whatever order the calls finish in.
+    """
+    return _map(ThreadPoolExecutor, fn, items, num_workers)
+
+
+def process_map(
+    fn: Callable[[T], R], items: Iterable[T], num_workers: Optional[int] = None
+) -> list[R]:
+    """Maps `fn` over `items` on a process pool, for CPU-bound Python work.
+
+    Workers are spawned, as a process that has loaded TensorFlow cannot be
+    safely forked, so `fn` must be importable and the items and results
+    picklable. Results keep the order of `items`.
+    """
+    return _map(
+        ProcessPoolExecutor,
+        fn,
+        items,
+        num_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def _map(
+    executor_type: type[Executor],
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    num_workers: Optional[int],
+    **executor_kwargs,
+) -> list[R]:
+    items = list(items)
+    num_workers = min(resolve_workers(num_workers), len(items))
+    # A pool of one only adds overhead
+    if num_workers <= 1:
+        return [fn(item) for item in items]
+    logger.debug(
+        "Running %d tasks on a %s of %d",
+        len(items),
+        executor_type.__name__,
+        num_workers,
+    )
+    with executor_type(max_workers=num_workers, **executor_kwargs) as executor:
+        return list(executor.map(fn, items))
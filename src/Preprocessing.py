@@ -1,9 +1,12 @@
-from typing import List, Tuple
+import unicodedata
+from typing import List, Sequence, Tuple
 
 import keras
+import numpy as np
 import pandas as pd
 import tensorflow as tf
-from skmultilearn.model_selection import iterative_train_test_split
+
+from . import Config
 
 # ----- Type aliases -----
 
@@ -17,35 +20,43 @@ TextVectorizer = keras.layers.TextVectorization
 
 def iter_train_val_split(
     df: pd.DataFrame,
-    features: list[str],
     labels: list[str],
     val_size: float,
     shuffle: bool = True,
+    seed: int = Config.SEED,
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    """Split dataframe into train and test sets."""
+    """Split dataframe into train and val sets stratified on the labels."""
     if shuffle:
-        df = df.sample(frac=1, random_state=0)
-
-    X = df[features].to_numpy()
-    y = df[labels].to_numpy()
+        df = df.sample(frac=1, random_state=seed)
 
-    X_train, y_train, X_val, y_val = iterative_train_test_split(
-        X.reshape(-1, 1),
-        y,
-        val_size,
+    folds = iterative_stratification(
+        df[labels].to_numpy(), [1 - val_size, val_size], seed
     )
+    train_df = df.iloc[np.flatnonzero(folds == 0)]
+    val_df = df.iloc[np.flatnonzero(folds == 1)]
 
-    train_df = pd.DataFrame(columns=df.columns)
-    val_df = pd.DataFrame(columns=df.columns)
+    assert len(train_df) + len(val_df) == len(df)
+    return train_df, val_df
 
-    train_df[features] = X_train
-    val_df[features] = X_val
 
-    train_df[labels] = y_train
-    val_df[labels] = y_val
+def iter_k_fold_split(
+    df: pd.DataFrame,
+    labels: list[str],
+    n_splits: int,
+    shuffle: bool = True,
+    seed: int = Config.SEED,
+) -> List[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """Split dataframe into k (train, val) pairs with label-stratified val folds."""
+    if shuffle:
+        df = df.sample(frac=1, random_state=seed)
 
-    assert len(train_df) + len(val_df) == len(df)
-    return train_df, val_df
+    folds = iterative_stratification(
+        df[labels].to_numpy(), [1 / n_splits] * n_splits, seed
+    )
+    return [
+        (df.iloc[np.flatnonzero(folds != k)], df.iloc[np.flatnonzero(folds == k)])
+        for k in range(n_splits)
+    ]
 
 
 def drop_non_binary_labels(
@@ -58,6 +69,148 @@ def drop_non_binary_labels(
     return df.drop(non_binary_indices).reset_index(drop=True)
 
 
+# ----- Text normalization -----
+
+
+def normalize_text(text: str, lowercase: bool = False) -> str:
+    """NFKC-normalizes a comment and collapses its whitespace.
+
+    NFKC folds compatibility characters, such as full-width letters, which
+    a model may score differently from their plain forms, so callers must
+    score the normalized text rather than the original. `lowercase` is only
+    safe for models that lowercase their input, such as `TextClassifier`
+    with its default standardization.
+    """
+    text = " ".join(unicodedata.normalize("NFKC", text).split())
+    return text.lower() if lowercase else text
+
+
+# ----- Multi-label stratification -----
+
+
+def iterative_stratification(
+    y: np.ndarray,
+    ratios: Sequence[float],
+    seed: int = Config.SEED,
+) -> np.ndarray:
+    """Assign each row of a binary label matrix to a fold (Sechidis et al., 2011).
+
+    Works on the label matrix only and processes one label at a time instead
+    of one row at a time: the rarest remaining label's rows are shared out
+    among the folds the way the row-by-row greedy would (most remaining
+    demand for the label first, then most remaining demand overall), the
+    demands are updated, and rows without remaining positive labels are
+    distributed last by overall demand.
+
+    Returns an array of fold indices aligned with the rows of `y`.
+    """
+    y = np.asarray(y) == 1
+    ratios = np.asarray(ratios, dtype=float)
+    if not np.isclose(ratios.sum(), 1):
+        raise ValueError(f"Fold ratios must sum to 1: {ratios}")
+
+    rng = np.random.default_rng(seed)
+    n_rows = len(y)
+    folds = np.full(n_rows, -1)
+    remaining = np.ones(n_rows, dtype=bool)
+
+    label_demand = ratios[:, None] * y.sum(axis=0)[None, :]
+    row_demand = ratios * n_rows
+
+    while True:
+        label_counts = y[remaining].sum(axis=0)
+        if not label_counts.any():
+            break
+        label = np.argmin(np.where(label_counts > 0, label_counts, np.inf))
+        rows = np.flatnonzero(remaining & y[:, label])
+
+        allocation = _water_fill(label_demand[:, label], len(rows), row_demand, rng)
+        for fold, fold_rows in enumerate(_deal_rows(rows, allocation, rng)):
+            folds[fold_rows] = fold
+            label_demand[fold] -= y[fold_rows].sum(axis=0)
+        row_demand -= allocation
+        remaining[rows] = False
+
+    rows = np.flatnonzero(remaining)
+    allocation = _water_fill(row_demand, len(rows), row_demand, rng)
+    for fold, fold_rows in enumerate(_deal_rows(rows, allocation, rng)):
+        folds[fold_rows] = fold
+
+    return folds
+
+
+def _deal_rows(
+    rows: np.ndarray, allocation: np.ndarray, rng: np.random.Generator
+) -> list[np.ndarray]:
+    """Randomly deal rows out to folds in the allocated amounts."""
+    return np.split(rng.permutation(rows), np.cumsum(allocation)[:-1])
+
+
+def _water_fill(
+    demand: np.ndarray,
+    n_items: int,
+    tie_break: np.ndarray,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Count how many items each fold gets when items are handed out one by one
+    to the fold with the largest remaining demand.
+
+    Folds level with each other take whole rounds at once; a final partial
+    round goes to the level folds with the largest `tie_break`, then at random.
+    """
+    demand = demand.astype(float)
+    allocation = np.zeros(len(demand), dtype=int)
+
+    while n_items > 0:
+        top = demand.max()
+        at_top = demand >= top - 1e-9
+        n_top = int(at_top.sum())
+
+        rounds = n_items // n_top
+        if not at_top.all():
+            gap = top - demand[~at_top].max()
+            rounds = min(rounds, max(1, int(np.ceil(gap - 1e-9))))
+
+        if rounds == 0:
+            candidates = np.flatnonzero(at_top)
+            order = np.lexsort((rng.random(n_top), -tie_break[candidates]))
+            allocation[candidates[order[:n_items]]] += 1
+            break
+
+        allocation[at_top] += rounds
+        demand[at_top] -= rounds
+        n_items -= rounds * n_top
+
+    return allocation
+
+
+# ----- Sequence length bucketing -----
+
+
+def assign_length_buckets(
+    lengths: np.ndarray, boundaries: Sequence[int], margin: int = 0
+) -> np.ndarray:
+    """Map each length to the index of the smallest bucket boundary that fits it.
+
+    A bucket fits a length if it also leaves `margin` trailing padding.
+    Lengths above the last boundary fall into the last bucket.
+    """
+    boundaries = np.asarray(boundaries)
+    if np.any(np.diff(boundaries) <= 0):
+        raise ValueError(f"Bucket boundaries must be strictly increasing: {boundaries}")
+    bucket_ids = np.searchsorted(boundaries, lengths + margin, side="left")
+    return np.minimum(bucket_ids, len(boundaries) - 1)
+
+
+def bucket_padding_ratio(
+    lengths: np.ndarray, boundaries: Sequence[int], margin: int = 0
+) -> float:
+    """Fraction of padding when each example is padded to its bucket boundary."""
+    bucket_ids = assign_length_buckets(lengths, boundaries, margin)
+    padded_lengths = np.asarray(boundaries)[bucket_ids]
+    return 1 - lengths.sum() / padded_lengths.sum() if len(lengths) else 0.0
+
+
 # ----- TensorFlow Dataset preprocessing -----
 
 
@@ -68,6 +221,44 @@ def vectorize_dataset(dataset: Dataset, vectorize_layer: TextVectorizer) -> Data
     )
 
 
+def token_lengths(features: tf.Tensor | dict[str, tf.Tensor]) -> tf.Tensor:
+    """Count non-padding tokens in token ids or a BERT input dict (last axis)."""
+    if isinstance(features, dict):
+        return tf.reduce_sum(tf.cast(features["input_mask"], tf.int64), axis=-1)
+    return tf.math.count_nonzero(features, axis=-1)
+
+
+def bucket_by_length(
+    dataset: Dataset, boundaries: Sequence[int], batch_size: int, margin: int = 0
+) -> Dataset:
+    """Batch unbatched (token ids, labels) examples with others of similar length.
+
+    Each batch holds examples of a single bucket and is trimmed to that
+    bucket's boundary, which must be at least the padded feature length for
+    the last bucket. Buckets are assigned as by `assign_length_buckets` with
+    `margin`. Partial batches are kept.
+    """
+    boundaries_tensor = tf.constant(boundaries, dtype=tf.int64)
+
+    def key_func(features, labels) -> tf.Tensor:
+        length = tf.reshape(token_lengths(features) + margin, [1])
+        bucket_id = tf.searchsorted(
+            boundaries_tensor, length, side="left", out_type=tf.int64
+        )[0]
+        return tf.minimum(bucket_id, tf.constant(len(boundaries) - 1, tf.int64))
+
+    def trim(features, length: tf.Tensor):
+        if isinstance(features, dict):
+            return {name: ids[:, :length] for name, ids in features.items()}
+        return features[:, :length]
+
+    def reduce_func(bucket_id: tf.Tensor, window: Dataset) -> Dataset:
+        length = tf.gather(boundaries_tensor, bucket_id)
+        return window.batch(batch_size).map(lambda x, y: (trim(x, length), y))
+
+    return dataset.group_by_window(key_func, reduce_func, window_size=batch_size)
+
+
 def optimize_dataset(dataset: Dataset) -> Dataset:
     """Apply performance optimizations to datasets."""
     return dataset.cache().prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,245 @@
+"""Serve toxicity scores over HTTP with dynamic micro-batching."""
+
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+import tensorflow as tf
+from pydantic import BaseModel, Field, PositiveInt
+
+from . import Config, Export, Logging
+from .Caching import PredictionCache
+from .Modeling import TextClassifier
+
+logger = Logging.setup_logger(__name__)
+
+Scorer = Callable[[list[str]], np.ndarray]
+
+
+class _Pending(NamedTuple):
+    text: str
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class MicroBatcher(BaseModel):
+    """Merges concurrent single-comment requests into batched model calls.
+
+    A batch is dispatched when it reaches `max_batch_size` or when
+    `max_wait_ms` has passed since its first request arrived. Model calls run
+    one at a time on a dedicated worker thread so the event loop keeps
+    accepting requests while a batch is scored.
+    """
+
+    scorer: Scorer
+    max_batch_size: PositiveInt = 64
+    max_wait_ms: float = Field(default=5.0, ge=0)
+    latency_window: PositiveInt = 10_000
+
+    _queue: Optional[asyncio.Queue] = None
+    _worker: Optional[asyncio.Task] = None
+    _executor: Optional[ThreadPoolExecutor] = None
+    _latencies: Optional[deque] = None
+    _n_requests: int = 0
+    _n_batches: int = 0
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._latencies = deque(maxlen=self.latency_window)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    async def submit(self, text: str) -> np.ndarray:
+        """Queues a comment and waits for its label scores."""
+        if self._queue is None:
+            raise RuntimeError("MicroBatcher is not running. Call `start` first.")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Pending(text, future, time.perf_counter()))
+        return await future
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def latency_percentile(self, q: float) -> float:
+        """Returns the q-th percentile of request latency in seconds."""
+        if not self._latencies:
+            return 0.0
+        return float(np.percentile(self._latencies, q))
+
+    def metrics(self) -> dict:
+        metrics = {
+            "queue_depth": self.queue_depth,
+            "requests": self._n_requests,
+            "batches": self._n_batches,
+            "mean_batch_size": self._n_requests / self._n_batches
+            if self._n_batches
+            else 0.0,
+            "latency_p50_ms": self.latency_percentile(50) * 1e3,
+            "latency_p99_ms": self.latency_percentile(99) * 1e3,
+        }
+        if isinstance(self.scorer, PredictionCache):
+            stats = self.scorer.stats()
+            metrics["cache"] = {**stats.model_dump(), "hit_rate": stats.hit_rate}
+        return metrics
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch(loop)
+            texts = [pending.text for pending in batch]
+            try:
+                scores = await loop.run_in_executor(self._executor, self.scorer, texts)
+            except Exception as e:
+                logger.exception("Scoring a batch of %d comments failed", len(batch))
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                continue
+
+            finished_at = time.perf_counter()
+            for pending, score in zip(batch, scores):
+                if not pending.future.done():
+                    pending.future.set_result(score)
+                self._latencies.append(finished_at - pending.enqueued_at)
+            self._n_requests += len(batch)
+            self._n_batches += 1
+
+    async def _collect_batch(self, loop: asyncio.AbstractEventLoop) -> list[_Pending]:
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1e3
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+
+class ScoringServer(BaseModel):
+    """Minimal HTTP/1.1 front end for a `MicroBatcher`.
+
+    Routes:
+        POST /score    {"text": "..."} or {"texts": ["...", ...]}
+        GET  /metrics  queue depth, batch sizes, p50/p99 latency and cache stats
+        GET  /health
+    """
+
+    batcher: MicroBatcher
+    host: str = "127.0.0.1"
+    port: int = Field(default=8000, ge=0, le=65535)
+    labels: list[str] = Field(default=Config.LABELS)
+
+    async def serve_forever(self) -> None:
+        await self.batcher.start()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info("Serving toxicity scores on http://%s:%d", self.host, self.port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            method, path, body = await _read_request(reader)
+            status, payload = await self._route(method, path, body)
+        except (ValueError, KeyError, TypeError) as e:
+            status, payload = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            logger.exception("Failed to handle request")
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+
+        content = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            "Connection: close\r\n\r\n".encode()
+            + content
+        )
+        await writer.drain()
+        writer.close()
+
+    async def _route(
+        self, method: str, path: str, body: bytes
+    ) -> tuple[HTTPStatus, dict]:
+        if method == "GET" and path == "/health":
+            return HTTPStatus.OK, {"status": "ok"}
+        if method == "GET" and path == "/metrics":
+            return HTTPStatus.OK, self.batcher.metrics()
+        if method == "POST" and path == "/score":
+            request = json.loads(body)
+            if "texts" in request:
+                scores = await asyncio.gather(
+                    *(self.batcher.submit(str(text)) for text in request["texts"])
+                )
+                return HTTPStatus.OK, {"scores": [self._label(s) for s in scores]}
+            score = await self.batcher.submit(str(request["text"]))
+            return HTTPStatus.OK, {"scores": self._label(score)}
+        return HTTPStatus.NOT_FOUND, {"error": f"No route for {method} {path}"}
+
+    def _label(self, score: np.ndarray) -> dict[str, float]:
+        return {label: float(p) for label, p in zip(self.labels, score)}
+
+
+async def _read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    request_line = (await reader.readline()).decode()
+    method, path, _ = request_line.split(" ", 2)
+
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, value = line.decode().split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, path, body
+
+
+def load_scorer(model_dir: Path, batch_size: int = 64) -> Scorer:
+    """Loads a scorer from a `TextClassifier.save` dir, a SavedModel or a TFLite file.
+
+    SavedModels (e.g. an exported BERT classifier) must take a batch of raw
+    strings and return one sigmoid score per label, as those written by
+    `Export.export_saved_model` do through their `serve` endpoint.
+    """
+    if model_dir.suffix == ".tflite":
+        logger.debug("Serving TFLite model from %s", model_dir)
+        return Export.TFLiteScorer(model_dir)
+    if (model_dir / "config.json").exists():
+        classifier = TextClassifier.load(model_dir)
+        logger.debug("Serving TextClassifier from %s", model_dir)
+        return lambda texts: classifier.predict_proba(texts, batch_size=batch_size)
+
+    # Registers the ops used by the BERT preprocessing model
+    import tensorflow_text  # noqa: F401
+
+    model = tf.saved_model.load(str(model_dir))
+    logger.debug("Serving SavedModel from %s", model_dir)
+    if hasattr(model, "serve"):
+        return lambda texts: model.serve(tf.constant(texts)).numpy()
+    return lambda texts: model(tf.constant(texts)).numpy()
@@ -0,0 +1,142 @@
+"""Sharded TFRecord storage for the dataset splits."""
+
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from pydantic import BaseModel, NonNegativeInt
+
+from . import Logging
+from .Types import Dataset
+
+logger = Logging.setup_logger(__name__)
+
+
+class StorageFormat(Enum):
+    SNAPSHOT = "snapshot"
+    TFRECORD = "tfrecord"
+
+
+class Compression(Enum):
+    NONE = "NONE"
+    ZLIB = "ZLIB"
+    GZIP = "GZIP"
+
+    @property
+    def tfrecord_type(self) -> str:
+        return "" if self is Compression.NONE else self.value
+
+    @property
+    def snapshot_type(self) -> str | None:
+        return None if self is Compression.NONE else self.value
+
+
+class ShardInfo(BaseModel):
+    """A written shard, with its path relative to the dataset hash directory."""
+
+    path: str
+    examples: NonNegativeInt
+    bytes: NonNegativeInt
+
+
+def write_tfrecord_shards(
+    ds: Dataset,
+    hash_dir: Path,
+    split_name: str,
+    num_shards: int,
+    compression: Compression,
+) -> list[ShardInfo]:
+    """Writes the unbatched examples of `ds` round-robin over `num_shards` files.
+
+    Round-robin placement means a deterministic interleave with
+    `cycle_length=num_shards` reads the examples back in their original order.
+    """
+    split_dir = hash_dir / split_name
+    split_dir.mkdir(parents=True, exist_ok=True)
+    options = tf.io.TFRecordOptions(compression_type=compression.tfrecord_type)
+
+    shard_paths = [
+        split_dir / f"shard-{index:05d}-of-{num_shards:05d}.tfrecord"
+        for index in range(num_shards)
+    ]
+    writers = [tf.io.TFRecordWriter(str(path), options) for path in shard_paths]
+    counts = [0] * num_shards
+    try:
+        for i, (features, labels) in enumerate(ds.unbatch().as_numpy_iterator()):
+            writers[i % num_shards].write(_serialize_example(features, labels))
+            counts[i % num_shards] += 1
+    finally:
+        for writer in writers:
+            writer.close()
+
+    shards = [
+        ShardInfo(
+            path=str(path.relative_to(hash_dir)),
+            examples=count,
+            bytes=path.stat().st_size,
+        )
+        for path, count in zip(shard_paths, counts)
+    ]
+    logger.debug(
+        "Wrote %d examples to %d shards in %s", sum(counts), num_shards, split_dir
+    )
+    return shards
+
+
+def read_tfrecord_shards(
+    hash_dir: Path,
+    shards: list[ShardInfo],
+    n_features: int,
+    n_labels: int,
+    batch_size: int,
+    compression: Compression,
+    deterministic: bool = True,
+    drop_remainder: bool = True,
+) -> Dataset:
+    """Reads shards in parallel and parses whole batches at once."""
+    files = [str(hash_dir / shard.path) for shard in shards]
+    feature_spec = {
+        "features": tf.io.FixedLenFeature([n_features], tf.string),
+        "labels": tf.io.FixedLenFeature([n_labels], tf.int64),
+    }
+
+    def parse_batch(serialized: tf.Tensor) -> tuple[tf.Tensor, tf.Tensor]:
+        parsed = tf.io.parse_example(serialized, feature_spec)
+        return parsed["features"], parsed["labels"]
+
+    ds = tf.data.Dataset.from_tensor_slices(files).interleave(
+        lambda path: tf.data.TFRecordDataset(
+            path, compression_type=compression.tfrecord_type
+        ),
+        cycle_length=len(files),
+        block_length=1,
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=deterministic,
+    )
+    ds = ds.batch(batch_size, drop_remainder=drop_remainder).map(
+        parse_batch, num_parallel_calls=tf.data.AUTOTUNE, deterministic=deterministic
+    )
+
+    n_examples = sum(shard.examples for shard in shards)
+    if drop_remainder:
+        n_batches = n_examples // batch_size
+    else:
+        n_batches = -(-n_examples // batch_size)
+    return ds.apply(tf.data.experimental.assert_cardinality(n_batches))
+
+
+def _serialize_example(features: np.ndarray, labels: np.ndarray) -> bytes:
+    example = tf.train.Example(
+        features=tf.train.Features(
+            feature={
+                "features": tf.train.Feature(
+                    bytes_list=tf.train.BytesList(value=list(features))
+                ),
+                "labels": tf.train.Feature(
+                    int64_list=tf.train.Int64List(value=list(labels))
+                ),
+            }
+        )
+    )
+    return example.SerializeToString()
@@ -0,0 +1,269 @@
+"""Parallel hyperparameter sweeps of `TextClassifier` over one shared dataset."""
+
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Literal, Optional
+
+import keras
+import numpy as np
+from pydantic import BaseModel, NonNegativeInt, PositiveInt
+
+from . import Config, Logging, MakeDatasets, Modeling, Tokenization
+from .MakeDatasets import Split
+
+logger = Logging.setup_logger(__name__)
+
+
+class SweepSpace(BaseModel):
+    """Candidate values of each `TextClassifier` hyperparameter."""
+
+    max_tokens: list[PositiveInt] = [20_000]
+    sequence_length: list[PositiveInt] = [200]
+    embedding_dim: list[PositiveInt] = [128]
+    conv_filters: list[PositiveInt] = [128]
+    conv_k_size: list[PositiveInt] = [7]
+    hidden_neurons: list[PositiveInt] = [128]
+    dropout_rate: list[float] = [0.1]
+
+    def trials(self, n_trials: Optional[int], seed: int) -> list[dict[str, Any]]:
+        """The full grid, or `n_trials` combinations drawn from it at random."""
+        names = list(type(self).model_fields)
+        grid = [
+            dict(zip(names, values))
+            for values in itertools.product(*(getattr(self, name) for name in names))
+        ]
+        if n_trials is None or n_trials >= len(grid):
+            return grid
+        rng = np.random.default_rng(seed)
+        return [grid[i] for i in sorted(rng.choice(len(grid), n_trials, replace=False))]
+
+
+class TrialResult(BaseModel):
+    trial: NonNegativeInt
+    params: dict[str, Any]
+    status: Literal["completed", "pruned", "failed"]
+    val_losses: list[float] = []
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def best_val_loss(self) -> Optional[float]:
+        return min(self.val_losses) if self.val_losses else None
+
+
+class MedianPruner(keras.callbacks.Callback):
+    """Stops a trial whose `val_loss` is worse than the median of other trials.
+
+    Each trial appends its epoch losses to its own JSON lines file in
+    `trials_dir`, so trials running in other processes see them. A trial
+    runs at least `min_epochs` epochs, and an epoch is only compared once
+    `min_trials` other trials have reported it.
+    """
+
+    def __init__(
+        self, trials_dir: Path, trial: int, min_epochs: int = 1, min_trials: int = 3
+    ) -> None:
+        super().__init__()
+        self.trials_dir = trials_dir
+        self.trial = trial
+        self.min_epochs = min_epochs
+        self.min_trials = min_trials
+        self.val_losses: list[float] = []
+        self.pruned = False
+
+    def on_epoch_end(self, epoch, logs=None) -> None:
+        val_loss = float(logs["val_loss"])
+        self.val_losses.append(val_loss)
+        with open(self.trials_dir / f"trial-{self.trial}.jsonl", "a") as f:
+            f.write(json.dumps({"epoch": epoch, "val_loss": val_loss}) + "\n")
+
+        if epoch + 1 < self.min_epochs:
+            return
+        others = _reported_losses(self.trials_dir, epoch, exclude=self.trial)
+        if len(others) >= self.min_trials and val_loss > np.median(others):
+            logger.info(
+                "Pruning trial %d at epoch %d: val_loss %.4f above the median "
+                "%.4f of %d trials",
+                self.trial,
+                epoch + 1,
+                val_loss,
+                np.median(others),
+                len(others),
+            )
+            self.pruned = True
+            self.model.stop_training = True
+
+
+class Sweep(BaseModel):
+    """Runs `TextClassifier` trials on a process pool over one materialized dataset.
+
+    The dataset splits, vocabularies and token ids every trial needs are made
+    once, before any trial starts; trials only read them from the `Datasets`
+    hash directory. Each worker process gets `threads_per_trial` TensorFlow
+    threads, by default an even share of the CPUs. Losing trials are pruned
+    with a `MedianPruner`. Results are written to `results.json` in
+    `reports/sweeps/<name>`.
+    """
+
+    name: str
+    space: SweepSpace
+    data_params: dict[str, Any]
+    epochs: PositiveInt = 3
+    n_trials: Optional[PositiveInt] = None
+    num_workers: PositiveInt = 1
+    threads_per_trial: Optional[PositiveInt] = None
+    min_epochs: PositiveInt = 1
+    min_trials: PositiveInt = 3
+    seed: int = Config.SEED
+
+    @property
+    def sweep_dir(self) -> Path:
+        return Config.REPORTS_DIR / "sweeps" / self.name
+
+    def run(self) -> list[TrialResult]:
+        trials = self.space.trials(self.n_trials, self.seed)
+        save_path = self._prepare_data(trials)
+        trials_dir = self.sweep_dir / "trials"
+        shutil.rmtree(trials_dir, ignore_errors=True)
+        trials_dir.mkdir(parents=True)
+
+        # Trials read the data prepared above and never rebuild it
+        data_params = {**self.data_params, "force_make": False}
+        trial_args = [
+            (trial, params, data_params, save_path, trials_dir, self.epochs)
+            + (self.min_epochs, self.min_trials)
+            for trial, params in enumerate(trials)
+        ]
+        logger.info(
+            "Running %d trials on %d workers with %d threads each",
+            len(trials),
+            self.num_workers,
+            self._threads_per_trial,
+        )
+        if self.num_workers == 1:
+            results = [run_trial(*args) for args in trial_args]
+        else:
+            results = self._run_pool(trial_args)
+
+        results.sort(key=lambda result: result.trial)
+        runs = ",\n".join(result.model_dump_json() for result in results)
+        (self.sweep_dir / "results.json").write_text(f"[\n{runs}\n]\n")
+        return results
+
+    @property
+    def _threads_per_trial(self) -> int:
+        if self.threads_per_trial is not None:
+            return self.threads_per_trial
+        return max(1, (os.cpu_count() or 1) // self.num_workers)
+
+    def _prepare_data(self, trials: list[dict[str, Any]]) -> Path:
+        """Materializes the splits, vocabularies and token ids of all trials."""
+        datasets = MakeDatasets.Datasets(**self.data_params)
+        tokenizers = {
+            Tokenization.config_hash(tokenizer): tokenizer
+            for tokenizer in (
+                Modeling.TextClassifier(**params).tokenizer for params in trials
+            )
+        }
+        for tokenizer in tokenizers.values():
+            datasets.vocabulary(tokenizer)
+            datasets.tokenized(tokenizer, [Split.TRAIN, Split.VAL])
+        logger.debug("Prepared %d tokenizations in %s", len(tokenizers), datasets.hash)
+        return datasets.save_path
+
+    def _run_pool(self, trial_args: list[tuple]) -> list[TrialResult]:
+        # TensorFlow cannot be forked once initialized, so workers are spawned
+        with ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self._threads_per_trial,),
+        ) as executor:
+            futures = [executor.submit(run_trial, *args) for args in trial_args]
+            return [future.result() for future in as_completed(futures)]
+
+
+def run_trial(
+    trial: int,
+    params: dict[str, Any],
+    data_params: dict[str, Any],
+    save_path: Path,
+    trials_dir: Path,
+    epochs: int,
+    min_epochs: int,
+    min_trials: int,
+) -> TrialResult:
+    """Trains one configuration on the prepared token ids of the dataset."""
+    start_time = time.perf_counter()
+    pruner = MedianPruner(trials_dir, trial, min_epochs, min_trials)
+    try:
+        datasets = MakeDatasets.Datasets(**data_params)
+        datasets.save_path = save_path
+        classifier = Modeling.TextClassifier(**params)
+        vocabulary = datasets.vocabulary(classifier.tokenizer)
+        splits = datasets.tokenized(classifier.tokenizer, [Split.TRAIN, Split.VAL])
+        classifier.train(
+            splits[Split.TRAIN],
+            epochs=epochs,
+            metrics=[],
+            val_dataset=splits[Split.VAL],
+            callbacks=[pruner],
+            verbose=0,
+            vocabulary=vocabulary,
+        )
+    except Exception as error:
+        logger.exception("Trial %d failed with %s", trial, params)
+        return TrialResult(
+            trial=trial,
+            params=params,
+            status="failed",
+            val_losses=pruner.val_losses,
+            seconds=time.perf_counter() - start_time,
+            error=repr(error),
+        )
+
+    result = TrialResult(
+        trial=trial,
+        params=params,
+        status="pruned" if pruner.pruned else "completed",
+        val_losses=pruner.val_losses,
+        seconds=time.perf_counter() - start_time,
+    )
+    logger.info(
+        "Trial %d %s after %.0fs, best val_loss %.4f",
+        trial,
+        result.status,
+        result.seconds,
+        result.best_val_loss,
+    )
+    return result
+
+
+def _init_worker(threads: int) -> None:
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+
+def _reported_losses(trials_dir: Path, epoch: int, exclude: int) -> list[float]:
+    """Val losses other trials have reported for an epoch."""
+    losses = []
+    for path in trials_dir.glob("trial-*.jsonl"):
+        if path.name == f"trial-{exclude}.jsonl":
+            continue
+        for line in path.read_text().splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line another process is still writing
+                continue
+            if record["epoch"] == epoch:
+                losses.append(record["val_loss"])
+    return losses
@@ -0,0 +1,93 @@
+"""Tokenizer configurations used to pre-tokenize the dataset splits."""
+
+import hashlib
+from typing import Annotated, Callable, Literal, Optional, Union
+
+import keras
+import tensorflow as tf
+from pydantic import BaseModel, Field, PositiveInt
+
+from .Types import Vectorizer
+
+TokenizeFn = Callable[[tf.Tensor], Union[tf.Tensor, dict[str, tf.Tensor]]]
+
+
+class VectorizerConfig(BaseModel):
+    """Settings of the `TextVectorization` layer used by `TextClassifier`.
+
+    With `adapt_sample_size`, the vocabulary is adapted on only that many
+    train examples, for a quicker approximate vocabulary.
+    """
+
+    kind: Literal["vectorizer"] = "vectorizer"
+    max_tokens: PositiveInt
+    sequence_length: PositiveInt
+    standardize: str = "lower_and_strip_punctuation"
+    split: str = "whitespace"
+    adapt_sample_size: Optional[PositiveInt] = None
+
+    @property
+    def padded_length(self) -> int:
+        return self.sequence_length
+
+    @property
+    def vocabulary_hash(self) -> str:
+        """Hash of the settings that determine the learned vocabulary."""
+        settings = self.model_dump_json(
+            include={"max_tokens", "standardize", "split", "adapt_sample_size"}
+        )
+        return hashlib.sha256(settings.encode()).hexdigest()[:10]
+
+    def make_layer(self, vocabulary: Optional[str | list[str]] = None) -> Vectorizer:
+        return keras.layers.TextVectorization(
+            max_tokens=self.max_tokens,
+            standardize=self.standardize,
+            split=self.split,
+            output_mode="int",
+            output_sequence_length=self.sequence_length,
+            vocabulary=vocabulary,
+        )
+
+
+class BertConfig(BaseModel):
+    """A TF Hub BERT preprocessor, producing word ids, input mask and type ids."""
+
+    kind: Literal["bert"] = "bert"
+    preprocess_handle: str
+    seq_length: PositiveInt = 128
+
+    @property
+    def padded_length(self) -> int:
+        return self.seq_length
+
+    def make_tokenize_fn(self) -> TokenizeFn:
+        # Imported lazily: only the BERT path needs TF Hub and the TF Text ops
+        import tensorflow_hub as hub
+        import tensorflow_text  # noqa: F401
+
+        preprocessor = hub.load(self.preprocess_handle)
+        seq_length = tf.constant(self.seq_length)
+
+        def tokenize(text: tf.Tensor) -> dict[str, tf.Tensor]:
+            tokens = preprocessor.tokenize(text[:, 0])
+            return preprocessor.bert_pack_inputs([tokens], seq_length=seq_length)
+
+        return tokenize
+
+
+TokenizerConfig = Annotated[
+    Union[VectorizerConfig, BertConfig], Field(discriminator="kind")
+]
+
+
+def config_hash(tokenizer: TokenizerConfig) -> str:
+    """Generates a unique hash for a tokenizer configuration."""
+    return hashlib.sha256(tokenizer.model_dump_json().encode()).hexdigest()[:10]
+
+
+def is_tokenized(dataset: tf.data.Dataset) -> bool:
+    """Whether a (features, labels) dataset carries token ids rather than text."""
+    features_spec = dataset.element_spec[0]
+    return not (
+        isinstance(features_spec, tf.TensorSpec) and features_spec.dtype == tf.string
+    )
@@ -0,0 +1,57 @@
+import argparse
+
+from src import Sweep
+
+DATA_PARAMS = {
+    "val_size": 0.2,
+    "batch_size": 128,
+    "shuffle": True,
+    "force_make": False,
+}
+
+SWEEP_SPACE = {
+    "max_tokens": [10_000, 20_000],
+    "sequence_length": [200],
+    "embedding_dim": [64, 128],
+    "conv_filters": [64, 128],
+    "conv_k_size": [5, 7],
+    "hidden_neurons": [64, 128],
+    "dropout_rate": [0.1, 0.3],
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sweep TextClassifier settings.")
+    parser.add_argument("name")
+    parser.add_argument("--trials", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads-per-trial", type=int, default=None)
+    args = parser.parse_args()
+
+    sweep = Sweep.Sweep(
+        name=args.name,
+        space=Sweep.SweepSpace(**SWEEP_SPACE),
+        data_params=DATA_PARAMS,
+        epochs=args.epochs,
+        n_trials=args.trials,
+        num_workers=args.workers,
+        threads_per_trial=args.threads_per_trial,
+    )
+    results = sweep.run()
+
+    ranked = sorted(
+        (result for result in results if result.best_val_loss is not None),
+        key=lambda result: result.best_val_loss,
+    )
+    print(f"{'trial':>5} {'status':>9} {'val_loss':>9} {'seconds':>8}  params")
+    for result in ranked:
+        print(
+            f"{result.trial:>5} {result.status:>9} {result.best_val_loss:>9.4f} "
+            f"{result.seconds:>8.0f}  {result.params}"
+        )
+    print(f"Results written to {sweep.sweep_dir / 'results.json'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import Config, DownloadData, MakeDatasets
+
+WORDS: list[str] = ["you", "are", "a", "nice", "idiot", "hello", "stupid", "thanks"]
+
+
+def write_raw_data(path, n_train: int = 200, n_test: int = 100, seed: int = 0):
+    """Write small train/test/test_labels CSVs shaped like the Jigsaw files."""
+    rng = np.random.default_rng(seed)
+
+    def comments(n: int) -> list[str]:
+        return [" ".join(rng.choice(WORDS, size=rng.integers(1, 40))) for _ in range(n)]
+
+    path.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(
+        {
+            "id": [f"train{i}" for i in range(n_train)],
+            "comment_text": comments(n_train),
+            **{
+                label: (rng.random(n_train) < 0.2).astype(int)
+                for label in Config.LABELS
+            },
+        }
+    ).to_csv(path / "train.csv", index=False)
+
+    test_labels = (rng.random((n_test, len(Config.LABELS))) < 0.2).astype(int)
+    test_labels[: n_test // 5] = -1
+    pd.DataFrame(
+        {"id": [f"test{i}" for i in range(n_test)], "comment_text": comments(n_test)}
+    ).to_csv(path / "test.csv", index=False)
+    pd.DataFrame(
+        {
+            "id": [f"test{i}" for i in range(n_test)],
+            **{label: test_labels[:, i] for i, label in enumerate(Config.LABELS)},
+        }
+    ).to_csv(path / "test_labels.csv", index=False)
+
+
+@pytest.fixture
+def raw_data_dir(tmp_path, monkeypatch, mocker):
+    """Point the data pipeline at small raw CSVs and temporary cache dirs."""
+    download_path = tmp_path / "download"
+    write_raw_data(download_path)
+    monkeypatch.setattr(Config, "KAGGLE_DIR", tmp_path / "kaggle")
+    monkeypatch.setattr(Config, "ARROW_DIR", tmp_path / "arrow")
+    monkeypatch.setattr(MakeDatasets.Datasets, "_save_path", tmp_path / "tensorflow")
+    mocker.patch.object(
+        DownloadData.kagglehub, "dataset_download", return_value=str(download_path)
+    )
+    return download_path
@@ -0,0 +1,24 @@
+import pandas as pd
+
+from src import ArrowCache, Config, DownloadData
+
+
+def test_read_raw_columns_caches_once_per_checksum(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "ARROW_DIR", tmp_path / "arrow")
+    df = pd.DataFrame({"id": ["a", "b"], "comment_text": ["hi", None], "toxic": [0, 1]})
+    df.to_csv(tmp_path / "train.csv", index=False)
+
+    columns = ArrowCache.read_raw_columns(
+        DownloadData.Files.TRAIN, tmp_path, "0" * 64, ["id", "toxic"]
+    )
+
+    pd.testing.assert_frame_equal(columns, df[["id", "toxic"]])
+    assert [p.name for p in (tmp_path / "arrow").iterdir()] == [
+        "train-0000000000000000.arrow"
+    ]
+
+    ArrowCache.read_raw_columns(DownloadData.Files.TRAIN, tmp_path, "1" * 64, ["id"])
+
+    assert [p.name for p in (tmp_path / "arrow").iterdir()] == [
+        "train-1111111111111111.arrow"
+    ]
@@ -0,0 +1,85 @@
+import numpy as np
+
+from src import Caching
+
+
+class CountingScorer:
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        self.calls.append(list(texts))
+        return np.array([[len(text)] * 6 for text in texts], dtype=np.float32)
+
+
+def test_prediction_cache_serves_repeats_and_evicts_lru():
+    scorer = CountingScorer()
+    cache = Caching.PredictionCache(scorer=scorer, model_version="v1", max_entries=2)
+
+    scores = cache(["spam", "spam  ", "hello", "spam"])
+    assert scorer.calls == [["spam", "hello"]]
+    np.testing.assert_array_equal(scores[:, 0], [4, 4, 5, 4])
+
+    cache(["hello", "\uff42ye"])
+    # The model scores the normalized text the entry is keyed by
+    assert scorer.calls[-1] == ["bye"]
+    # "spam" was the least recently used, so it was evicted for "bye"
+    cache(["spam"])
+    assert scorer.calls[-1] == ["spam"]
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions) == (3, 4, 2)
+    assert stats.entries == 2
+    assert stats.hit_rate == 3 / 7
+    assert stats.memory_bytes > 0
+
+
+def test_prediction_cache_limits_bytes_and_ttl(mocker):
+    now = mocker.patch("src.Caching.time.monotonic", return_value=0.0)
+    scorer = CountingScorer()
+    cache = Caching.PredictionCache(scorer=scorer, model_version="v1", ttl_seconds=10)
+    cache(["a", "b", "c"])
+    entry_bytes = cache.stats().memory_bytes // 3
+
+    now.return_value = 11.0
+    cache(["a"])
+    assert scorer.calls[-1] == ["a"]
+    assert cache.stats().expirations == 1
+
+    small = Caching.PredictionCache(
+        scorer=scorer, model_version="v1", max_bytes=2 * entry_bytes
+    )
+    small(["a", "b", "c"])
+    assert small.stats().entries == 2
+    assert small.stats().memory_bytes <= 2 * entry_bytes
+
+
+def test_prediction_cache_disk_tier_and_model_version(tmp_path):
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    (model_dir / "weights.h5").write_bytes(b"old")
+    version = Caching.model_version(model_dir)
+    disk_path = tmp_path / "cache" / "scores.sqlite"
+
+    scorer = CountingScorer()
+    first = Caching.PredictionCache(
+        scorer=scorer, model_version=version, disk_path=disk_path
+    )
+    first(["spam"])
+    first.close()
+
+    restarted = Caching.PredictionCache(
+        scorer=scorer, model_version=version, disk_path=disk_path
+    )
+    np.testing.assert_array_equal(restarted(["spam"])[0], [4] * 6)
+    assert len(scorer.calls) == 1
+    assert restarted.stats().disk_hits == 1
+
+    (model_dir / "weights.h5").write_bytes(b"new weights")
+    retrained = Caching.PredictionCache(
+        scorer=scorer,
+        model_version=Caching.model_version(model_dir),
+        disk_path=disk_path,
+    )
+    retrained(["spam"])
+    assert len(scorer.calls) == 2
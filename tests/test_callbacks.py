@@ -0,0 +1,93 @@
+import json
+import time
+
+import keras
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from src import Callbacks, Logging
+
+
+def make_model() -> keras.Model:
+    model = keras.Sequential([keras.Input((4,)), keras.layers.Dense(1)])
+    model.compile(optimizer="sgd", loss="mse")
+    return model
+
+
+def slow_dataset(delay: float) -> tf.data.Dataset:
+    def sleep(x):
+        time.sleep(delay)
+        return x
+
+    x = np.ones((64, 4), dtype=np.float32)
+    ds = tf.data.Dataset.from_tensor_slices((x, x[:, :1])).batch(8)
+    return ds.map(
+        lambda x, y: (
+            tf.ensure_shape(tf.py_function(sleep, [x], tf.float32), [None, 4]),
+            y,
+        )
+    )
+
+
+def test_input_pipeline_monitor_flags_slow_input():
+    monitor = Callbacks.InputPipelineMonitor(input_bound_fraction=0.5)
+    history = make_model().fit(
+        monitor.instrument(slow_dataset(0.05)),
+        epochs=1,
+        callbacks=[monitor],
+        verbose=0,
+    )
+
+    assert monitor.input_wait_fraction > 0.5
+    assert history.history["input_wait_fraction"] == [monitor.input_wait_fraction]
+
+
+def test_input_pipeline_monitor_profiles_step_window(tmp_path):
+    monitor = Callbacks.InputPipelineMonitor(profile_steps=(2, 4), profile_dir=tmp_path)
+    make_model().fit(slow_dataset(0.0), epochs=1, callbacks=[monitor], verbose=0)
+
+    assert list((tmp_path / "plugins" / "profile").iterdir())
+    assert monitor.input_wait_fraction == 0.0
+
+
+def test_throughput_monitor_counts_examples_and_tokens(tmp_path):
+    token_ids = np.array([[3, 4, 0, 0], [5, 0, 0, 0], [6, 7, 8, 0]] * 4)
+    ds = tf.data.Dataset.from_tensor_slices((token_ids, np.ones((12, 1)))).batch(5)
+    model = keras.Sequential(
+        [
+            keras.Input((4,), dtype="int64"),
+            keras.layers.Embedding(10, 2),
+            keras.layers.GlobalMaxPooling1D(),
+            keras.layers.Dense(1),
+        ]
+    )
+    model.compile(optimizer="sgd", loss="mse")
+    monitor = Callbacks.ThroughputMonitor(
+        run_name="test", metrics_path=tmp_path / "throughput.jsonl"
+    )
+
+    history = model.fit(
+        monitor.instrument(ds), epochs=2, callbacks=[monitor], verbose=0
+    )
+
+    records = [
+        json.loads(line)
+        for line in (tmp_path / "throughput.jsonl").read_text().splitlines()
+    ]
+    assert [record["epoch"] for record in records] == [1, 2]
+    assert records[1]["mean_batch_size"] == 4
+    assert records[1]["tokens_per_sec"] == pytest.approx(
+        records[1]["examples_per_sec"] * 2
+    )
+    assert history.history["step_ms_p99"][1] == records[1]["step_ms_p99"]
+
+
+def test_cheap_profile_skips_histograms(tmp_path):
+    callbacks = Logging.setup_callbacks("test", model_dir=tmp_path)
+    tensorboard = next(
+        cb for cb in callbacks if isinstance(cb, keras.callbacks.TensorBoard)
+    )
+
+    assert tensorboard.histogram_freq == 0
+    assert any(isinstance(cb, Callbacks.ThroughputMonitor) for cb in callbacks)
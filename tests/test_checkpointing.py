@@ -0,0 +1,105 @@
+import keras
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from src import Checkpointing, Logging, Modeling
+
+MODEL_PARAMS = {
+    "max_tokens": 50,
+    "sequence_length": 16,
+    "embedding_dim": 8,
+    "conv_filters": 4,
+    "conv_k_size": 3,
+    "hidden_neurons": 8,
+    "dropout_rate": 0.1,
+}
+VOCABULARY = ["", "[UNK]"] + [f"w{i}" for i in range(48)]
+
+
+class Preempted(Exception):
+    pass
+
+
+class Preempt(keras.callbacks.Callback):
+    """Stops training with an error after `n_steps` train steps."""
+
+    def __init__(self, n_steps: int) -> None:
+        super().__init__()
+        self.n_steps = n_steps
+        self._steps = 0
+
+    def on_train_batch_end(self, batch, logs=None) -> None:
+        self._steps += 1
+        if self._steps == self.n_steps:
+            raise Preempted()
+
+
+def train(callbacks=None, epochs=3, **model_params) -> Modeling.TextClassifier:
+    rng = np.random.default_rng(0)
+    token_ids = rng.integers(0, 50, size=(80, 16))
+    labels = rng.integers(0, 2, size=(80, 6))
+    train_ds = tf.data.Dataset.from_tensor_slices((token_ids, labels)).batch(8)
+
+    keras.utils.set_random_seed(0)
+    classifier = Modeling.TextClassifier(**{**MODEL_PARAMS, **model_params})
+    classifier.train(
+        train_ds,
+        epochs=epochs,
+        metrics=[],
+        callbacks=callbacks,
+        verbose=0,
+        vocabulary=VOCABULARY,
+    )
+    return classifier
+
+
+def test_preempted_training_resumes_where_it_stopped(tmp_path):
+    expected = train().model.get_weights()
+    config = Checkpointing.CheckpointConfig(every_steps=4, keep=2)
+
+    preempted = Checkpointing.TrainingCheckpoint(tmp_path, config)
+    with pytest.raises(Preempted):
+        train([Preempt(17), preempted])
+    run_dir = str(preempted.run_dir)
+    assert len(tf.train.get_checkpoint_state(run_dir).all_model_checkpoint_paths) == 2
+
+    checkpoint = Checkpointing.TrainingCheckpoint(tmp_path, config)
+    resumed = train([checkpoint])
+
+    # Preempted at step 7 of the second epoch, resumed from its step 4
+    assert str(checkpoint.run_dir) == run_dir
+    assert resumed.history.epoch == [1, 2]
+    for weights, expected_weights in zip(resumed.model.get_weights(), expected):
+        np.testing.assert_allclose(weights, expected_weights, rtol=1e-5, atol=1e-6)
+
+    # A finished run leaves no checkpoint, so a rerun trains from scratch
+    assert not checkpoint.run_dir.exists()
+    assert train([checkpoint]).history.epoch == [0, 1, 2]
+
+
+def test_changed_runs_do_not_resume(tmp_path):
+    config = Checkpointing.CheckpointConfig(every_steps=4)
+    with pytest.raises(Preempted):
+        train([Preempt(5), Checkpointing.TrainingCheckpoint(tmp_path, config)])
+
+    for run_params, model_params in [
+        ({}, {"embedding_dim": 16}),
+        ({"data": "other"}, {}),
+    ]:
+        checkpoint = Checkpointing.TrainingCheckpoint(tmp_path, config, run_params)
+        assert train([checkpoint], **model_params).history.epoch == [0, 1, 2]
+
+
+def test_timestamped_runs_share_checkpoints(tmp_path):
+    config = Checkpointing.CheckpointConfig()
+
+    callbacks = Logging.setup_callbacks(
+        "model", model_dir=tmp_path, checkpoint=config, run_params={"data": "abc"}
+    )
+
+    (checkpoint,) = [
+        cb for cb in callbacks if isinstance(cb, Checkpointing.TrainingCheckpoint)
+    ]
+    assert checkpoint.directory == tmp_path / "model" / "checkpoints"
+    assert checkpoint.run_params == {"data": "abc"}
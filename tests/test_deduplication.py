@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from src import Deduplication
+
+SPAM = "you are such a complete idiot and nobody likes your edits on this page"
+THANKS = "hello, thanks for the help with the article about the river"
+
+
+def test_deduplicate_within_and_across_frames():
+    test = pd.DataFrame({"text": [THANKS + ".", "unrelated"], "toxic": [0, 0]})
+    train = pd.DataFrame(
+        {
+            "text": [SPAM, SPAM.upper() + "  ", SPAM + " !!", THANKS, "about cats"],
+            "toxic": [0, 1, 0, 0, 1],
+        }
+    )
+
+    for mode, spam_label in [
+        (Deduplication.DedupMode.DROP, 0),
+        (Deduplication.DedupMode.MERGE, 1),
+    ]:
+        config = Deduplication.DedupConfig(mode=mode)
+        (test_out, train_out), signatures = Deduplication.deduplicate(
+            [test, train], config, "text", ["toxic"], num_workers=1
+        )
+
+        assert test_out.equals(test)
+        assert train_out["text"].tolist() == [SPAM, "about cats"]
+        assert train_out["toxic"].tolist() == [spam_label, 1]
+        assert signatures.shape == (4, config.num_perm)
+
+    # Near-duplicates of already kept rows are dropped
+    (appended,), all_signatures = Deduplication.deduplicate(
+        [pd.DataFrame({"text": [SPAM + "!", "new"], "toxic": [1, 0]})],
+        config,
+        "text",
+        ["toxic"],
+        reference=signatures,
+        num_workers=1,
+    )
+    assert appended["text"].tolist() == ["new"]
+    assert len(all_signatures) == 5
+
+
+def test_groups_are_labelled_by_their_first_row():
+    # A chain linked back to front, which one pass of labels does not cross
+    pairs = np.array([[5, 6], [4, 5], [3, 4], [1, 3], [0, 2]])
+
+    groups = Deduplication._connected_components(8, pairs)
+
+    np.testing.assert_array_equal(groups, [0, 1, 0, 1, 1, 1, 1, 7])
@@ -0,0 +1,72 @@
+import numpy as np
+import tensorflow as tf
+
+from src import Distillation, MakeDatasets, Modeling
+from src.MakeDatasets import Split
+
+DATA_PARAMS = {"val_size": 0.2, "batch_size": 16}
+
+
+class LengthTeacher:
+    """Scores comments by word count, so scores can be checked against texts."""
+
+    def __init__(self) -> None:
+        self.n_scored = 0
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        self.n_scored += len(texts)
+        lengths = np.array([len(text.split()) for text in texts], dtype=np.float32)
+        return np.repeat((lengths / 40)[:, None], 6, axis=1)
+
+
+def test_distillation_targets_blend_labels_and_softened_scores():
+    config = Distillation.DistillationConfig(alpha=0.5, temperature=2.0)
+    labels = tf.constant([[1, 0]])
+    scores = tf.constant([[0.9, 0.5]])
+
+    _, targets = config.blend(tf.constant([["text"]]), (labels, scores))
+
+    # The logit of 0.9 is log(9), so at temperature 2 the soft score is 3/4
+    np.testing.assert_allclose(targets, [[0.5 * 0.75 + 0.5, 0.25]], rtol=1e-5)
+
+
+def test_student_is_distilled_from_cached_teacher_scores(raw_data_dir):
+    teacher = LengthTeacher()
+    datasets = MakeDatasets.Datasets(**DATA_PARAMS)
+    train_ds = datasets.with_teacher_scores(Split.TRAIN, teacher, "length")
+    cached_ds = MakeDatasets.Datasets(**DATA_PARAMS).with_teacher_scores(
+        Split.TRAIN, teacher, "length"
+    )
+
+    assert teacher.n_scored == 160
+    for (features, (labels, scores)), (_, (_, cached)) in zip(train_ds, cached_ds):
+        texts = [text.decode() for text in features.numpy()[:, 0]]
+        np.testing.assert_allclose(scores, teacher(texts))
+        np.testing.assert_allclose(cached, scores)
+        assert len(labels) == len(scores)
+
+    student = Modeling.TextClassifier(
+        max_tokens=50,
+        sequence_length=64,
+        embedding_dim=8,
+        conv_filters=4,
+        conv_k_size=3,
+        hidden_neurons=8,
+        dropout_rate=0.1,
+    )
+    student.train(
+        train_ds,
+        epochs=1,
+        metrics=[],
+        val_dataset=datasets.val,
+        verbose=0,
+        distillation=Distillation.DistillationConfig(),
+    )
+    report = Distillation.distillation_report(
+        teacher, student.predict_proba, datasets.test, batch_size=16
+    )
+
+    assert report.n_examples == 80
+    assert set(report.teacher.label_auc) == set(report.student.label_auc)
+    assert report.auc_retained > 0
+    assert report.speedup > 0
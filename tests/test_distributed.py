@@ -0,0 +1,50 @@
+import numpy as np
+import tensorflow as tf
+
+from src import Distributed, Modeling
+from tests.test_sweep import DATA_PARAMS
+
+MODEL_PARAMS = {
+    "max_tokens": 50,
+    "sequence_length": 32,
+    "embedding_dim": 8,
+    "conv_filters": 4,
+    "conv_k_size": 3,
+    "hidden_neurons": 8,
+    "dropout_rate": 0.1,
+}
+
+
+def test_shards_have_equal_disjoint_batches():
+    ds = tf.data.Dataset.range(7)
+
+    shards = [
+        list(Distributed.shard_dataset(ds, 3, index).as_numpy_iterator())
+        for index in range(3)
+    ]
+
+    assert shards == [[0, 3], [1, 4], [2, 5]]
+
+
+def test_workers_train_one_model_and_only_the_chief_writes(raw_data_dir, tmp_path):
+    report = Distributed.train_distributed(
+        MODEL_PARAMS,
+        DATA_PARAMS,
+        epochs=2,
+        num_workers=2,
+        model_name="distributed",
+        model_dir=tmp_path / "models",
+        threads_per_worker=1,
+    )
+
+    (run_dir,) = (tmp_path / "models").iterdir()
+    assert (run_dir / "weights" / "best.weights.h5").exists()
+    assert list((run_dir / "logs").rglob("events.out.tfevents.*"))
+    assert report.global_batch_size == 2 * DATA_PARAMS["batch_size"]
+    assert len(report.history["val_loss"]) == 2
+    assert report.examples_per_sec > 0
+
+    classifier = Modeling.TextClassifier.load(run_dir / "classifier")
+    scores = classifier.predict_proba(["you are nice", "hello idiot"])
+    assert scores.shape == (2, 6)
+    assert np.all((scores >= 0) & (scores <= 1))
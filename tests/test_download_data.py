@@ -0,0 +1,105 @@
+import pandas as pd
+import pytest
+
+from src import Config, DownloadData
+
+
+def write_train_csv(path, rows: list[dict]) -> str:
+    file_path = str(path / "train.csv")
+    pd.DataFrame(rows, columns=["id", "comment_text", *Config.LABELS]).to_csv(
+        file_path, index=False
+    )
+    return file_path
+
+
+def make_row(id: str, text: str, label: int = 0) -> dict:
+    return {
+        "id": id,
+        "comment_text": text,
+        **{label_: label for label_ in Config.LABELS},
+    }
+
+
+def test_validate_file_accepts_valid_rows(tmp_path):
+    rows = [make_row("a", "hello"), make_row("b", "NA"), make_row("c", "", 1)]
+    file_path = write_train_csv(tmp_path, rows)
+
+    report = DownloadData._validate_file(DownloadData.Files.TRAIN, file_path, 2)
+
+    assert report.is_valid, report.summary()
+    assert report.n_rows == 3
+
+
+def test_validate_file_reports_errors_across_chunks(tmp_path):
+    rows = [
+        make_row("a", "hello"),
+        make_row("b", "world", 2),
+        make_row("c", "again", -1),
+        make_row("a", "duplicate"),
+    ]
+    file_path = write_train_csv(tmp_path, rows)
+
+    report = DownloadData._validate_file(DownloadData.Files.TRAIN, file_path, 2)
+
+    assert not report.is_valid
+    assert report.n_rows == 4
+    assert report.errors["toxic: above 1"] == 1
+    assert report.examples["toxic: below 0"] == [2]
+    assert report.examples["id: duplicated"] == [3]
+
+
+def test_validate_file_reports_missing_columns(tmp_path):
+    file_path = str(tmp_path / "test.csv")
+    pd.DataFrame({"id": ["a"]}).to_csv(file_path, index=False)
+
+    report = DownloadData._validate_file(DownloadData.Files.TEST, file_path)
+
+    assert list(report.errors) == ["missing columns ['comment_text']"]
+
+
+def write_raw_files(path) -> None:
+    write_train_csv(path, [make_row("a", "hello")])
+    pd.DataFrame({"id": ["b"], "comment_text": ["world"]}).to_csv(
+        path / "test.csv", index=False
+    )
+    pd.DataFrame({"id": ["b"], **{label: [-1] for label in Config.LABELS}}).to_csv(
+        path / "test_labels.csv", index=False
+    )
+
+
+def test_download_skips_validation_of_unchanged_files(tmp_path, monkeypatch, mocker):
+    download_path = tmp_path / "download"
+    download_path.mkdir()
+    write_raw_files(download_path)
+    monkeypatch.setattr(Config, "KAGGLE_DIR", tmp_path / "kaggle")
+    mocker.patch.object(
+        DownloadData.kagglehub, "dataset_download", return_value=str(download_path)
+    )
+    validate = mocker.spy(DownloadData, "_validate_file")
+
+    DownloadData.download_kaggle_dataset()
+    assert validate.call_count == 3
+
+    DownloadData.download_kaggle_dataset()
+    assert validate.call_count == 3
+
+    write_train_csv(download_path, [make_row("a", "changed")])
+    DownloadData.download_kaggle_dataset()
+    assert validate.call_count == 4
+
+
+def test_offline_download_uses_manifest(tmp_path, monkeypatch, mocker):
+    download_path = tmp_path / "download"
+    download_path.mkdir()
+    write_raw_files(download_path)
+    monkeypatch.setattr(Config, "KAGGLE_DIR", tmp_path / "kaggle")
+    download = mocker.patch.object(
+        DownloadData.kagglehub, "dataset_download", return_value=str(download_path)
+    )
+
+    with pytest.raises(FileNotFoundError):
+        DownloadData.download_kaggle_dataset(offline=True)
+
+    DownloadData.download_kaggle_dataset()
+    assert DownloadData.download_kaggle_dataset(offline=True) == str(download_path)
+    assert download.call_count == 1
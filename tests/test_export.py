@@ -0,0 +1,31 @@
+import numpy as np
+import tensorflow as tf
+
+from src import Config, Export, Serving
+from tests.test_modeling import TEXTS, make_trained_classifier
+
+
+def test_export_classifier_reports_quantized_accuracy(tmp_path):
+    classifier = make_trained_classifier()
+    labels = np.random.default_rng(1).integers(0, 2, size=(len(TEXTS), 6))
+    test_ds = tf.data.Dataset.from_tensor_slices(
+        (np.array(TEXTS).reshape(-1, 1), labels)
+    ).batch(2)
+
+    report = Export.export_classifier(classifier.model, tmp_path, test_ds, batch_size=2)
+
+    expected = classifier.model.predict(tf.constant(TEXTS)[:, None], verbose=0)
+    saved_model = Serving.load_scorer(tmp_path / Export.SAVED_MODEL_DIR)
+    quantized = Serving.load_scorer(tmp_path / Export.TFLITE_FILE)
+    np.testing.assert_allclose(saved_model(TEXTS), expected, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(quantized(TEXTS), expected, atol=0.05)
+
+    assert [label.label for label in report.labels] == Config.LABELS
+    assert report.n_examples == len(TEXTS)
+    assert report.max_score_difference < 0.05
+    assert 0 < report.tflite_bytes
+    assert report.quantized_latency.p50_ms > 0
+    saved = Export.ExportReport.model_validate_json(
+        (tmp_path / Export.REPORT_FILE).read_text()
+    )
+    assert saved == report
@@ -0,0 +1,21 @@
+import json
+
+import pytest
+
+from src import Instrumentation
+
+
+def test_stage_report_records_failed_stages(tmp_path):
+    report = Instrumentation.StageReport(path=tmp_path / "report.json")
+
+    with report.stage("load") as stage:
+        stage.rows = {"train": 10}
+    with pytest.raises(MemoryError):
+        with report.stage("convert"):
+            raise MemoryError
+
+    saved = json.loads((tmp_path / "report.json").read_text())
+    assert [s["name"] for s in saved["stages"]] == ["load", "convert"]
+    assert [s["completed"] for s in saved["stages"]] == [True, False]
+    assert saved["stages"][0]["rows"] == {"train": 10}
+    assert all(s["peak_rss_mb"] > 0 for s in saved["stages"])
@@ -0,0 +1,265 @@
+import json
+from typing import Optional
+
+import keras
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import (
+    Config,
+    Deduplication,
+    DownloadData,
+    MakeDatasets,
+    Storage,
+    Tokenization,
+)
+from src.MakeDatasets import Split
+from tests import conftest
+
+DATA_PARAMS = {"val_size": 0.2, "batch_size": 16}
+
+
+def test_datasets_are_built_then_loaded(raw_data_dir):
+    built = MakeDatasets.Datasets(**DATA_PARAMS)
+    n_batches = {split: len(ds) for split, ds in built.datasets.items()}
+    loaded = MakeDatasets.Datasets(**DATA_PARAMS)
+
+    assert (built.save_path / built.hash / "config.json").exists()
+    assert {split: len(ds) for split, ds in loaded.datasets.items()} == n_batches
+    assert [stage.name for stage in built.report.stages] == [
+        "load_raw_data",
+        "split",
+        "clean",
+        "convert",
+        "save",
+    ]
+    assert built.report.stages[1].rows == {"train": 160, "val": 40, "test": 100}
+    assert (built.save_path / built.hash / "build_report.json").exists()
+    assert [stage.name for stage in loaded.report.stages] == [
+        "load_train",
+        "load_val",
+        "load_test",
+    ]
+
+
+def test_splits_are_loaded_and_built_on_demand(raw_data_dir, mocker):
+    trainer = MakeDatasets.Datasets(**DATA_PARAMS)
+    _ = trainer.train
+    hash_dir = trainer.save_path / trainer.hash
+
+    assert trainer.report.stages[1].rows == {"train": 160, "val": 40}
+    assert not (hash_dir / "test").exists()
+
+    load_split = mocker.spy(MakeDatasets.Datasets, "_load_split")
+    evaluator = MakeDatasets.Datasets(**DATA_PARAMS)
+    n_test = n_examples(evaluator.test)
+
+    assert load_split.call_count == 0
+    assert evaluator.report.stages[0].rows == {"test.csv": 100, "test_labels.csv": 100}
+    assert n_test == 80
+    assert n_examples(MakeDatasets.Datasets(**DATA_PARAMS).test) == n_test
+    assert [call.args[1] for call in load_split.call_args_list] == [Split.TEST]
+
+
+@pytest.mark.parametrize(
+    "storage",
+    [{}, {"storage": Storage.StorageFormat.TFRECORD, "num_shards": 2}],
+)
+def test_parallel_build_matches_serial_build(raw_data_dir, storage):
+    serial = MakeDatasets.Datasets(**DATA_PARAMS, **storage, num_workers=1)
+    expected = {split: list(ds) for split, ds in serial.datasets.items()}
+    # Validate the raw files again, now on worker processes
+    (Config.KAGGLE_DIR / "manifest.json").unlink()
+    parallel = MakeDatasets.Datasets(
+        **DATA_PARAMS, **storage, num_workers=3, force_make=True
+    )
+    parallel_datasets = parallel.datasets
+    reloaded = MakeDatasets.Datasets(**DATA_PARAMS, **storage).datasets
+
+    assert parallel.hash == serial.hash
+    for datasets in [parallel_datasets, reloaded]:
+        for split, batches in expected.items():
+            for (x, y), (expected_x, expected_y) in zip(
+                datasets[split], batches, strict=True
+            ):
+                np.testing.assert_array_equal(x, expected_x)
+                np.testing.assert_array_equal(y, expected_y)
+
+
+def test_vocabulary_is_adapted_once(raw_data_dir, mocker):
+    tokenizer = Tokenization.VectorizerConfig(max_tokens=50, sequence_length=32)
+    adapt = mocker.spy(keras.layers.TextVectorization, "adapt")
+
+    vocabulary = MakeDatasets.Datasets(**DATA_PARAMS).vocabulary(tokenizer)
+    longer = tokenizer.model_copy(update={"sequence_length": 64})
+    cached = MakeDatasets.Datasets(**DATA_PARAMS).vocabulary(longer)
+
+    assert adapt.call_count == 1
+    assert cached == vocabulary
+    assert vocabulary[:2] == ["", "[UNK]"]
+
+
+def test_bucketed_splits_keep_every_example(raw_data_dir):
+    tokenizer = Tokenization.VectorizerConfig(max_tokens=50, sequence_length=64)
+    fixed = MakeDatasets.Datasets(**DATA_PARAMS, drop_remainder=False)
+    bucketed = MakeDatasets.Datasets(
+        **DATA_PARAMS, drop_remainder=False, bucket_boundaries=[8, 16, 32]
+    )
+    boundaries = [0, 8, 16, 32, 64]
+
+    for split, ds in bucketed.tokenized(tokenizer).items():
+        batches = list(ds.as_numpy_iterator())
+        n_examples = sum(len(labels) for _, labels in batches)
+        fixed_examples = sum(
+            len(labels) for _, labels in fixed.tokenized(tokenizer)[split]
+        )
+
+        assert len(batches) == len(ds)
+        assert n_examples == fixed_examples
+        for features, _ in batches:
+            lengths = np.count_nonzero(features, axis=1)
+            width = features.shape[1]
+            assert boundaries[boundaries.index(width) - 1] < lengths.min()
+            assert lengths.max() <= width
+
+
+def append_rows(
+    path, n_train: int, n_test: int, seed: int = 1, files: Optional[list[str]] = None
+) -> None:
+    """Append rows with fresh ids to the raw CSVs written by the fixture."""
+    new = path / "new"
+    conftest.write_raw_data(new, n_train=n_train, n_test=n_test, seed=seed)
+    for name in files or ["train.csv", "test.csv", "test_labels.csv"]:
+        df = pd.read_csv(new / name)
+        df["id"] = f"new{seed}-" + df["id"]
+        df.to_csv(path / name, mode="a", header=False, index=False)
+
+
+@pytest.mark.parametrize(
+    "storage",
+    [{}, {"storage": Storage.StorageFormat.TFRECORD, "num_shards": 2}],
+)
+def test_update_appends_only_new_rows(raw_data_dir, mocker, storage):
+    params = {**DATA_PARAMS, "drop_remainder": False, **storage}
+    datasets = MakeDatasets.Datasets(**params)
+    n_rows = {split: n_examples(ds) for split, ds in datasets.datasets.items()}
+    append_rows(raw_data_dir, n_train=50, n_test=25)
+    split_data = mocker.spy(MakeDatasets.Datasets, "_split_data")
+
+    n_appended = datasets.update()
+
+    # 20% of the new test rows are unlabelled (-1) and dropped
+    assert n_appended == 50 + 20
+    assert len(split_data.call_args.args[1][DownloadData.Files.TRAIN]) == 50
+    updated = {split: n_examples(ds) for split, ds in datasets.datasets.items()}
+    assert updated[Split.TRAIN] + updated[Split.VAL] == 200 + 50
+    assert updated[Split.TEST] == n_rows[Split.TEST] + 20
+    reloaded = MakeDatasets.Datasets(**params).datasets
+    assert {split: n_examples(ds) for split, ds in reloaded.items()} == updated
+    assert datasets.update() == 0
+
+
+@pytest.mark.parametrize(
+    "storage",
+    [{}, {"storage": Storage.StorageFormat.TFRECORD, "num_shards": 2}],
+)
+def test_update_keeps_train_rows_short_of_a_batch(raw_data_dir, storage):
+    datasets = MakeDatasets.Datasets(**DATA_PARAMS, **storage)
+    assert len(datasets.train) == 160 // 16
+
+    # Each increment has fewer train rows than a batch, together more
+    n_train = 160
+    for seed in [1, 2]:
+        append_rows(raw_data_dir, n_train=18, n_test=0, seed=seed)
+        assert datasets.update() == 18
+        n_train += datasets.report.stages[1].rows["train"]
+
+    assert n_train >= 160 + 16
+    assert len(datasets.train) == n_examples(datasets.train) // 16 == n_train // 16
+    reloaded = MakeDatasets.Datasets(**DATA_PARAMS, **storage)
+    assert len(reloaded.train) == n_train // 16
+
+
+def test_update_holds_back_test_rows_until_their_labels_arrive(raw_data_dir):
+    datasets = MakeDatasets.Datasets(**DATA_PARAMS)
+    n_test = n_examples(datasets.test)
+
+    append_rows(raw_data_dir, n_train=0, n_test=25, files=["test.csv"])
+    assert datasets.update() == 0
+    assert n_examples(datasets.test) == n_test
+
+    append_rows(raw_data_dir, n_train=0, n_test=25, files=["test_labels.csv"])
+    # 20% of the new test rows are unlabelled (-1) and dropped
+    assert datasets.update() == 20
+    assert n_examples(datasets.test) == n_test + 20
+    assert datasets.update() == 0
+
+
+def test_update_reads_numeric_looking_rows_as_text(raw_data_dir):
+    datasets = MakeDatasets.Datasets(**DATA_PARAMS, drop_remainder=False)
+    n_rows = {split: n_examples(ds) for split, ds in datasets.datasets.items()}
+
+    new = raw_data_dir / "new"
+    conftest.write_raw_data(new, n_train=20, n_test=10, seed=1)
+    for name in ["train.csv", "test.csv", "test_labels.csv"]:
+        df = pd.read_csv(new / name)
+        df["id"] = np.arange(len(df)) + 1000
+        if "comment_text" in df:
+            df["comment_text"] = np.arange(len(df)) * 7
+        df.to_csv(raw_data_dir / name, mode="a", header=False, index=False)
+
+    # 20% of the new test rows are unlabelled (-1) and dropped
+    assert datasets.update() == 20 + 8
+    updated = {split: n_examples(ds) for split, ds in datasets.datasets.items()}
+    assert updated[Split.TEST] == n_rows[Split.TEST] + 8
+    assert b"14" in {text for batch, _ in datasets.test for text in batch[:, 0].numpy()}
+
+
+def test_update_rejects_rewritten_files(raw_data_dir):
+    datasets = MakeDatasets.Datasets(**DATA_PARAMS)
+    _ = datasets.datasets
+    conftest.write_raw_data(raw_data_dir, seed=2)
+
+    with pytest.raises(ValueError, match="force_make"):
+        datasets.update()
+
+
+def test_dedup_removes_near_duplicates_within_and_across_splits(raw_data_dir):
+    params = {**DATA_PARAMS, "drop_remainder": False}
+    plain = MakeDatasets.Datasets(**params)
+    datasets = MakeDatasets.Datasets(**params, dedup=Deduplication.DedupConfig())
+
+    assert "dedup" not in json.loads(plain.config)
+    assert datasets.hash != plain.hash
+    texts = split_texts(datasets)
+    stages = {stage.name: stage.rows for stage in datasets.report.stages}
+    assert stages["deduplicate"] == {split.value: len(texts[split]) for split in Split}
+    assert sum(stages["deduplicate"].values()) < sum(stages["clean"].values())
+    all_texts = [text for texts_of_split in texts.values() for text in texts_of_split]
+    assert len(set(all_texts)) == len(all_texts)
+
+    append_rows(raw_data_dir, n_train=50, n_test=25)
+    n_appended = datasets.update()
+
+    # Many short mock comments repeat ones already saved
+    assert 0 < n_appended < 50 + 20
+    all_texts = [
+        text
+        for texts_of_split in split_texts(datasets).values()
+        for text in texts_of_split
+    ]
+    assert len(set(all_texts)) == len(all_texts)
+
+
+def split_texts(datasets: MakeDatasets.Datasets) -> dict[Split, list[str]]:
+    return {
+        split: [
+            text.decode() for batch, _ in ds.as_numpy_iterator() for text in batch[:, 0]
+        ]
+        for split, ds in datasets.datasets.items()
+    }
+
+
+def n_examples(ds) -> int:
+    return sum(len(labels) for _, labels in ds)
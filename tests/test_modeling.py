@@ -0,0 +1,174 @@
+import keras
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from src import MakeDatasets, Modeling, Preprocessing
+from src.MakeDatasets import Split
+
+TEXTS = [
+    "you are great",
+    "this is a really long comment " * 12,
+    "stop it",
+    "an insult " * 100,
+    "",
+]
+
+
+def make_trained_classifier() -> Modeling.TextClassifier:
+    classifier = Modeling.TextClassifier(
+        max_tokens=100,
+        sequence_length=200,
+        embedding_dim=8,
+        conv_filters=4,
+        conv_k_size=7,
+        hidden_neurons=8,
+        dropout_rate=0.1,
+    )
+    features = np.array(TEXTS * 4).reshape(-1, 1)
+    labels = np.random.default_rng(0).integers(0, 2, size=(len(features), 6))
+    train_ds = tf.data.Dataset.from_tensor_slices((features, labels)).batch(4)
+    classifier.train(train_ds, epochs=1, metrics=[], verbose=0)
+    return classifier
+
+
+def test_assign_length_buckets():
+    lengths = np.array([0, 32, 33, 100, 500])
+    bucket_ids = Preprocessing.assign_length_buckets(lengths, [32, 64, 200])
+    np.testing.assert_array_equal(bucket_ids, [0, 0, 1, 2, 2])
+
+
+def test_predict_proba_matches_full_length_model():
+    classifier = make_trained_classifier()
+
+    expected = classifier.model.predict(tf.constant(TEXTS)[:, None], verbose=0)
+    scores = classifier.predict_proba(iter(TEXTS), batch_size=2)
+
+    np.testing.assert_allclose(scores, expected, rtol=1e-5, atol=1e-6)
+
+    hidden = classifier.model.get_layer("predictions").input
+    assert hidden.shape[-1] == classifier.hidden_neurons
+
+    stats = classifier.inference_stats
+    assert stats.n_examples == len(TEXTS)
+    assert {batch.bucket_length for batch in stats.batches} == {64, 128, 200}
+    assert stats.throughput > 0
+
+
+def test_predict_thresholds_scores():
+    classifier = make_trained_classifier()
+    predictions = classifier.predict(TEXTS, threshold=0.0)
+    np.testing.assert_array_equal(predictions, np.ones((len(TEXTS), 6)))
+
+
+def test_save_and_load_round_trip(tmp_path):
+    classifier = make_trained_classifier()
+    classifier.save(tmp_path / "classifier")
+
+    loaded = Modeling.TextClassifier.load(tmp_path / "classifier")
+
+    assert loaded.config == classifier.config
+    np.testing.assert_allclose(
+        loaded.predict_proba(TEXTS), classifier.predict_proba(TEXTS), rtol=1e-6
+    )
+
+
+def test_train_on_pre_tokenized_dataset():
+    classifier = Modeling.TextClassifier(
+        max_tokens=100,
+        sequence_length=200,
+        embedding_dim=8,
+        conv_filters=4,
+        conv_k_size=7,
+        hidden_neurons=8,
+        dropout_rate=0.1,
+    )
+    vectorize_layer = classifier.tokenizer.make_layer()
+    vectorize_layer.adapt(tf.constant(TEXTS))
+    vocabulary = vectorize_layer.get_vocabulary()
+
+    features = tf.constant(TEXTS * 4)[:, None]
+    labels = np.random.default_rng(0).integers(0, 2, size=(len(features), 6))
+    text_ds = tf.data.Dataset.from_tensor_slices((features, labels)).batch(4)
+    token_ds = text_ds.map(lambda x, y: (vectorize_layer(x), y))
+
+    classifier.train(token_ds, epochs=1, metrics=[], verbose=0, vocabulary=vocabulary)
+
+    token_results = classifier.evaluate(token_ds, verbose=0)
+    text_results = classifier.evaluate(text_ds, verbose=0)
+    assert token_results["loss"] == pytest.approx(text_results["loss"], rel=1e-5)
+
+
+def test_performance_mode_trains_text_in_bfloat16_with_xla():
+    classifier = Modeling.TextClassifier(
+        max_tokens=100,
+        sequence_length=200,
+        embedding_dim=8,
+        conv_filters=4,
+        conv_k_size=7,
+        hidden_neurons=8,
+        dropout_rate=0.1,
+        performance=Modeling.PerformanceMode(jit_compile=True, mixed_precision=True),
+    )
+    features = tf.constant(TEXTS * 4)[:, None]
+    labels = np.random.default_rng(0).integers(0, 2, size=(len(features), 6))
+    text_ds = tf.data.Dataset.from_tensor_slices((features, labels)).batch(4)
+
+    classifier.train(text_ds, epochs=1, metrics=[], verbose=0)
+
+    embedding = next(
+        layer
+        for layer in classifier.model.layers
+        if isinstance(layer, keras.layers.Embedding)
+    )
+    assert embedding.compute_dtype == "bfloat16"
+    assert embedding.variable_dtype == "float32"
+    assert classifier.model.output.dtype == "float32"
+    assert classifier.predict_proba(TEXTS).dtype == np.float32
+    assert np.isfinite(classifier.evaluate(text_ds, verbose=0)["loss"])
+
+
+def test_bucketed_training_batches_match_inference_buckets(raw_data_dir):
+    classifier = Modeling.TextClassifier(
+        max_tokens=50,
+        sequence_length=64,
+        embedding_dim=8,
+        conv_filters=4,
+        conv_k_size=3,
+        hidden_neurons=8,
+        dropout_rate=0.1,
+    )
+    boundaries = [16, 32]
+    datasets = MakeDatasets.Datasets(
+        val_size=0.2,
+        batch_size=16,
+        drop_remainder=False,
+        bucket_boundaries=boundaries,
+        bucket_margin=classifier.padding_margin,
+    )
+    vocabulary = datasets.vocabulary(classifier.tokenizer)
+    splits = datasets.tokenized(classifier.tokenizer, [Split.TRAIN, Split.VAL])
+    classifier.train(
+        splits[Split.TRAIN], epochs=1, metrics=[], verbose=0, vocabulary=vocabulary
+    )
+
+    texts = [
+        text.decode()
+        for features, _ in datasets.val.as_numpy_iterator()
+        for text in features[:, 0]
+    ]
+    scores = classifier.predict_proba(texts, bucket_boundaries=boundaries)
+    token_ids = classifier._vectorize_layer(tf.constant(texts)).numpy()
+    expected = {
+        row.astype(np.int64).tobytes(): score for row, score in zip(token_ids, scores)
+    }
+
+    for features, _ in splits[Split.VAL].as_numpy_iterator():
+        logits = classifier._token_model.predict_on_batch(features)
+        full_length = np.pad(features, ((0, 0), (0, 64 - features.shape[1])))
+        np.testing.assert_allclose(
+            logits,
+            [expected[row.astype(np.int64).tobytes()] for row in full_length],
+            rtol=1e-5,
+            atol=1e-6,
+        )
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from src import Preprocessing
+
+
+def greedy_allocation(demand: np.ndarray, n_items: int) -> np.ndarray:
+    demand = demand.astype(float).copy()
+    allocation = np.zeros(len(demand), dtype=int)
+    for _ in range(n_items):
+        fold = np.argmax(demand)
+        allocation[fold] += 1
+        demand[fold] -= 1
+    return allocation
+
+
+def test_water_fill_matches_one_by_one_greedy():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        demand = rng.permutation(10)[:4] + 0.5
+        n_items = int(rng.integers(0, 40))
+        allocation = Preprocessing._water_fill(demand, n_items, np.zeros(4), rng)
+        expected = greedy_allocation(demand, n_items)
+        # Folds tied on demand may swap items, leaving the same remaining demands
+        np.testing.assert_array_equal(
+            np.sort(demand - allocation), np.sort(demand - expected)
+        )
+
+
+def test_iterative_stratification_balances_labels_across_folds():
+    rng = np.random.default_rng(0)
+    y = (rng.random((10_000, 6)) < [0.1, 0.01, 0.05, 0.003, 0.05, 0.01]).astype(int)
+
+    folds = Preprocessing.iterative_stratification(y, [0.2] * 5)
+
+    fold_sizes = np.bincount(folds, minlength=5)
+    assert fold_sizes.max() - fold_sizes.min() <= 1
+    label_counts = np.stack([y[folds == k].sum(axis=0) for k in range(5)])
+    assert (label_counts.max(axis=0) - label_counts.min(axis=0) <= 1).all()
+
+
+def test_iter_train_val_split_keeps_all_rows():
+    df = pd.DataFrame(
+        {
+            "id": [str(i) for i in range(100)],
+            "comment_text": ["text"] * 100,
+            "label": [1] * 10 + [0] * 90,
+        }
+    )
+
+    train_df, val_df = Preprocessing.iter_train_val_split(df, ["label"], 0.2)
+
+    assert len(val_df) == 20
+    assert val_df["label"].sum() == 2
+    assert sorted(pd.concat([train_df, val_df])["id"]) == sorted(df["id"])
+
+
+def test_iter_k_fold_split_val_folds_partition_rows():
+    df = pd.DataFrame({"id": range(50), "label": [1] * 10 + [0] * 40})
+
+    splits = Preprocessing.iter_k_fold_split(df, ["label"], n_splits=5)
+
+    val_ids = np.concatenate([val_df["id"].to_numpy() for _, val_df in splits])
+    assert sorted(val_ids) == list(range(50))
+    assert all(val_df["label"].sum() == 2 for _, val_df in splits)
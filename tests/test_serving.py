@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import numpy as np
+
+from src import Serving
+
+
+def test_micro_batcher_merges_concurrent_requests():
+    batch_sizes = []
+
+    def scorer(texts: list[str]) -> np.ndarray:
+        batch_sizes.append(len(texts))
+        return np.array([[len(text)] * 6 for text in texts], dtype=np.float32)
+
+    async def run():
+        batcher = Serving.MicroBatcher(scorer=scorer, max_batch_size=4, max_wait_ms=50)
+        await batcher.start()
+        scores = await asyncio.gather(*(batcher.submit("x" * i) for i in range(10)))
+        metrics = batcher.metrics()
+        await batcher.stop()
+        return scores, metrics
+
+    scores, metrics = asyncio.run(run())
+
+    assert [int(score[0]) for score in scores] == list(range(10))
+    assert batch_sizes == [4, 4, 2]
+    assert metrics["requests"] == 10
+    assert metrics["batches"] == 3
+    assert metrics["queue_depth"] == 0
+    assert metrics["latency_p99_ms"] >= metrics["latency_p50_ms"] > 0
+
+
+def test_scoring_server_routes():
+    def scorer(texts: list[str]) -> np.ndarray:
+        return np.full((len(texts), 6), 0.5, dtype=np.float32)
+
+    async def request(port: int, method: str, path: str, payload=None) -> dict:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        writer.write(
+            f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+    async def run():
+        batcher = Serving.MicroBatcher(scorer=scorer)
+        server = Serving.ScoringServer(batcher=batcher, port=0)
+        await batcher.start()
+        tcp_server = await asyncio.start_server(server._handle, "127.0.0.1", 0)
+        port = tcp_server.sockets[0].getsockname()[1]
+
+        single = await request(port, "POST", "/score", {"text": "hello"})
+        many = await request(port, "POST", "/score", {"texts": ["a", "b"]})
+        metrics = await request(port, "GET", "/metrics")
+
+        tcp_server.close()
+        await batcher.stop()
+        return single, many, metrics
+
+    single, many, metrics = asyncio.run(run())
+
+    assert single["scores"]["toxic"] == 0.5
+    assert len(many["scores"]) == 2
+    assert metrics["requests"] == 3
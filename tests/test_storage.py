@@ -0,0 +1,24 @@
+import numpy as np
+import tensorflow as tf
+
+from src import Storage
+
+
+def test_tfrecord_shards_round_trip_in_order(tmp_path):
+    features = np.array([[f"comment {i}".encode()] for i in range(50)])
+    labels = np.arange(300).reshape(50, 6) % 2
+    ds = tf.data.Dataset.from_tensor_slices((features, labels)).batch(8)
+
+    shards = Storage.write_tfrecord_shards(
+        ds, tmp_path, "train", num_shards=3, compression=Storage.Compression.GZIP
+    )
+    loaded = Storage.read_tfrecord_shards(
+        tmp_path, shards, 1, 6, 8, Storage.Compression.GZIP, deterministic=True
+    )
+
+    assert [shard.examples for shard in shards] == [17, 17, 16]
+    assert all(shard.bytes > 0 for shard in shards)
+    assert len(loaded) == 6
+    loaded_features, loaded_labels = zip(*loaded.as_numpy_iterator())
+    np.testing.assert_array_equal(np.concatenate(loaded_features), features[:48])
+    np.testing.assert_array_equal(np.concatenate(loaded_labels), labels[:48])
@@ -0,0 +1,65 @@
+import json
+
+import keras
+
+from src import Config, Sweep
+
+DATA_PARAMS = {"val_size": 0.2, "batch_size": 16}
+SPACE = {
+    "max_tokens": [50],
+    "sequence_length": [32, 64],
+    "embedding_dim": [4, 8],
+    "conv_filters": [4],
+    "conv_k_size": [3],
+    "hidden_neurons": [8],
+    "dropout_rate": [0.1],
+}
+
+
+def report(trials_dir, trial, losses):
+    with open(trials_dir / f"trial-{trial}.jsonl", "w") as f:
+        for epoch, loss in enumerate(losses):
+            f.write(json.dumps({"epoch": epoch, "val_loss": loss}) + "\n")
+
+
+def test_median_pruner_stops_trials_worse_than_the_median(tmp_path):
+    report(tmp_path, 0, [0.3, 0.2])
+    report(tmp_path, 1, [0.4, 0.3])
+    report(tmp_path, 2, [0.5])
+    pruner = Sweep.MedianPruner(tmp_path, trial=3, min_epochs=2, min_trials=2)
+    pruner.set_model(keras.Sequential())
+
+    # Still warming up, although worse than every other trial
+    pruner.on_epoch_end(0, {"val_loss": 0.9})
+    assert not pruner.pruned
+    pruner.on_epoch_end(1, {"val_loss": 0.26})
+
+    assert pruner.pruned
+    assert pruner.model.stop_training
+    assert pruner.val_losses == [0.9, 0.26]
+
+
+def test_sweep_trains_trials_in_worker_processes(raw_data_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "REPORTS_DIR", tmp_path / "reports")
+    sweep = Sweep.Sweep(
+        name="small",
+        space=Sweep.SweepSpace(**SPACE),
+        data_params=DATA_PARAMS,
+        epochs=2,
+        n_trials=3,
+        num_workers=2,
+        threads_per_trial=1,
+    )
+
+    results = sweep.run()
+
+    assert [result.trial for result in results] == [0, 1, 2]
+    assert all(result.status in ("completed", "pruned") for result in results)
+    assert all(result.best_val_loss is not None for result in results)
+    saved = json.loads((sweep.sweep_dir / "results.json").read_text())
+    assert [Sweep.TrialResult(**result) for result in saved] == results
+    # Token ids were made before the trials, once per tokenizer
+    token_dirs = list((tmp_path / "tensorflow").glob("*/tokens/*"))
+    assert len(token_dirs) == len(
+        {result.params["sequence_length"] for result in results}
+    )